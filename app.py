@@ -1,13 +1,55 @@
-import os
-import re
-import json
 import html
 import time
-import requests
+import uuid
 import streamlit as st
-import streamlit.components.v1 as components
-import base64
-from pathlib import Path
+
+from core import (
+    DEEPSEEK_API_KEY,
+    USAGE,
+    analyze,
+    analyze_incremental,
+    analyze_matrix,
+    analyze_stream,
+    clamp01,
+    format_rewrite,
+    highlight_text_html,
+    incremental_plan,
+    profile_matrix,
+)
+from metrics import trace
+from ratelimit import UpstreamBusyError, queue_observer
+from usage import usage_labels
+from ui import (
+    EMOJI_MAP,
+    clipboard_copy_fire,
+    clipboard_copy_injector,
+    count_render,
+    inject_styles,
+    matrix_cell,
+    matrix_heatmap_html,
+    queue_status_writer,
+    render_header,
+    RenderLaps,
+    render_debug_panel,
+    render_overview,
+    render_stream_preview,
+    tip_block,
+)
+
+SCENARIO_OPTIONS = [
+    "宿舍与安全管理通知",
+    "课程/考试/成绩相关通知",
+    "奖助学金/资助政策通知",
+    "纪律处分/违纪处理通告",
+    "校内活动/讲座报名通知",
+    "疫情/卫生/公共安全通知",
+    "其他（通用高校公告）",
+]
+GRADE_OPTIONS = ["新生", "大二/大三", "大四/毕业班", "研究生", "混合群体"]
+ROLE_OPTIONS = ["普通学生", "宿舍长/楼委", "学生干部", "社团成员", "考研/保研群体", "留学生/交流生", "混合"]
+GENDER_OPTIONS = ["不指定", "偏男性", "偏女性", "混合"]
+SENSITIVITY_OPTIONS = ["低", "中", "高"]
+MATRIX_MAX_PROFILES = 60
 
 # =========================
 # Page config
@@ -16,319 +58,15 @@ st.set_page_config(
     page_title="清小知——高校通知模拟器",
     layout="wide",
 )
+count_render("page")
+laps = RenderLaps()
+inject_styles()
+render_header()
+laps.mark("header")
 
 # =========================
-# Styles (cool + premium)
-# =========================
-st.markdown(
-    """
-    <style>
-      /* Background must apply in Streamlit */
-      [data-testid="stAppViewContainer"]{
-        background:
-          radial-gradient(1200px 700px at 20% 0%, rgba(59,130,246,.16), transparent 60%),
-          radial-gradient(900px 520px at 85% 10%, rgba(37,99,235,.12), transparent 55%),
-          linear-gradient(180deg, rgba(239,246,255,1) 0%, rgba(248,250,252,1) 55%, rgba(255,255,255,1) 100%);
-      }
-      [data-testid="stHeader"]{ background: transparent; }
-      .block-container {padding-top: 1.1rem; padding-bottom: 2.0rem; max-width: 1120px;}
-
-      #MainMenu {visibility: hidden;}
-      footer {visibility: hidden;}
-      header {visibility: hidden;}
-
-      /* Header */
-      .hero { text-align:center; padding: 10px 0 6px 0; position: relative; }
-      .hero-title{
-        font-size: 46px;
-        font-weight: 950;
-        letter-spacing: -0.04em;
-        margin: 0;
-        background: linear-gradient(90deg, rgba(37,99,235,1), rgba(59,130,246,1), rgba(56,189,248,1));
-        -webkit-background-clip: text;
-        background-clip: text;
-        color: transparent;
-        text-shadow: 0 18px 50px rgba(37,99,235,.18);
-        animation: floatIn .7s ease-out both;
-        display: inline-block;
-        transition: transform .18s ease, filter .25s ease;
-        cursor: default;
-      }
-      .hero-title:hover{
-        transform: translateY(-2px) scale(1.01);
-        filter: drop-shadow(0 16px 24px rgba(37,99,235,.20));
-      }
-
-      .hero-sub{
-        margin-top: 8px;
-        display:flex;
-        justify-content:center;
-      }
-      .hero-pill{
-        display:inline-flex; align-items:center; gap:10px;
-        padding: 10px 16px; border-radius: 999px;
-        border: 1px solid rgba(2,6,23,.06);
-        background: rgba(255,255,255,.78);
-        box-shadow: 0 10px 30px rgba(2,6,23,.06);
-        color: rgba(51,65,85,.90); font-size: 14px;
-        animation: glow 3.2s ease-in-out infinite;
-        transform: translateX(24px);  /* 往右挪：12/24/36 自己调 */
-      }
-      .hero-dot{
-        width:10px; height:10px; border-radius:999px;
-        background: rgba(37,99,235,.85);
-        box-shadow: 0 0 0 6px rgba(37,99,235,.12);
-      }
-      @keyframes floatIn{ from{ transform: translateY(8px); opacity: 0; } to{ transform: translateY(0); opacity: 1; } }
-      @keyframes glow{ 0%,100% { box-shadow: 0 10px 30px rgba(2,6,23,.06); } 50% { box-shadow: 0 18px 40px rgba(37,99,235,.12); } }
-
-      /* Section title */
-      .section-h{
-        font-size: 19px; font-weight: 900;
-        margin: 0.35rem 0 1.0rem 0;
-        border-left: 4px solid rgba(37,99,235,.55);
-        padding-left: 12px;
-        color: rgba(15,23,42,.92);
-      }
-
-      /* Card */
-      .card {
-        background: rgba(255,255,255,.88);
-        border-radius: 18px;
-        padding: 16px 18px;
-        box-shadow: 0 12px 34px rgba(2,6,23,.07);
-        border: 1px solid rgba(2,6,23,.05);
-      }
-      .muted {color: rgba(51,65,85,.70);}
-
-      /* KPI */
-      .kpi-label {color: rgba(51,65,85,.60); font-size: 12px; letter-spacing: .06em;}
-      .kpi-value {font-size: 34px; font-weight: 900; margin-top: 6px; color: rgba(15,23,42,.92);}
-      .kpi-value2 {font-size: 22px; font-weight: 900; margin-top: 10px; color: rgba(15,23,42,.92);}
-      .bar {height: 10px; border-radius: 999px; background: rgba(15,23,42,.08); overflow: hidden; margin-top: 10px;}
-      .bar > div {height: 100%; border-radius: 999px;}
-
-      /* Highlight */
-      mark.hl { background: rgba(59, 130, 246, 0.22); color: inherit; padding: 0 .18em; border-radius: .35em; }
-
-      /* Tips */
-      .tip{
-        margin-top: 10px; padding: 12px 14px;
-        border-radius: 16px;
-        background: rgba(37,99,235,0.055);
-        border: 1px solid rgba(2,6,23,.05);
-        box-shadow: 0 10px 26px rgba(2,6,23,.04);
-      }
-      .tip-title{ font-weight: 900; color: rgba(15,23,42,.90); margin-bottom: 6px; font-size: 13px; }
-      .tip-text{ color: rgba(51,65,85,.76); line-height: 1.65; white-space: pre-line; font-size: 12.5px; }
-
-      /* Blue tags */
-      .blue-tag{
-        display:inline-block;
-        padding:4px 10px;
-        border-radius:999px;
-        background:rgba(37,99,235,.12);
-        color:rgba(37,99,235,1);
-        font-size:12px;
-        margin-right:8px;
-        margin-bottom:6px;
-        border: 1px solid rgba(37,99,235,.18);
-        font-weight: 700;
-      }
-
-      /* Chat bubble */
-      .bubble{
-        margin-top:10px;
-        background: rgba(255,255,255,.94);
-        border: 1px solid rgba(2,6,23,.07);
-        border-radius: 18px;
-        padding: 12px 14px;
-        font-size: 14px;
-        line-height: 1.75;
-        color: rgba(15,23,42,.92);
-        box-shadow: 0 12px 28px rgba(2,6,23,.06);
-        position: relative;
-      }
-      .bubble:before{
-        content:"";
-        position:absolute;
-        left:18px;
-        top:-8px;
-        width:14px;
-        height:14px;
-        background: rgba(255,255,255,.94);
-        border-left: 1px solid rgba(2,6,23,.07);
-        border-top: 1px solid rgba(2,6,23,.07);
-        transform: rotate(45deg);
-      }
-
-      /* Risk item */
-      .rp-item{
-        padding: 12px 12px;
-        border-radius: 14px;
-        border: 1px solid rgba(2,6,23,.06);
-        background: rgba(255,255,255,.74);
-        margin-bottom: 10px;
-      }
-
-      /* Tabs */
-      .stTabs [data-baseweb="tab-list"]{ justify-content: space-around; padding: 0 28px; }
-      .stTabs [data-baseweb="tab"]{ font-size: 15px; font-weight: 900; padding-left: 0 !important; padding-right: 0 !important; }
-
-      /* Primary button */
-      div.stButton > button[kind="primary"]{
-        width: 100%;
-        border: 0 !important;
-        border-radius: 16px !important;
-        padding: 14px 16px !important;
-        font-weight: 900 !important;
-        background: linear-gradient(90deg, rgba(37,99,235,.96), rgba(59,130,246,.92)) !important;
-        box-shadow: 0 18px 44px rgba(37,99,235,.22) !important;
-        transition: transform .15s ease, box-shadow .2s ease, filter .2s ease;
-      }
-      div.stButton > button[kind="primary"]:hover{
-        transform: translateY(-1px);
-        filter: brightness(1.02);
-        box-shadow: 0 22px 60px rgba(37,99,235,.28) !important;
-      }
-      div.stButton > button[kind="primary"]:active{ transform: translateY(0px) scale(.99); }
-
-      /* Loading */
-      .loading{
-        display:flex;
-        align-items:center;
-        justify-content:center;
-        gap:10px;
-        padding: 14px 16px;
-        border-radius: 16px;
-        background: linear-gradient(90deg, rgba(37,99,235,.96), rgba(59,130,246,.92));
-        color: white;
-        font-weight: 900;
-        box-shadow: 0 18px 44px rgba(37,99,235,.22);
-        user-select:none;
-      }
-      .dots span{
-        display:inline-block;
-        width:6px; height:6px;
-        border-radius:999px;
-        background:white;
-        margin-left:5px;
-        opacity:.25;
-        animation: blink 1.1s infinite;
-      }
-      .dots span:nth-child(2){ animation-delay: .15s; }
-      .dots span:nth-child(3){ animation-delay: .3s; }
-      @keyframes blink{
-        0%,100%{ opacity:.25; transform: translateY(0); }
-        50%{ opacity:1; transform: translateY(-2px); }
-      }
-
-      /* Secondary button for actions */
-      div.stButton > button[kind="secondary"]{
-        width: 100% !important;
-        border-radius: 18px !important;
-        padding: 16px 14px !important;
-        font-weight: 900 !important;
-        font-size: 20px !important;
-        border: 2px solid rgba(37,99,235,.28) !important;
-        background: rgba(37,99,235,.06) !important;
-        color: rgba(37,99,235,1) !important;
-        box-shadow: 0 12px 28px rgba(2,6,23,.06) !important;
-        transition: transform .15s ease, filter .2s ease;
-      }
-      div.stButton > button[kind="secondary"]:hover{
-        transform: translateY(-1px);
-        filter: brightness(1.02);
-      }
-
-      /* Footnote */
-      .footnote {
-        color: rgba(51,65,85,.55);
-        font-size: 12px;
-        margin-top: 18px;
-        text-align:center;
-      }
-      
-      /* ===== Header layout override ===== */
-      .qxz-header-wrap{
-        width: 880px;               /* ✅ 控制整体居中区域宽度：想更窄就 760，想更宽就 980 */
-        margin: 0 auto;             /* ✅ 居中 */
-        padding: 10px 0 6px 0;
-        text-align: center;
-      }
-
-      .qxz-header-top{
-        display:flex;
-        align-items:center;
-        justify-content:center;     /* ✅ logo+标题作为整体居中 */
-        gap: 8px;                  /* ✅ logo 与标题间距：想更近就 8-10 */
-      }
-
-      .qxz-logo{
-        width: 190px;               /* ✅ logo 变大：你要再大三倍就 220/260 */
-        height: auto;
-        filter: drop-shadow(0 14px 22px rgba(37,99,235,.18));
-      }
-
-      .qxz-title{
-        margin: 0;
-        line-height: 1;
-        transform: translateX(-60px);  /* 👈 往左移动，数值越大越靠左 */
-      }
-
-      .qxz-title-shift{
-        transform: translateX(-60px);  /* 👈 往左挪，-30 / -60 / -90 自己调 */
-      }
-
-      .qxz-header-sub{
-        justify-content:center !important;
-        margin-top: -12px;
-      }
-      </style>
-    """,
-    unsafe_allow_html=True,
-)
-def img_to_data_uri(rel_path: str) -> str:
-    p = Path(__file__).parent / rel_path
-    if not p.exists():
-        return ""
-    b64 = base64.b64encode(p.read_bytes()).decode("utf-8")
-    return f"data:image/png;base64,{b64}"
-
-# =========================
-# Header (strict centered: logo + title in one centered row)
-# =========================
-logo_uri = img_to_data_uri("logo.png")  # logo.png 放在 app.py 同目录
-
-st.markdown(
-    f"""
-    <div class="qxz-header-wrap">
-      <div class="qxz-header-top">
-        <img class="qxz-logo" src="{logo_uri}" alt="logo" />
-        <div class="qxz-title-shift">
-          <div class="hero-title">清小知</div>
-        </div>
-      </div>
-
-      <div class="qxz-header-sub hero-sub">
-        <div class="hero-pill">
-          <span class="hero-dot"></span>
-          <span>高校通知小助手｜让通知更容易被理解</span>
-        </div>
-      </div>
-    </div>
-    """,
-    unsafe_allow_html=True,
-)
-
-# =========================
-# DeepSeek config
+# DeepSeek config（见 core.py）
 # =========================
-DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-API_URL = "https://api.deepseek.com/chat/completions"
-# API_URL = "https://api.openai.com/v1/responses"
-
 if not DEEPSEEK_API_KEY:
     st.error(
         "未检测到 DEEPSEEK_API_KEY。\n\n"
@@ -337,526 +75,8 @@ if not DEEPSEEK_API_KEY:
     )
     st.stop()
 
-# =========================
-# Helpers
-# =========================
-EMOJI_MAP = {
-    "焦虑": "😰",
-    "紧张": "😟",
-    "抵触": "😤",
-    "困惑": "😕",
-    "不安": "😣",
-    "担忧": "😧",
-    "生气": "😡",
-    "配合": "🙂",
-    "反感": "🙃",
-}
-
-# --- 风险门槛：硬规则关键词（你之后可继续扩充） ---
-NEGATIVE_CONSEQ_WORDS = [
-    "处分", "通报", "追责", "严肃处理", "从严", "清退", "取消资格", "影响评优", "记入", "扣分", "处罚",
-    "必须", "一律", "不得", "严禁", "否则", "后果自负", "责任自负", "视为放弃", "将被", "逾期不再",
-]
-FAIRNESS_RESOURCE_WORDS = [
-    "名额", "优先", "排序", "资格", "评选", "评优", "奖学金", "助学金", "资助", "补贴", "分配", "指标", "录取",
-]
-DISCIPLINE_WORDS = [
-    "违纪", "违规", "纪律", "处分", "通报", "处理决定", "处理通告", "问责", "调查", "举报",
-]
-POLICY_WORDS = [
-    "制度", "规定", "办法", "细则", "政策", "条例", "实施", "执行标准", "解释权", "最终解释权",
-]
-# 事务型：出现 >=2 基本就不该被当舆情风险
-TRANSACTIONAL_HINTS = [
-    "领取", "发放", "领取地点", "配送", "领取时间", "办公室", "带好", "携带", "请前往", "请到", "数量", "一套", "人手",
-    "领取方式", "现场", "登记", "材料", "附件", "表格", "提交", "截止", "时间", "地点", "联系人", "咨询",
-]
-
-def safe_extract_json(text: str):
-    if not text:
-        return None, "empty_response"
-    cleaned = re.sub(r"```(?:json)?\s*", "", text.strip(), flags=re.IGNORECASE)
-    cleaned = cleaned.replace("```", "").strip()
-    try:
-        return json.loads(cleaned), None
-    except Exception:
-        pass
-
-    start = cleaned.find("{")
-    end = cleaned.rfind("}")
-    if start != -1 and end != -1 and end > start:
-        candidate = cleaned[start : end + 1]
-        candidate = candidate.replace("“", "\"").replace("”", "\"").replace("’", "'").replace("‘", "'")
-        try:
-            return json.loads(candidate), None
-        except Exception as e:
-            return None, f"json_parse_failed: {e}"
-
-    return None, "no_json_object_found"
-
-def call_deepseek(system_prompt: str, user_prompt: str, model: str = "deepseek-chat"):
-    headers = {"Authorization": f"Bearer {DEEPSEEK_API_KEY}", "Content-Type": "application/json"}
-    payload = {
-        "model": model,
-        "messages": [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
-        "temperature": 0.3,
-    }
-    r = requests.post(API_URL, headers=headers, json=payload, timeout=90)
-    r.raise_for_status()
-    data = r.json()
-    return data["choices"][0]["message"]["content"]
-
-def call_gpt(system_prompt: str, user_prompt: str, model: str = "gpt-5"):
-    headers = {
-        "Authorization": f"Bearer {OPENAI_API_KEY}",
-        "Content-Type": "application/json",
-    }
-    payload = {
-        "model": model,
-        "messages": [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt},
-        ],
-        "temperature": 0.9,
-    }
-    r = requests.post(API_URL, headers=headers, json=payload, timeout=90)
-    r.raise_for_status()
-    data = r.json()
-    return data["choices"][0]["message"]["content"]
-
-def clamp01(x):
-    try:
-        x = float(x)
-    except Exception:
-        return 0.0
-    return max(0.0, min(1.0, x))
-
-def pretty_notice(raw: str) -> str:
-    """清理 markdown/转义，让通知更像群消息"""
-    if not raw:
-        return ""
-    s = raw.replace("\r\n", "\n").replace("\r", "\n").strip()
-    s = re.sub(r"\\(?=\d+[\.\、\)])", "", s)
-    s = re.sub(r"\*\*(.*?)\*\*", r"\1", s)
-    s = re.sub(r"__(.*?)__", r"\1", s)
-    s = re.sub(r"`([^`]+)`", r"\1", s)
-    s = re.sub(r"(?m)^\s*-\s+", "· ", s)
-    s = re.sub(r"(?m)^(?=\d+[\.\、\)])", "\n", s)
-    s = re.sub(r"\n?【", "\n\n【", s)
-    s = re.sub(r"\n{3,}", "\n\n", s).strip()
-    return s
-
-def add_emojis_smart(text: str) -> str:
-    """克制地加 emoji（不刷屏）"""
-    if not text:
-        return ""
-    lines = text.split("\n")
-    out = []
-    for i, line in enumerate(lines):
-        L = line.strip()
-        if not L:
-            out.append("")
-            continue
-        has_emoji_prefix = bool(re.match(r"^[\u2600-\u27BF\U0001F300-\U0001FAFF]", L))
-        if not has_emoji_prefix:
-            if i <= 1 and re.search(r"(同学|大家|各位)", L):
-                L = "👋 " + L
-            if re.search(r"(时间|今晚|明天|上午|下午|晚上|\d{1,2}[:：]\d{2})", L):
-                L = "⏰ " + L
-            elif re.search(r"(地点|位置|教室|楼|宿舍|会议室|办公室)", L):
-                L = "📍 " + L
-            elif re.search(r"(咨询|联系|沟通|电话|微信|邮箱)", L):
-                L = "☎️ " + L
-            elif re.search(r"(注意|提醒|请勿|禁止|务必|重要)", L):
-                L = "⚠️ " + L
-            elif re.search(r"(材料|附件|表格|申请|提交)", L):
-                L = "📄 " + L
-            elif re.search(r"(步骤|流程|操作|请按|依次)", L):
-                L = "✅ " + L
-        out.append(L)
-    return "\n".join(out).strip()
-
-def highlight_text_html(raw_text: str, phrases: list[str]) -> str:
-    if not raw_text:
-        return ""
-    safe = html.escape(raw_text)
-    uniq = []
-    for p in phrases or []:
-        p = (p or "").strip()
-        if not p:
-            continue
-        if p not in raw_text:
-            continue
-        if p not in uniq:
-            uniq.append(p)
-    for p in sorted(uniq, key=len, reverse=True):
-        safe_p = html.escape(p)
-        safe = safe.replace(safe_p, f"<mark class='hl'>{safe_p}</mark>")
-    return f"<div class='card' style='line-height:1.85;font-size:15px;'>{safe}</div>"
-
-def risk_bar_color(level: str) -> str:
-    if level == "LOW":
-        return "linear-gradient(90deg, rgba(34,197,94,.92), rgba(16,185,129,.78))"
-    if level == "MEDIUM":
-        return "linear-gradient(90deg, rgba(234,179,8,.92), rgba(251,191,36,.78))"
-    return "linear-gradient(90deg, rgba(239,68,68,.92), rgba(244,63,94,.78))"
-
-def render_overview(risk_score: int, risk_level: str, summary: str):
-    pct = max(0, min(100, int(risk_score)))
-    k1, k2, k3 = st.columns([1, 1, 2], gap="medium")
-    bar_bg = risk_bar_color(risk_level)
-
-    with k1:
-        st.markdown(
-            f"""
-            <div class="card">
-              <div class="kpi-label">风险分数</div>
-              <div class="kpi-value">{pct}</div>
-              <div class="bar"><div style="width:{pct}%; background:{bar_bg};"></div></div>
-            </div>
-            """,
-            unsafe_allow_html=True,
-        )
-    with k2:
-        label = ("低" if risk_level == "LOW" else ("中" if risk_level == "MEDIUM" else "高"))
-        st.markdown(
-            f"""
-            <div class="card">
-              <div class="kpi-label">风险等级</div>
-              <div class="kpi-value2">{risk_level}</div>
-              <div class="muted" style="margin-top:8px;">{label}风险</div>
-            </div>
-            """,
-            unsafe_allow_html=True,
-        )
-    with k3:
-        st.markdown(
-            f"""
-            <div class="card">
-              <div class="kpi-label">结论</div>
-              <div style="font-size:16px;font-weight:900;margin-top:10px;line-height:1.55;color:rgba(15,23,42,.92);">
-                {html.escape(summary)}
-              </div>
-            </div>
-            """,
-            unsafe_allow_html=True,
-        )
-
-def tip_block():
-    st.markdown(
-        """
-        <div class="tip">
-          <div class="tip-title">通知小贴士</div>
-          <div class="tip-text">撰写通知时应尽量涵盖时间窗口 / 执行范围 / 可替代方案 / 咨询渠道。<br>信息越完整，越不容易被误读噢💙</div>
-        </div>
-        """,
-        unsafe_allow_html=True,
-    )
-
-# ============== 关键：复制按钮需要全局注入一次 ==============
-def clipboard_copy_injector():
-    components.html(
-        """
-        <script>
-        if (!window.__QXZ_CLIPBOARD_INSTALLED__) {
-          window.__QXZ_CLIPBOARD_INSTALLED__ = true;
-          window.__QXZ_DO_COPY__ = async function(payload) {
-            try {
-              await navigator.clipboard.writeText(payload || "");
-              window.__QXZ_COPY_OK__ = true;
-            } catch(e) {
-              window.__QXZ_COPY_OK__ = false;
-            }
-          };
-        }
-        </script>
-        """,
-        height=0,
-    )
-
-def clipboard_copy_fire(text: str):
-    safe = json.dumps(text, ensure_ascii=False)
-    components.html(
-        f"""
-        <script>
-          if (window.__QXZ_DO_COPY__) {{
-            window.__QXZ_DO_COPY__({safe});
-          }}
-        </script>
-        """,
-        height=0,
-    )
-
 clipboard_copy_injector()
 
-# =========================
-# Risk Gate（门槛判断）
-# =========================
-def _hit_any(text: str, words: list[str]) -> bool:
-    return any(w in text for w in words)
-
-def _hit_count(text: str, words: list[str]) -> int:
-    return sum(1 for w in words if w in text)
-
-def risk_gate(text: str) -> dict:
-    """
-    输出：
-      - is_substantive: 是否存在“实质舆情风险触发因素”
-      - reason: 门槛解释
-      - type: 事务型/政策型/纪律处分型/资源分配型/其他
-      - transactional: 是否明显事务型
-    """
-    t = text or ""
-
-    has_negative = _hit_any(t, NEGATIVE_CONSEQ_WORDS)
-    has_fairness = _hit_any(t, FAIRNESS_RESOURCE_WORDS)
-    has_discipline = _hit_any(t, DISCIPLINE_WORDS)
-    has_policy = _hit_any(t, POLICY_WORDS)
-
-    transactional_hits = _hit_count(t, TRANSACTIONAL_HINTS)
-    transactional = transactional_hits >= 2 and (not has_negative) and (not has_fairness) and (not has_discipline)
-
-    # 类型
-    if has_discipline or _hit_any(t, ["处分", "违纪", "通报"]):
-        ntype = "纪律处分型"
-    elif has_fairness:
-        ntype = "资源分配型"
-    elif has_policy:
-        ntype = "政策制度型"
-    elif transactional:
-        ntype = "事务型"
-    else:
-        ntype = "其他"
-
-    # 门槛：只要出现“负面后果/不公平/纪律处分/政策强约束”才算实质风险
-    is_substantive = bool(has_negative or has_fairness or has_discipline or (has_policy and _hit_any(t, ["必须", "不得", "严禁", "一律", "否则", "逾期"])))
-
-    if transactional and not is_substantive:
-        return {
-            "is_substantive": False,
-            "reason": "该文本更像事务型通知，未出现惩戒后果/权益分配/纪律处分等实质舆情触发因素。",
-            "type": ntype,
-            "transactional": True,
-        }
-
-    if not is_substantive:
-        return {
-            "is_substantive": False,
-            "reason": "未检测到明确的惩戒后果、不公平分配、纪律处分或强约束条款；若有问题多为表达/信息完整度。",
-            "type": ntype,
-            "transactional": transactional,
-        }
-
-    return {
-        "is_substantive": True,
-        "reason": "检测到可能引发争议的触发因素（如后果条款/权益分配/纪律处分/强约束政策），建议进入舆情风险分析。",
-        "type": ntype,
-        "transactional": transactional,
-    }
-def normalize_issues(issues: list, raw_text: str) -> list:
-    if not issues:
-        return []
-
-    BAD_TITLES = {"风险点标题", "未命名", "(未命名)", "风险点", "标题", "", None}
-
-    fixed = []
-    used = set()
-
-    for i, it in enumerate(issues):
-        it = it or {}
-        title = (it.get("title") or "").strip()
-        evidence = (it.get("evidence") or "").strip()
-
-        # evidence 兜底：没有就从原文截一段
-        if not evidence:
-            t = (raw_text or "").strip().replace("\n", " ")
-            evidence = (t[:12] + "…") if len(t) > 12 else t
-            it["evidence"] = evidence
-
-        # title 修复：如果是占位词/空，改成根据 evidence 的标题
-        if (not title) or (title in BAD_TITLES) or (title.startswith("风险点")):
-            title = f"触发片段：{evidence[:12]}{'…' if len(evidence) > 12 else ''}"
-            it["title"] = title
-
-        # 防止重复：重复就加编号
-        if it["title"] in used:
-            it["title"] = f"{it['title']}（{i+1}）"
-        used.add(it["title"])
-
-        fixed.append(it)
-
-    return fixed
-
-# =========================
-# Model analyze（降低“过敏”）
-# =========================
-def local_fallback(text: str):
-    # 兜底：也走 risk_gate，避免兜底时过敏
-    gate = risk_gate(text)
-    if not gate["is_substantive"]:
-        return {
-            "risk_score": 10,
-            "risk_level": "LOW",
-            "summary": "未检测到实质舆情风险（偏事务型/日常沟通）。如需可做轻量表达优化。",
-            "issues": [],
-            "student_emotions": [],
-            "rewrites": [
-                {"name": "更清晰", "pred_risk_score": 10, "text": "（兜底）建议补充时间/地点/咨询方式，使信息更清晰。", "why": "事务型通知以信息完整为主。"},
-                {"name": "更安抚", "pred_risk_score": 10, "text": "（兜底）建议增加一句感谢/理解，语气更柔和。", "why": "降低误读与抵触。"},
-                {"name": "更可执行", "pred_risk_score": 10, "text": "（兜底）建议用清单列出“时间-地点-操作步骤”。", "why": "可执行性更强。"},
-            ],
-            "risk_gate": gate,
-        }
-
-    # 如果真有触发因素，再给一个中等强度兜底
-    return {
-        "risk_score": 55,
-        "risk_level": "MEDIUM",
-        "summary": "可能存在规则口径/后果表达引发争议的点，建议明确范围与例外。",
-        "issues": [],
-        "student_emotions": [],
-        "rewrites": [
-            {"name": "更清晰", "pred_risk_score": 45, "text": "（兜底）建议明确范围、时间窗口、执行标准与咨询渠道。", "why": "减少误读。"},
-            {"name": "更安抚", "pred_risk_score": 45, "text": "（兜底）说明目的与支持措施，避免对立语气。", "why": "降低抵触。"},
-            {"name": "更可执行", "pred_risk_score": 40, "text": "（兜底）用步骤清单+截止时间+申诉渠道。", "why": "更可操作。"},
-        ],
-        "risk_gate": gate,
-    }
-
-def analyze(text: str, scenario: str, profile: dict):
-    gate = risk_gate(text)
-
-    system_prompt = (
-        "你是高校舆情风险与学生情绪分析专家。"
-        "你必须输出【严格 JSON】且只能输出 JSON，不能有任何解释、前后缀、代码块标记。"
-        "JSON 必须可被 Python json.loads 直接解析。"
-    )
-
-    # 关键：在 prompt 里显式告诉模型“不要把调侃/不正式当舆情风险”
-    user_prompt = f"""
-你要先做【风险门槛判断 Risk Gate】，再决定是否进入“舆情风险分析”。
-
-【特别强调】
-- “风格不够正式/可能被调侃/可能被截图发群”不属于舆情风险，只能算“表达优化”；
-- 只有出现以下至少一类，才算“实质舆情风险”：
-  1) 明确惩戒/负面后果（处分、通报、追责、取消资格、逾期不受理等）
-  2) 资源/名额/资格分配导致的不公平争议
-  3) 纪律处分/违纪处理
-  4) 强约束政策且口径模糊可能引发权益受损
-
-【场景】{scenario}
-
-【受众画像】
-- 年级/阶段：{profile.get("grade")}
-- 身份：{profile.get("role")}
-- 性别：{profile.get("gender")}
-- 情绪敏感度：{profile.get("sensitivity")}
-- 画像补充：{profile.get("custom")}
-
-【原文】
-{text}
-
-【你必须输出的 JSON 结构】字段名必须一致：
-{{
-  "risk_gate": {{
-    "type": "事务型|政策制度型|纪律处分型|资源分配型|其他",
-    "is_substantive": true/false,
-    "reason": "一句话解释门槛判断"
-  }},
-  "risk_score": 0-100的整数,
-  "risk_level": "LOW"|"MEDIUM"|"HIGH",
-  "summary": "一句话结论（具体、可读）",
-  "issues": [
-    {{
-      "title": "风险点标题（如果只是表达风格，请写：表达优化点）",
-      "evidence": "原文中触发点短语（必须来自原文，尽量 3-12 字）",
-      "why": "原因（高校语境）",
-      "rewrite_tip": "怎么改（具体）"
-    }}
-  ],
-  "student_emotions": [
-    {{
-      "group": "学生群体名称",
-      "sentiment": "主要情绪（焦虑/抵触/困惑/担忧/紧张/轻松/无明显）",
-      "intensity": 0到1的小数,
-      "sample_comment": "一句典型评论（口语化）"
-    }}
-  ],
-  "rewrites": [
-    {{
-      "name": "必须为：更清晰 / 更安抚 / 更可执行",
-      "pred_risk_score": 0-100整数,
-      "text": "改写后的完整文本（含义一致，但表达要明显不同）",
-      "why": "1-2句话说明为何更稳"
-    }}
-  ]
-}}
-
-【强制规则】
-1) 如果 risk_gate.is_substantive=false：
-   - risk_level 必须是 LOW
-   - risk_score 必须 <= 25
-   - issues 最多 1 条，且必须是“表达优化点”，不要写传播链、不要写惩戒、不准渲染舆情
-   - student_emotions 必须为空数组 []
-2) rewrites 必须且只能 3 个，顺序：更清晰、更安抚、更可执行
-3) issues.evidence 必须能在原文中直接找到
-4) intensity 必须在 0~1
-"""
-
-    try:
-        content = call_deepseek(system_prompt, user_prompt)
-        # content = call_gpt(system_prompt, user_prompt)
-        parsed, _ = safe_extract_json(content)
-        if parsed is None:
-            return local_fallback(text)
-
-        # ---------- 统一修复 rewrites ----------
-        rewrites = parsed.get("rewrites", []) or []
-        buckets = {"更清晰": None, "更安抚": None, "更可执行": None}
-        for rw in rewrites:
-            n = (rw.get("name") or "").strip()
-            if n in buckets and buckets[n] is None:
-                rw["name"] = n
-                buckets[n] = rw
-        fixed = []
-        for n in ["更清晰", "更安抚", "更可执行"]:
-            if buckets[n] is not None:
-                fixed.append(buckets[n])
-        if len(fixed) < 3:
-            for rw in rewrites:
-                if rw not in fixed:
-                    fixed.append(rw)
-                if len(fixed) >= 3:
-                    break
-        parsed["rewrites"] = fixed[:3]
-        parsed["issues"] = normalize_issues(parsed.get("issues", []) or [], text)
-
-        # ---------- 硬规则后处理：Risk Gate 强制降敏 ----------
-        # 以本地 gate 为准（避免模型误判）
-        parsed.setdefault("risk_gate", {})
-        parsed["risk_gate"]["type"] = gate["type"]
-        parsed["risk_gate"]["is_substantive"] = gate["is_substantive"]
-        parsed["risk_gate"]["reason"] = gate["reason"]
-
-        if not gate["is_substantive"]:
-            # 强制 LOW
-            parsed["risk_level"] = "LOW"
-            parsed["risk_score"] = min(int(parsed.get("risk_score", 15) or 15), 25)
-            # 不渲染情绪/传播链
-            parsed["student_emotions"] = []
-            # issues 只保留最多 1 条表达优化
-            issues = parsed.get("issues", []) or []
-            if issues:
-                issues = issues[:1]
-                issues[0]["title"] = "表达优化点"
-            parsed["issues"] = issues
-            # summary 更克制
-            parsed["summary"] = parsed.get("summary") or "未检测到实质舆情风险（偏事务型/日常沟通）。如需可做轻量表达优化。"
-
-        return parsed
-    except Exception:
-        return local_fallback(text)
-
 # =========================
 # Session state
 # =========================
@@ -866,6 +86,8 @@ if "last_inputs" not in st.session_state:
     st.session_state.last_inputs = {"text": "", "scenario": "", "profile": {}}
 if "is_loading" not in st.session_state:
     st.session_state.is_loading = False
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex[:12]  # token 用量 / 预算按它记账
 
 for k in ["更清晰", "更安抚", "更可执行"]:
     st.session_state.setdefault(f"emoji_on_{k}", False)
@@ -893,32 +115,32 @@ with right:
     st.markdown('<div class="section-h">场景与受众</div>', unsafe_allow_html=True)
 
     st.markdown("**发布场景**")
-    scenario = st.selectbox(
-        " ",
-        [
-            "宿舍与安全管理通知",
-            "课程/考试/成绩相关通知",
-            "奖助学金/资助政策通知",
-            "纪律处分/违纪处理通告",
-            "校内活动/讲座报名通知",
-            "疫情/卫生/公共安全通知",
-            "其他（通用高校公告）",
-        ],
-        index=0,
-        label_visibility="collapsed",
-    )
+    scenario = st.selectbox(" ", SCENARIO_OPTIONS, index=0, label_visibility="collapsed")
 
     st.markdown("**受众画像**")
     c1, c2 = st.columns(2)
     with c1:
-        grade = st.selectbox("年级/阶段", ["新生", "大二/大三", "大四/毕业班", "研究生", "混合群体"], index=1)
-        role = st.selectbox("身份", ["普通学生", "宿舍长/楼委", "学生干部", "社团成员", "考研/保研群体", "留学生/交流生", "混合"], index=0)
+        grade = st.selectbox("年级/阶段", GRADE_OPTIONS, index=1)
+        role = st.selectbox("身份", ROLE_OPTIONS, index=0)
     with c2:
-        gender = st.selectbox("性别", ["不指定", "偏男性", "偏女性", "混合"], index=0)
-        sensitivity = st.selectbox("情绪敏感度", ["低", "中", "高"], index=1)
+        gender = st.selectbox("性别", GENDER_OPTIONS, index=0)
+        sensitivity = st.selectbox("情绪敏感度", SENSITIVITY_OPTIONS, index=1)
 
     custom = st.text_input("画像补充（可选）", placeholder="例如：近期对宿舍检查较敏感，担心被通报。")
     profile = {"grade": grade, "role": role, "gender": gender, "sensitivity": sensitivity, "custom": custom}
+    bypass_cache = st.checkbox("忽略缓存，重新预测", value=False, help="同样的文本/场景/画像默认直接复用上次结果")
+    use_stream = st.checkbox("边生成边显示", value=True, help="流式接收模型输出，结论先出、改写随后补齐")
+    use_decomposed = st.checkbox(
+        "拆分并行生成",
+        value=False,
+        help="评分、情绪和三种改写拆成几个小请求同时生成，总耗时接近最慢的那一个（不支持边生成边显示）",
+    )
+    analyze_mode = "decomposed" if use_decomposed else "single"
+    use_incremental = st.checkbox(
+        "只重新分析改动的段落",
+        value=True,
+        help="和上一次预测的文本逐段比对，只把改动的段落发给模型并重估整体评分；改写沿用上一版",
+    )
 
     btn_area = st.empty()
 
@@ -945,14 +167,96 @@ if clicked:
         )
         time.sleep(0.05)
 
-        with st.spinner("正在生成预测…"):
-            result = analyze(text, scenario, profile)
-
-        st.session_state.result = result
-        st.session_state.last_inputs = {"text": text, "scenario": scenario, "profile": profile}
+        before = USAGE.session_totals(st.session_state.session_id)
+        result = None
+        busy = None
+        with trace() as tr, usage_labels(session=st.session_state.session_id), \
+                queue_observer(queue_status_writer(btn_area)):
+            try:
+                previous = {**st.session_state.last_inputs, "result": st.session_state.result}
+                plan = None
+                if use_incremental and not bypass_cache:
+                    plan = incremental_plan(text, scenario, profile, previous)
+                if plan is not None:
+                    with st.spinner(f"正在重新分析改动的 {len(plan.changed)} 段…"):
+                        result = analyze_incremental(text, scenario, profile, previous, mode=analyze_mode, plan=plan)
+                elif use_stream and analyze_mode == "single":
+                    preview = st.empty()
+                    for view, arrived, done in analyze_stream(text, scenario, profile, bypass_cache=bypass_cache):
+                        if done:
+                            result = view
+                            break
+                        with preview.container():
+                            render_stream_preview(view, arrived)
+                else:
+                    with st.spinner("正在生成预测…"):
+                        result = analyze(text, scenario, profile, bypass_cache=bypass_cache, mode=analyze_mode)
+            except UpstreamBusyError as e:
+                busy = str(e)
+
+        st.session_state.last_trace = tr.summary()
+        after = USAGE.session_totals(st.session_state.session_id)
+        keys = ("calls", "prompt_tokens", "cache_hit_tokens", "completion_tokens")
+        st.session_state.last_usage = {k: after[k] - before[k] for k in keys}
         st.session_state.is_loading = False
+        st.session_state.busy_error = busy
+        if result is not None:
+            st.session_state.result = result
+            st.session_state.last_inputs = {"text": text, "scenario": scenario, "profile": profile}
         st.rerun()
 
+if st.session_state.get("busy_error"):
+    st.error(f"现在使用的人太多：{st.session_state.busy_error}")
+    st.session_state.busy_error = None
+
+laps.mark("inputs")
+
+# =========================
+# Audience matrix（多受众并发模拟）
+# =========================
+with st.expander("受众矩阵：一次模拟多种受众", expanded=False):
+    m1, m2, m3 = st.columns(3)
+    with m1:
+        mx_grades = st.multiselect("年级/阶段", GRADE_OPTIONS, default=GRADE_OPTIONS[:4], key="mx_grades")
+    with m2:
+        mx_roles = st.multiselect("身份", ROLE_OPTIONS, default=ROLE_OPTIONS[:3], key="mx_roles")
+    with m3:
+        mx_sens = st.multiselect("情绪敏感度", SENSITIVITY_OPTIONS, default=SENSITIVITY_OPTIONS, key="mx_sens")
+    mx_workers = st.slider("并发数", 1, 8, 4, key="mx_workers")
+    mx_profiles = profile_matrix(mx_grades, mx_roles, mx_sens, gender=gender, custom=custom)
+    st.caption(f"共 {len(mx_profiles)} 种受众组合（单次最多 {MATRIX_MAX_PROFILES} 种）；性别与画像补充沿用上方设置。")
+
+    mx_clicked = st.button("运行矩阵模拟", key="btn_matrix", use_container_width=True)
+    mx_area = st.empty()
+
+    if mx_clicked:
+        if not text.strip():
+            st.warning("请先输入一段文本。")
+        elif not mx_profiles:
+            st.warning("请至少各选一个年级、身份和敏感度。")
+        else:
+            mx_profiles = mx_profiles[:MATRIX_MAX_PROFILES]
+            mx_rows = list(dict.fromkeys(f"{p['grade']}｜{p['role']}" for p in mx_profiles))
+            mx_cells = {}
+            mx_progress = st.progress(0.0)
+            mx_results = analyze_matrix(
+                text, scenario, mx_profiles, max_workers=mx_workers, bypass_cache=bypass_cache, mode=analyze_mode
+            )
+            # 生成器在迭代时才提交任务，标签要包住整个循环
+            try:
+                with usage_labels(session=st.session_state.session_id):
+                    for n, (_, p, res) in enumerate(mx_results, start=1):
+                        mx_cells[(f"{p['grade']}｜{p['role']}", p["sensitivity"])] = matrix_cell(res)
+                        mx_area.markdown(matrix_heatmap_html(mx_rows, mx_sens, mx_cells), unsafe_allow_html=True)
+                        mx_progress.progress(n / len(mx_profiles), text=f"已完成 {n}/{len(mx_profiles)}")
+            except UpstreamBusyError as e:
+                st.error(f"现在使用的人太多，矩阵只完成了 {len(mx_cells)}/{len(mx_profiles)} 种组合：{e}")
+            st.session_state.matrix = {"rows": mx_rows, "cols": list(mx_sens), "cells": mx_cells}
+    elif st.session_state.get("matrix"):
+        mx = st.session_state.matrix
+        mx_area.markdown(matrix_heatmap_html(mx["rows"], mx["cols"], mx["cells"]), unsafe_allow_html=True)
+
+laps.mark("matrix")
 st.divider()
 
 result = st.session_state.result
@@ -966,6 +270,26 @@ if not result:
     st.stop()
 
 render_overview(int(result.get("risk_score", 0)), result.get("risk_level", "LOW"), result.get("summary", ""))
+if result.get("cached"):
+    st.caption("⚡ 命中缓存：与之前某次预测的文本/场景/画像完全一致，直接复用了结果。")
+elif result.get("prescored"):
+    st.caption(f"⚡ 本地预评分判断为低风险（置信度 {result['prescored']['confidence']:.0%}），没有调用模型，"
+               "下面的改写建议是通用模板；需要模型写的改写请勾选「忽略缓存，重新预测」再预测一次。")
+elif result.get("coalesced"):
+    st.caption("⚡ 同样的文本/场景/画像刚好有人在预测，已直接共用那一次的结果。")
+elif result.get("long_doc"):
+    ld = result["long_doc"]
+    st.caption(f"📄 长文模式：按章/条切成 {ld['chunks']} 块并发分析后归并"
+               + (f"，其中 {ld['failed']} 块分析失败未计入" if ld.get("failed") else "") + "。")
+elif result.get("incremental"):
+    inc = result["incremental"]
+    st.caption(f"⚡ 增量分析：共 {inc['paragraphs']} 段，只重新分析了改动的 {inc['changed']} 段，"
+               f"沿用 {inc['carried_issues']} 个风险点。")
+if result.get("budget_degraded") == "fallback":
+    st.warning("本时段的模型调用额度已用完，本次为本地规则兜底结果，仅供参考。")
+elif result.get("budget_degraded") == "lite" or result.get("lite"):
+    st.info("本时段调用额度紧张，本次为精简分析：只给出风险评分与风险点，未生成情绪预测和改写。")
+laps.mark("overview")
 
 # Risk Gate（给用户看的解释卡片：不要暴露 is_substantive）
 rg = result.get("risk_gate", {}) or {}
@@ -1013,9 +337,60 @@ if rg:
         unsafe_allow_html=True,
     )
 
+laps.mark("risk_gate_card")
+
 # =========================
 # Emotion Prediction（LOW 默认不渲染，避免“吓人”）
 # =========================
+# --- 修复：title 可能是占位符“风险点标题”，用 evidence/why 兜底 ---
+def _safe_issue_title(it: dict) -> str:
+    t = (it.get("title") or "").strip()
+    ev = (it.get("evidence") or "").strip()
+    why = (it.get("why") or "").strip()
+
+    bad = {"风险点标题", "(未命名)", "未命名", "风险点", "标题"}
+    if (not t) or (t in bad) or ("风险点标题" in t):
+        if ev:
+            return f"触发：{ev}"
+        if why:
+            return (why[:14] + "…") if len(why) > 14 else why
+        return "风险点"
+    return t
+
+@st.fragment
+def risk_point_picker(issues: list[dict]):
+    """风险点单选 + 详情卡片；切换选项只重跑这个片段"""
+    count_render("risk_point_picker")
+    options = [f"{i+1}. {_safe_issue_title(it)}" for i, it in enumerate(issues)]
+    selected = st.radio(" ", options=options, index=0, label_visibility="collapsed", key="risk_pick")
+
+    idx = int(selected.split(".")[0]) - 1
+    it = issues[idx]
+
+    st.markdown(
+        f"""
+        <div class='rp-item'>
+          <div style="font-weight:900; margin-bottom:8px; color:rgba(37,99,235,1);">
+            触发片段：{html.escape(str(it.get('evidence','')))}
+          </div>
+          <div style="margin-top:6px; color:rgba(15,23,42,.88); line-height:1.75;">
+            <b>原因：</b>{html.escape(str(it.get('why','')))}
+          </div>
+          <div style="margin-top:8px; color:rgba(15,23,42,.88); line-height:1.75;">
+            <b>建议：</b>{html.escape(str(it.get('rewrite_tip','')))}
+          </div>
+        </div>
+        """,
+        unsafe_allow_html=True,
+    )
+
+# 原文 + 风险点 evidence 高亮（长文本默认收起）
+evidence = [it.get("evidence", "") for it in issues if isinstance(it, dict)]
+if current_text:
+    with st.expander("原文（高亮为风险点触发片段）", expanded=bool(evidence) and len(current_text) <= 3000):
+        st.markdown(highlight_text_html(current_text, evidence), unsafe_allow_html=True)
+laps.mark("original_text")
+
 st.markdown('<div class="section-h">情绪预测</div>', unsafe_allow_html=True)
 
 risk_level = result.get("risk_level", "LOW")
@@ -1048,44 +423,7 @@ else:
             else:
                 st.info("未识别到明显风险点。")
         else:
-            # --- 修复：title 可能是占位符“风险点标题”，用 evidence/why 兜底 ---
-            def _safe_issue_title(it: dict) -> str:
-                t = (it.get("title") or "").strip()
-                ev = (it.get("evidence") or "").strip()
-                why = (it.get("why") or "").strip()
-
-                bad = {"风险点标题", "(未命名)", "未命名", "风险点", "标题"}
-                if (not t) or (t in bad) or ("风险点标题" in t):
-                    if ev:
-                        return f"触发：{ev}"
-                    if why:
-                        return (why[:14] + "…") if len(why) > 14 else why
-                    return "风险点"
-                return t
-
-            options = [f"{i+1}. {_safe_issue_title(it)}" for i, it in enumerate(issues)]
-            selected = st.radio(" ", options=options, index=0, label_visibility="collapsed", key="risk_pick")
-
-            idx = int(selected.split(".")[0]) - 1
-            it = issues[idx]
-
-            st.markdown(
-                f"""
-                <div class='rp-item'>
-                  <div style="font-weight:900; margin-bottom:8px; color:rgba(37,99,235,1);">
-                    触发片段：{html.escape(str(it.get('evidence','')))}
-                  </div>
-                  <div style="margin-top:6px; color:rgba(15,23,42,.88); line-height:1.75;">
-                    <b>原因：</b>{html.escape(str(it.get('why','')))}
-                  </div>
-                  <div style="margin-top:8px; color:rgba(15,23,42,.88); line-height:1.75;">
-                    <b>建议：</b>{html.escape(str(it.get('rewrite_tip','')))}
-                  </div>
-                </div>
-                """,
-                unsafe_allow_html=True,
-            )
-   
+            risk_point_picker(issues)
 
     with emo_col:
         st.markdown("**学生情绪**")
@@ -1127,11 +465,81 @@ else:
                 )
 
 st.markdown("<div style='height:18px;'></div>", unsafe_allow_html=True)
+laps.mark("emotions")
 
 # =========================
 # Rewrite suggestions
 # =========================
+def _toggle_emoji(tname: str):
+    key = f"emoji_on_{tname}"
+    st.session_state[key] = not st.session_state[key]
+
+def _request_copy(tname: str, final_txt: str):
+    st.session_state[f"copy_req_{tname}"] = True
+    st.session_state[f"copy_text_{tname}"] = final_txt
+
+@st.fragment
+def rewrite_tab(tname: str, rw: dict):
+    """单个改写版本的卡片；emoji / 复制按钮只重跑这个片段，不重跑整页"""
+    count_render(f"rewrite_tab:{tname}")
+    pr = rw.get("pred_risk_score", "-")
+    why = rw.get("why", "")
+
+    st.markdown(
+        f"""
+        <div class="card">
+          <div style="display:flex; justify-content:space-between; gap:12px; align-items:flex-start;">
+            <div style="font-weight:900; font-size:16px; line-height:1.25;">{html.escape(tname)}</div>
+            <span class="blue-tag">预测风险 {html.escape(str(pr))}</span>
+          </div>
+          <div class="muted" style="margin-top:10px; font-size:13px; line-height:1.55;">
+            {html.escape(str(why))}
+          </div>
+        </div>
+        """,
+        unsafe_allow_html=True,
+    )
+
+    emoji_key = f"emoji_on_{tname}"
+
+    final_txt = format_rewrite(rw.get("text", "") or "", bool(st.session_state[emoji_key]))
+
+    safe_text = html.escape(final_txt).replace("\n", "<br>")
+    st.markdown(
+        f"""
+        <div class="card" style="margin-top:12px; font-size:15px; line-height:1.85;">
+          {safe_text}
+        </div>
+        """,
+        unsafe_allow_html=True,
+    )
+
+    st.markdown("<div style='height:14px;'></div>", unsafe_allow_html=True)
+
+    b1, b2 = st.columns(2, gap="medium")
+
+    with b1:
+        label = "取消emoji" if st.session_state[emoji_key] else "添加emoji"
+        st.button(
+            label, key=f"btn_emoji_{tname}", type="secondary", use_container_width=True,
+            on_click=_toggle_emoji, args=(tname,),
+        )
+
+    with b2:
+        st.button(
+            "复制该版本", key=f"btn_copy_{tname}", type="secondary", use_container_width=True,
+            on_click=_request_copy, args=(tname, final_txt),
+        )
+
+    if st.session_state.get(f"copy_req_{tname}", False):
+        clipboard_copy_fire(st.session_state.get(f"copy_text_{tname}", ""))
+        st.session_state[f"copy_req_{tname}"] = False
+
 st.markdown('<div class="section-h">改写建议</div>', unsafe_allow_html=True)
+if (result.get("long_doc") or {}).get("rewrite_scope"):
+    st.caption(f"长文只针对风险最高的一节改写：{result['long_doc']['rewrite_scope']}")
+if result.get("rewrites_stale"):
+    st.caption("以下改写基于上一版文本；需要按最新文本改写，请勾选「忽略缓存，重新预测」再预测一次。")
 
 rewrites = result.get("rewrites", []) or []
 while len(rewrites) < 3:
@@ -1146,61 +554,11 @@ for tname, tab in zip(["更清晰", "更安抚", "更可执行"], tabs):
     rw["name"] = tname
 
     with tab:
-        pr = rw.get("pred_risk_score", "-")
-        why = rw.get("why", "")
-
-        st.markdown(
-            f"""
-            <div class="card">
-              <div style="display:flex; justify-content:space-between; gap:12px; align-items:flex-start;">
-                <div style="font-weight:900; font-size:16px; line-height:1.25;">{html.escape(tname)}</div>
-                <span class="blue-tag">预测风险 {html.escape(str(pr))}</span>
-              </div>
-              <div class="muted" style="margin-top:10px; font-size:13px; line-height:1.55;">
-                {html.escape(str(why))}
-              </div>
-            </div>
-            """,
-            unsafe_allow_html=True,
-        )
-
-        emoji_key = f"emoji_on_{tname}"
-
-        raw_txt = rw.get("text", "") or ""
-        cleaned = pretty_notice(raw_txt)
-        final_txt = add_emojis_smart(cleaned) if st.session_state[emoji_key] else cleaned
-
-        safe_text = html.escape(final_txt).replace("\n", "<br>")
-        st.markdown(
-            f"""
-            <div class="card" style="margin-top:12px; font-size:15px; line-height:1.85;">
-              {safe_text}
-            </div>
-            """,
-            unsafe_allow_html=True,
-        )
-
-        st.markdown("<div style='height:14px;'></div>", unsafe_allow_html=True)
-
-        b1, b2 = st.columns(2, gap="medium")
-
-        with b1:
-            label = "取消emoji" if st.session_state[emoji_key] else "添加emoji"
-            if st.button(label, key=f"btn_emoji_{tname}", type="secondary", use_container_width=True):
-                st.session_state[emoji_key] = not st.session_state[emoji_key]
-                st.rerun()
-
-        with b2:
-            if st.button("复制该版本", key=f"btn_copy_{tname}", type="secondary", use_container_width=True):
-                st.session_state[f"copy_req_{tname}"] = True
-                st.session_state[f"copy_text_{tname}"] = final_txt
-                st.rerun()
-
-        if st.session_state.get(f"copy_req_{tname}", False):
-            clipboard_copy_fire(st.session_state.get(f"copy_text_{tname}", ""))
-            st.session_state[f"copy_req_{tname}"] = False
+        rewrite_tab(tname, rw)
+laps.mark("rewrites")
 
 st.markdown(
     "<div class='footnote'>注：本工具用于文字优化与风险提示；不分析个人，不替代人工判断。</div>",
     unsafe_allow_html=True,
 )
+render_debug_panel()
@@ -0,0 +1,219 @@
+"""
+清小知 —— 命令行批量预检
+
+开学前把排队的通知一次性跑一遍 analyze()：
+    python batch.py notices.jsonl -o results.jsonl --concurrency 4
+    python batch.py notices.csv -o results.jsonl            # 中断后原样再跑一次即可续跑
+
+输入（JSONL 每行一个对象 / CSV 带表头）：
+    text      必填，通知原文
+    scenario  可选，发布场景；缺省用 --scenario
+    profile   可选，受众画像（JSONL 里是对象，CSV 里是 JSON 字符串）；
+              也可以直接给 grade / role / gender / sensitivity / custom 列
+    id        可选，行标识；缺省用 (text, scenario, profile) 的内容哈希
+
+输出是 JSONL，每处理完一行立刻追加一条：
+    {"id", "line", "scenario", "profile", "status": ok|fallback|error, "elapsed", "result"|"error"}
+续跑时已经是 ok / fallback 的 id 会跳过（--retry-fallback 时 fallback 也重跑），
+同一个 id 出现多次时以文件里最后一条为准。
+"""
+import argparse
+import csv
+import hashlib
+import json
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import core
+from metrics import REGISTRY
+
+DEFAULT_SCENARIO = "其他（通用高校公告）"
+# 与页面上受众画像的默认选项保持一致
+DEFAULT_PROFILE = {"grade": "大二/大三", "role": "普通学生", "gender": "不指定", "sensitivity": "中", "custom": ""}
+PROFILE_KEYS = list(DEFAULT_PROFILE.keys())
+
+
+def row_id(text: str, scenario: str, profile: dict) -> str:
+    blob = json.dumps([text, scenario, profile], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()[:16]
+
+
+def _read_rows(path: Path):
+    """逐行产出 (行号, dict)，不把整个文件读进内存；解析不了或不是对象的行产出带 __error__ 的 dict"""
+    if path.suffix.lower() == ".csv":
+        with path.open(encoding="utf-8-sig", newline="") as f:
+            for i, row in enumerate(csv.DictReader(f), start=2):
+                yield i, row
+        return
+    with path.open(encoding="utf-8") as f:
+        for i, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield i, {"__error__": f"bad_json: {e}"}
+                continue
+            if not isinstance(row, dict):
+                # 合法 JSON 但不是对象（[1,2] / "x" / 3），和坏行一样记一条 bad_row
+                row = {"__error__": f"not_an_object: {type(row).__name__}"}
+            yield i, row
+
+
+def normalize_row(row: dict, default_scenario: str) -> dict:
+    if "__error__" in row:
+        raise ValueError(row["__error__"])
+    text = (row.get("text") or "").strip()
+    if not text:
+        raise ValueError("empty_text")
+    scenario = (row.get("scenario") or "").strip() or default_scenario
+
+    profile = row.get("profile")
+    if isinstance(profile, str):
+        profile = json.loads(profile) if profile.strip() else {}
+    profile = dict(profile or {})
+    for k in PROFILE_KEYS:
+        if row.get(k) not in (None, ""):
+            profile[k] = row[k]
+    profile = {**DEFAULT_PROFILE, **profile}
+
+    rid = str(row.get("id") or "").strip() or row_id(text, scenario, profile)
+    return {"id": rid, "text": text, "scenario": scenario, "profile": profile}
+
+
+def load_done(out_path: Path, retry_fallback: bool = False) -> set:
+    done_status = {"ok"} if retry_fallback else {"ok", "fallback"}
+    status = {}
+    if out_path.exists():
+        with out_path.open(encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # 上次中断时写了半行
+                status[rec.get("id")] = rec.get("status")
+    return {rid for rid, st in status.items() if st in done_status}
+
+
+def _run_one(item: dict, bypass_cache: bool = False, mode: str | None = None) -> dict:
+    t0 = time.perf_counter()
+    try:
+        result = core.analyze(item["text"], item["scenario"], item["profile"], bypass_cache=bypass_cache, mode=mode)
+        status = "fallback" if result.get("fallback") else "ok"
+        rec = {"status": status, "result": result}
+    except Exception as e:
+        rec = {"status": "error", "error": f"{type(e).__name__}: {e}"}
+    rec["elapsed"] = round(time.perf_counter() - t0, 3)
+    return rec
+
+
+def run_batch(in_path: Path, out_path: Path, concurrency: int = 4, scenario: str = DEFAULT_SCENARIO,
+              retry_fallback: bool = False, limit: int | None = None, bypass_cache: bool = False,
+              mode: str | None = None, log=sys.stderr) -> dict:
+    done = load_done(out_path, retry_fallback)
+    stats = {"rows": 0, "skipped": 0, "ok": 0, "fallback": 0, "error": 0, "latency_sum": 0.0}
+    seen = set()
+    t_start = time.perf_counter()
+
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    with out_path.open("a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        pending = {}
+
+        def write(meta: dict, rec: dict):
+            stats[rec["status"]] += 1
+            stats["latency_sum"] += rec.get("elapsed", 0.0)
+            out.write(json.dumps({**meta, **rec}, ensure_ascii=False) + "\n")
+            out.flush()
+
+        def drain(block_until: int):
+            # 在途任务数降到 block_until 以下才返回
+            while len(pending) > block_until:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    write(pending.pop(fut), fut.result())
+
+        submitted = 0
+        reported = 0
+        for line_no, raw in _read_rows(in_path):
+            if limit is not None and submitted >= limit:
+                break
+            stats["rows"] += 1
+            try:
+                item = normalize_row(raw, scenario)
+            except Exception as e:
+                rid = str(raw.get("id") or f"line-{line_no}")
+                if rid not in done:
+                    write({"id": rid, "line": line_no}, {"status": "error", "error": f"bad_row: {e}", "elapsed": 0.0})
+                continue
+            if item["id"] in done or item["id"] in seen:
+                stats["skipped"] += 1
+                continue
+            seen.add(item["id"])
+
+            meta = {"id": item["id"], "line": line_no, "scenario": item["scenario"], "profile": item["profile"]}
+            pending[pool.submit(_run_one, item, bypass_cache, mode)] = meta
+            submitted += 1
+            drain(concurrency * 2)  # 有界：不会把整个文件的任务都塞进队列
+
+            processed = stats["ok"] + stats["fallback"] + stats["error"]
+            if processed - reported >= 50:
+                reported = processed
+                print(f"… 已完成 {processed} 行", file=log)
+        drain(0)
+
+    wall = time.perf_counter() - t_start
+    processed = stats["ok"] + stats["fallback"] + stats["error"]
+    stats["processed"] = processed
+    stats["wall_s"] = round(wall, 3)
+    stats["throughput_rps"] = round(processed / wall, 3) if wall > 0 else 0.0
+    stats["avg_latency_s"] = round(stats.pop("latency_sum") / processed, 3) if processed else 0.0
+    return stats
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="批量预检高校通知（JSONL/CSV → JSONL）")
+    ap.add_argument("input", type=Path, help="输入文件（.jsonl / .csv）")
+    ap.add_argument("-o", "--output", type=Path, required=True, help="结果文件（JSONL，追加写入，可续跑）")
+    ap.add_argument("-c", "--concurrency", type=int, default=4, help="并发请求数（默认 4）")
+    ap.add_argument("--scenario", default=DEFAULT_SCENARIO, help="行里没有 scenario 时使用的场景")
+    ap.add_argument("--retry-fallback", action="store_true", help="续跑时把上次走了兜底的行也重跑")
+    ap.add_argument("--limit", type=int, default=None, help="本次最多提交多少行（调试用）")
+    ap.add_argument("--no-cache", action="store_true", help="不读结果缓存，全部重新调用模型（结果仍写回缓存）")
+    ap.add_argument("--mode", choices=core.ANALYZE_MODES, default=None,
+                    help="single / decomposed / lite / long，缺省取 QXZ_ANALYZE_MODE（超长文本自动走 long）")
+    ap.add_argument("--metrics-out", type=Path, default=None,
+                    help="结束时导出分阶段耗时/兜底/解析错误指标：.jsonl 追加 JSONL，其它后缀写 Prometheus 文本")
+    args = ap.parse_args(argv)
+
+    if not core.DEEPSEEK_API_KEY:
+        print("未检测到 DEEPSEEK_API_KEY，请先 export DEEPSEEK_API_KEY='你的key'", file=sys.stderr)
+        return 2
+    if not args.input.exists():
+        print(f"找不到输入文件：{args.input}", file=sys.stderr)
+        return 2
+
+    stats = run_batch(
+        args.input, args.output, max(1, args.concurrency), args.scenario,
+        args.retry_fallback, args.limit, bypass_cache=args.no_cache, mode=args.mode,
+    )
+    print(
+        f"完成：{stats['processed']} 行（跳过已完成 {stats['skipped']}）｜"
+        f"成功 {stats['ok']}｜兜底 {stats['fallback']}｜失败 {stats['error']}｜"
+        f"耗时 {stats['wall_s']}s｜吞吐 {stats['throughput_rps']} 行/s｜平均 {stats['avg_latency_s']}s/行",
+        file=sys.stderr,
+    )
+    cache = core.get_cache()
+    if cache is not None:
+        print(f"缓存：{cache.snapshot()}", file=sys.stderr)
+    print(f"token 用量：{core.USAGE.snapshot()['global']}", file=sys.stderr)
+    if args.metrics_out:
+        REGISTRY.write(args.metrics_out)
+        print(f"指标已导出：{args.metrics_out}", file=sys.stderr)
+    return 1 if stats["error"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
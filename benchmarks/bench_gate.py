@@ -0,0 +1,115 @@
+"""
+risk_gate 逐条循环 vs gatebatch 向量化：逐行一致性 + 耗时 + 分块读盘
+
+    python benchmarks/bench_gate.py                    # 默认 100000 条
+    python benchmarks/bench_gate.py -n 300000 --chunksize 50000
+
+语料：corpus.NOTICES 里的通知随机截一段、拼上门槛词和随机字（覆盖“携带好”这类部分重叠的词），
+外加少量空值 / 非字符串。先校验 gate_frame 每行的结论和命中与 risk_gate / GATE_AUTOMATON.scan 一致
+（不一致退出码 1），再计时：
+- 逐条：[risk_gate(t) for t in texts]
+- 向量化：gate_frame(texts)
+- 分块读盘：写成临时 JSONL，iter_gate_file 按 --chunksize 行一块跑完，报告吞吐和进程峰值内存
+"""
+import argparse
+import json
+import random
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE.parent))
+
+import core  # noqa: E402
+import gatebatch  # noqa: E402
+from corpus import NOTICES  # noqa: E402
+
+_FILLER = "的了是在有和与请于将对带好人手取地点时间一二三，。\n"
+
+
+def make_archive(n: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    words = [w for ws in core.GATE_LEXICONS.values() for w in ws]
+    out = []
+    for _ in range(n):
+        r = rng.random()
+        if r < 0.002:
+            out.append(rng.choice([None, "", 0]))
+            continue
+        base = rng.choice(NOTICES)
+        a = rng.randrange(len(base))
+        parts = [base[a:a + rng.randint(20, 600)]]
+        for _ in range(rng.randint(0, 4)):
+            parts.append(rng.choice(words) if rng.random() < 0.5 else "".join(rng.choices(_FILLER, k=rng.randint(1, 4))))
+        out.append("".join(parts))
+    return out
+
+
+def _expected(t) -> tuple:
+    t = "" if t is None else t if isinstance(t, str) else str(t)
+    g = core.risk_gate(t)
+    hits = core.GATE_AUTOMATON.scan(t)
+    return (g["is_substantive"], g["reason"], g["type"], g["transactional"], len(hits["transactional"]),
+            *(bool(hits[c]) for c in core.GATE_LEXICONS))
+
+
+def mismatches(texts: list, frame) -> int:
+    got = frame[gatebatch.COLUMNS].itertuples(index=False, name=None)
+    return sum(
+        1 for t, row in zip(texts, got)
+        if tuple(x.item() if hasattr(x, "item") else x for x in row) != _expected(t)
+    )
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("-n", type=int, default=100_000, help="条数")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--chunksize", type=int, default=50_000, help="分块读盘时每块行数")
+    args = ap.parse_args(argv)
+
+    texts = make_archive(args.n, args.seed)
+    chars = sum(len(t) for t in texts if isinstance(t, str))
+    print(f"语料：{len(texts)} 条｜平均 {chars / max(1, len(texts)):.0f} 字")
+
+    t0 = time.perf_counter()
+    loop = [core.risk_gate(t if isinstance(t, str) else "" if t is None else str(t)) for t in texts]
+    t_loop = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    frame = gatebatch.gate_frame(texts)
+    t_vec = time.perf_counter() - t0
+
+    bad = mismatches(texts, frame)
+    print(f"逐条 risk_gate   {t_loop:7.2f}s   {len(loop) / t_loop:10.0f} 条/s")
+    print(f"向量化 gate_frame {t_vec:7.2f}s   {len(texts) / t_vec:10.0f} 条/s   ×{t_loop / t_vec:.1f}")
+    print(f"逐行一致：{'是' if not bad else f'否（{bad} 条不一致）'}")
+    print(f"类型分布：{frame['type'].value_counts().to_dict()}｜实质风险 {int(frame['is_substantive'].sum())}")
+
+    with tempfile.TemporaryDirectory() as d:
+        path = Path(d) / "archive.jsonl"
+        with path.open("w", encoding="utf-8") as f:
+            for i, t in enumerate(texts):
+                f.write(json.dumps({"id": f"n{i}", "text": t}, ensure_ascii=False) + "\n")
+        size_mb = path.stat().st_size / 2**20
+        rss0 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        t0 = time.perf_counter()
+        rows = substantive = 0
+        for part in gatebatch.iter_gate_file(path, args.chunksize):
+            rows += len(part)
+            substantive += int(part["is_substantive"].sum())
+        t_file = time.perf_counter() - t0
+        rss1 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"分块读盘（每块 {args.chunksize} 行）{t_file:7.2f}s   {rows / t_file:10.0f} 条/s｜"
+          f"文件 {size_mb:.0f} MB｜峰值内存 {rss1 / 1024:.0f} MB"
+          f"（读盘前 {rss0 / 1024:.0f} MB）")
+    if rows != len(texts) or substantive != int(frame["is_substantive"].sum()):
+        print("分块读盘的结果与一次性计算不一致", file=sys.stderr)
+        bad += 1
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""
+highlight_text_html 新旧实现对比基准
+
+    python benchmarks/bench_highlight.py                 # 默认 50KB 原文、300 条 evidence
+    python benchmarks/bench_highlight.py --kb 200 -p 1000
+
+旧版每条短语做一次 `in` + 一次 str.replace，短语之间有重叠时会把 <mark> 套进已经插入的标签里；
+新版用 kwmatch 一遍扫出全部区间、合并后一次拼接。
+先校验新版：去掉标签后与转义原文逐字一致、高亮区间 = 朴素逐条查找得到的区间并集，再计时。
+"""
+import argparse
+import html
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import core  # noqa: E402
+
+_TAG = re.compile(r"</?mark[^>]*>")
+_MARK = re.compile(r"<mark class='hl'>(.*?)</mark>", re.S)
+
+
+# ---------- 旧实现（原样保留，用于对照） ----------
+def legacy_highlight_text_html(raw_text: str, phrases: list[str]) -> str:
+    if not raw_text:
+        return ""
+    safe = html.escape(raw_text)
+    uniq = []
+    for p in phrases or []:
+        p = (p or "").strip()
+        if not p:
+            continue
+        if p not in raw_text:
+            continue
+        if p not in uniq:
+            uniq.append(p)
+    for p in sorted(uniq, key=len, reverse=True):
+        safe_p = html.escape(p)
+        safe = safe.replace(safe_p, f"<mark class='hl'>{safe_p}</mark>")
+    return f"<div class='card' style='line-height:1.85;font-size:15px;'>{safe}</div>"
+
+
+def make_corpus(kb: int, n_phrases: int, seed: int = 7):
+    rnd = random.Random(seed)
+    pieces = ["请各位同学", "于本周五前提交", "逾期将取消评优资格", "违反规定者", "给予通报批评", "宿舍",
+              "辅导员", "名额有限", "按照学院要求", "材料<附件>", "&", "\n", "，", "。"]
+    text = []
+    size = 0
+    while size < kb * 1024:
+        s = rnd.choice(pieces)
+        text.append(s)
+        size += len(s.encode("utf-8"))
+    text = "".join(text)
+    phrases = []
+    for _ in range(n_phrases):
+        a = rnd.randrange(len(text) - 20)
+        phrases.append(text[a:a + rnd.randint(2, 16)])
+    phrases += ["", "不存在的短语"]
+    return text, phrases
+
+
+def naive_mask(text: str, phrases: list[str]) -> list[bool]:
+    mask = [False] * len(text)
+    for p in {p.strip() for p in phrases if p and p.strip()}:
+        i = text.find(p)
+        while i >= 0:
+            for k in range(i, i + len(p)):
+                mask[k] = True
+            i = text.find(p, i + 1)
+    return mask
+
+
+def check(text: str, phrases: list[str]) -> bool:
+    out = core.highlight_text_html(text, phrases)
+    body = out[out.index(">") + 1:-len("</div>")]
+    if "<mark class='hl'><mark" in body or _TAG.sub("", body) != html.escape(text):
+        return False
+    # 把每个 mark 的位置映射回原文下标
+    got = [False] * len(text)
+    pos = 0
+    for m in _MARK.finditer(body):
+        pos += len(html.unescape(_TAG.sub("", body[:m.start()]))) - pos
+        n = len(html.unescape(m.group(1)))
+        for k in range(pos, pos + n):
+            got[k] = True
+    return got == naive_mask(text, phrases)
+
+
+def _time(fn, *args, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--kb", type=int, default=50, help="原文大小（KB）")
+    ap.add_argument("-p", "--phrases", type=int, default=300, help="evidence 条数")
+    args = ap.parse_args(argv)
+
+    for seed in range(20):
+        t, ps = make_corpus(2, 30, seed)
+        if not check(t, ps):
+            print(f"高亮区间不正确：seed={seed}", file=sys.stderr)
+            return 1
+
+    text, phrases = make_corpus(args.kb, args.phrases)
+    if not check(text, phrases):
+        print("高亮区间不正确（大样本）", file=sys.stderr)
+        return 1
+    t_old = _time(legacy_highlight_text_html, text, phrases)
+    t_new = _time(core.highlight_text_html, text, phrases)
+    print(f"{args.kb}KB 原文 × {args.phrases} 条 evidence，区间校验通过")
+    print(f"旧版  {t_old * 1e3:8.1f} ms")
+    print(f"新版  {t_new * 1e3:8.1f} ms   ×{t_old / t_new:.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,209 @@
+"""
+分析链路热点函数的基准（离线，不调用模型）
+
+    python benchmarks/bench_hotpaths.py                   # 跑全部用例，与 baseline.json 对比
+    python benchmarks/bench_hotpaths.py -k gate -k json   # 只跑名字里含 gate / json 的用例
+    python benchmarks/bench_hotpaths.py --save-baseline   # 把这次结果写成新的基线
+
+每个用例处理一遍 corpus.py 里的整批输入（通知原文 / 模拟模型输出），报告：
+- ops/s：每秒处理多少条输入（多轮取最好的一轮）
+- peak KB：处理一整批时 tracemalloc 记录的内存峰值（单独跑一遍，不影响计时）
+和基线比：ops/s 低于基线 (1 - threshold) 或峰值内存高于基线 (1 + threshold) 即判为退化，退出码 1。
+基线和机器相关，换机器 / 升级 Python 后先 --save-baseline 一次。
+
+analyze(offline) 用例把 core.call_deepseek 换成返回固定文本的桩、关闭结果缓存，
+走的是 risk_gate → build_prompts → safe_extract_json → postprocess / local_fallback 的完整本地路径；
+超过 LONG_DOC_CHARS 的长文走 long 模式（切块 → 每块解析 → 归并）。
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE.parent))
+os.environ["QXZ_CACHE"] = "0"   # 必须在 import core 之前
+os.environ["QXZ_LABEL_LOG"] = ""   # 桩返回的固定文本不能当预评分的训练样本
+os.environ["QXZ_PRESCORE"] = "0"   # 测的是完整分析链路
+
+import core  # noqa: E402
+import schema  # noqa: E402
+import textfmt  # noqa: E402
+from chunking import split_chunks  # noqa: E402
+from corpus import MODEL_OUTPUTS, NOTICES, make_policy_text, sample_result  # noqa: E402
+
+BASELINE_PATH = HERE / "baseline.json"
+DEFAULT_THRESHOLD = 0.30
+MEM_SLACK_KB = 16          # 很小的峰值上抖几 KB 不算退化
+
+
+# =========================
+# 用例：name -> (每批条数, 跑一批的函数)
+# =========================
+def _cases() -> dict:
+    outputs = list(MODEL_OUTPUTS.values())
+    results = [sample_result(t) for t in NOTICES]
+    issues = [r["issues"] for r in results]
+    rewrite_texts = [rw["text"] for r in results for rw in r["rewrites"]] + NOTICES
+    evidence = [[ln[2:14] for ln in t.split("\n") if len(ln) > 14] for t in NOTICES]
+    profile = {"grade": "大二/大三", "role": "普通学生", "gender": "不指定", "sensitivity": "中", "custom": ""}
+
+    def gate():
+        for t in NOTICES:
+            core.risk_gate(t)
+
+    def extract():
+        for s in outputs:
+            core.safe_extract_json(s)
+
+    parsed_outputs = [p for p in (core.safe_extract_json(s)[0] for s in outputs) if isinstance(p, dict)]
+    validate = schema.VALIDATORS["analysis"]
+
+    def validate_schema():
+        for p in parsed_outputs:
+            validate(p)   # 原地修复：预热之后每次都是“已经合规”的常见情况
+
+    def norm_issues():
+        for t, its in zip(NOTICES, issues):
+            core.normalize_issues([dict(it) for it in its], t)   # normalize_issues 会改 dict，浅拷贝即可
+
+    def pretty():
+        for s in rewrite_texts:
+            textfmt.pretty_notice(s)
+
+    def emojis():
+        for s in rewrite_texts:
+            textfmt.add_emojis_smart(s)
+
+    def highlight():
+        for t, ev in zip(NOTICES, evidence):
+            core.highlight_text_html(t, ev)
+
+    long_texts = [make_policy_text(n) for n in (200, 1000, 4000)]   # 约 12KB / 50KB / 200KB
+
+    def chunks():
+        for t in long_texts:
+            split_chunks(t, core.LONG_CHUNK_CHARS, core.LONG_MAX_CHUNKS)
+
+    replies = iter(())
+
+    def fake_call(system_prompt, user_prompt, model=core.MODEL, schema=None):
+        return next(replies)
+
+    def analyze_offline():
+        nonlocal replies
+        replies = itertools.cycle(outputs)   # 长文走 long 模式，一次分析要多条回复
+        orig = core.call_deepseek
+        core.call_deepseek = fake_call
+        try:
+            for t in NOTICES:
+                for _ in outputs:
+                    core.analyze(t, "其他（通用高校公告）", profile, mode="single")
+        finally:
+            core.call_deepseek = orig
+
+    return {
+        "risk_gate": (len(NOTICES), gate),
+        "safe_extract_json": (len(outputs), extract),
+        "schema_validate": (len(parsed_outputs), validate_schema),
+        "normalize_issues": (len(NOTICES), norm_issues),
+        "pretty_notice": (len(rewrite_texts), pretty),
+        "add_emojis_smart": (len(rewrite_texts), emojis),
+        "highlight_text_html": (len(NOTICES), highlight),
+        "split_chunks": (len(long_texts), chunks),
+        "analyze(offline)": (len(NOTICES) * len(outputs), analyze_offline),
+    }
+
+
+# =========================
+# 计时 / 内存
+# =========================
+def measure(n_items: int, fn, min_time: float = 0.2, rounds: int = 5) -> dict:
+    fn()  # 预热（正则编译、lru_cache 之外的惰性初始化等）
+    loops = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        dt = time.perf_counter() - t0
+        if dt >= min_time:
+            break
+        loops *= 2
+    best = dt
+    for _ in range(rounds - 1):
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        best = min(best, time.perf_counter() - t0)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"ops_per_sec": round(n_items * loops / best, 1), "peak_kb": round(peak / 1024, 1)}
+
+
+def compare(name: str, cur: dict, base: dict | None, threshold: float) -> tuple[str, bool]:
+    if not base:
+        return "（无基线）", True
+    speed = cur["ops_per_sec"] / base["ops_per_sec"] if base.get("ops_per_sec") else 1.0
+    mem_limit = base.get("peak_kb", 0) * (1 + threshold) + MEM_SLACK_KB
+    ok_speed = speed >= 1 - threshold
+    ok_mem = cur["peak_kb"] <= mem_limit
+    note = f"速度 ×{speed:.2f}"
+    if not ok_speed:
+        note += " ⚠ 变慢"
+    if not ok_mem:
+        note += f" ⚠ 内存 {cur['peak_kb']}KB > {mem_limit:.0f}KB"
+    return note, ok_speed and ok_mem
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("-k", dest="only", action="append", default=[], help="只跑名字包含该子串的用例（可多次）")
+    ap.add_argument("--baseline", type=Path, default=BASELINE_PATH, help="基线文件（默认 benchmarks/baseline.json）")
+    ap.add_argument("--save-baseline", action="store_true", help="把本次结果写入基线文件")
+    ap.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="允许的退化比例（默认 0.30）")
+    ap.add_argument("--min-time", type=float, default=0.2, help="每轮最少计时秒数")
+    args = ap.parse_args(argv)
+
+    baseline = {}
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8")).get("cases", {})
+
+    results = {}
+    failed = []
+    print(f"{'用例':<22}{'ops/s':>12}{'peak KB':>10}   对比基线")
+    for name, (n_items, fn) in _cases().items():
+        if args.only and not any(k in name for k in args.only):
+            continue
+        cur = measure(n_items, fn, min_time=args.min_time)
+        results[name] = cur
+        note, ok = compare(name, cur, baseline.get(name), args.threshold)
+        if not ok:
+            failed.append(name)
+        print(f"{name:<22}{cur['ops_per_sec']:>12,.1f}{cur['peak_kb']:>10.1f}   {note}")
+
+    if args.save_baseline:
+        merged = {**baseline, **results}
+        args.baseline.write_text(json.dumps({
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cases": merged,
+        }, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        print(f"基线已写入 {args.baseline}")
+        return 0
+
+    if failed:
+        print(f"退化（阈值 {args.threshold:.0%}）：{', '.join(failed)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+"""
+safe_extract_json 新旧实现对比：解析失败率 + 耗时（模糊测试语料）
+
+    python benchmarks/bench_json.py                # 默认 400 条，种子 0
+    python benchmarks/bench_json.py -n 2000 --seed 3 --chunk 8
+
+语料来自 corpus.fuzz_model_outputs：合法输出上叠加代码块 / 说明文字 / 结构位置的中文引号 / 尾逗号 /
+裸换行 / 漏逗号 / 字符串里没转义的引号，外加随机截断。按类别报告：
+- 失败：返回 None
+- 错误：解析出来了但和变形前的对象不一致（比如字符串内容里的中文引号被换掉）；截断类只要求解析出非空 dict
+新版还要通过两项校验，否则退出码 1：
+- 有期望结果的样本全部解析正确
+- 按 --chunk 字一段增量 feed 的结果和一次性解析完全一致（流式用法）
+"""
+import argparse
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE.parent))
+
+from corpus import fuzz_model_outputs  # noqa: E402
+from jsonrepair import JSONRepairParser, parse_json  # noqa: E402
+
+
+# ---------- 旧实现（原样保留，用于对照） ----------
+def legacy_extract_json(text: str):
+    if not text:
+        return None, "empty_response"
+    cleaned = re.sub(r"```(?:json)?\s*", "", text.strip(), flags=re.IGNORECASE)
+    cleaned = cleaned.replace("```", "").strip()
+    try:
+        return json.loads(cleaned), None
+    except Exception:
+        pass
+
+    start = cleaned.find("{")
+    end = cleaned.rfind("}")
+    if start != -1 and end != -1 and end > start:
+        candidate = cleaned[start : end + 1]
+        candidate = candidate.replace("“", "\"").replace("”", "\"").replace("’", "'").replace("‘", "'")
+        try:
+            return json.loads(candidate), None
+        except Exception as e:
+            return None, f"json_parse_failed: {e}"
+
+    return None, "no_json_object_found"
+
+
+def new_extract_json(text: str):
+    parsed, err, _ = parse_json(text)
+    return parsed, err
+
+
+def score(fn, corpus) -> dict:
+    """{类别: [样本数, 失败, 错误]}，另加 "全部" """
+    out: dict[str, list[int]] = {}
+    for kind, text, expected in corpus:
+        row = out.setdefault(kind, [0, 0, 0])
+        row[0] += 1
+        parsed, _ = fn(text)
+        if not isinstance(parsed, dict) or not parsed:
+            row[1] += 1
+        elif expected is not None and parsed != expected:
+            row[2] += 1
+    total = [sum(r[i] for r in out.values()) for i in range(3)]
+    return {**dict(sorted(out.items())), "全部": total}
+
+
+def _time(fn, corpus, repeat: int = 5) -> float:
+    best = float("inf")
+    texts = [t for _, t, _ in corpus]
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for t in texts:
+            fn(t)
+        best = min(best, time.perf_counter() - t0)
+    return best / len(texts)
+
+
+def feed_in_chunks(text: str, size: int):
+    p = JSONRepairParser()
+    for i in range(0, len(text), size):
+        p.feed(text[i:i + size])
+    return p.finish()
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("-n", type=int, default=400, help="样本数")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--chunk", type=int, default=8, help="增量校验时每段的字数")
+    args = ap.parse_args(argv)
+
+    corpus = fuzz_model_outputs(args.n, args.seed)
+    old, new = score(legacy_extract_json, corpus), score(new_extract_json, corpus)
+    print(f"{'类别':<28}{'样本':>6}{'旧版失败':>10}{'旧版错误':>10}{'新版失败':>10}{'新版错误':>10}")
+    for kind in new:
+        n, of, ow = old[kind]
+        _, nf, nw = new[kind]
+        print(f"{kind:<28}{n:>6}{of:>10}{ow:>10}{nf:>10}{nw:>10}")
+
+    ok = True
+    if any(new[k][1] or new[k][2] for k in new if k not in ("truncated", "全部")):
+        print("新版在可修复的样本上失败或解析错误", file=sys.stderr)
+        ok = False
+    mismatched = sum(
+        1 for _, text, _ in corpus
+        if feed_in_chunks(text.strip(), args.chunk)[0] != parse_json(text)[0]
+    )
+    if mismatched:
+        print(f"增量解析与一次性解析不一致：{mismatched} 条", file=sys.stderr)
+        ok = False
+
+    clean = [c for c in corpus if c[0] in ("fenced", "prose_wrapped")]
+    t_old, t_new = _time(legacy_extract_json, corpus), _time(new_extract_json, corpus)
+    c_old, c_new = _time(legacy_extract_json, clean), _time(new_extract_json, clean)
+    n_all = new["全部"][0]
+    print(f"失败率  旧版 {old['全部'][1] / n_all:.1%}（另有 {old['全部'][2]} 条解析错误）"
+          f"  新版 {new['全部'][1] / n_all:.1%}（{new['全部'][2]} 条解析错误）")
+    print(f"平均耗时（全部）      旧版 {t_old * 1e6:8.1f} µs   新版 {t_new * 1e6:8.1f} µs")
+    print(f"平均耗时（只有外壳）  旧版 {c_old * 1e6:8.1f} µs   新版 {c_new * 1e6:8.1f} µs")
+    print(f"增量解析（每段 {args.chunk} 字）与一次性解析一致：{'是' if not mismatched else '否'}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""
+textfmt 与旧版 pretty_notice / add_emojis_smart 的对比基准
+
+    python benchmarks/bench_textfmt.py            # 默认 2000 条改写
+    python benchmarks/bench_textfmt.py -n 20000
+
+先校验新旧实现输出逐字一致，再分别计时：
+- 旧版：每次调用都走 re 模块的模式缓存、每行最多 8 次 re.search
+- 新版（冷）：规则表预编译、每行先用总正则过滤一遍，不走记忆化
+- 新版（热）：同一批文本再格式化一次（对应 rerun / 切 tab），全部命中记忆化
+"""
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import textfmt  # noqa: E402
+
+
+# ---------- 旧实现（原样保留，用于对照） ----------
+def legacy_pretty_notice(raw: str) -> str:
+    if not raw:
+        return ""
+    s = raw.replace("\r\n", "\n").replace("\r", "\n").strip()
+    s = re.sub(r"\\(?=\d+[\.\、\)])", "", s)
+    s = re.sub(r"\*\*(.*?)\*\*", r"\1", s)
+    s = re.sub(r"__(.*?)__", r"\1", s)
+    s = re.sub(r"`([^`]+)`", r"\1", s)
+    s = re.sub(r"(?m)^\s*-\s+", "· ", s)
+    s = re.sub(r"(?m)^(?=\d+[\.\、\)])", "\n", s)
+    s = re.sub(r"\n?【", "\n\n【", s)
+    s = re.sub(r"\n{3,}", "\n\n", s).strip()
+    return s
+
+
+def legacy_add_emojis_smart(text: str) -> str:
+    if not text:
+        return ""
+    lines = text.split("\n")
+    out = []
+    for i, line in enumerate(lines):
+        L = line.strip()
+        if not L:
+            out.append("")
+            continue
+        has_emoji_prefix = bool(re.match(r"^[\u2600-\u27BF\U0001F300-\U0001FAFF]", L))
+        if not has_emoji_prefix:
+            if i <= 1 and re.search(r"(同学|大家|各位)", L):
+                L = "👋 " + L
+            if re.search(r"(时间|今晚|明天|上午|下午|晚上|\d{1,2}[:：]\d{2})", L):
+                L = "⏰ " + L
+            elif re.search(r"(地点|位置|教室|楼|宿舍|会议室|办公室)", L):
+                L = "📍 " + L
+            elif re.search(r"(咨询|联系|沟通|电话|微信|邮箱)", L):
+                L = "☎️ " + L
+            elif re.search(r"(注意|提醒|请勿|禁止|务必|重要)", L):
+                L = "⚠️ " + L
+            elif re.search(r"(材料|附件|表格|申请|提交)", L):
+                L = "📄 " + L
+            elif re.search(r"(步骤|流程|操作|请按|依次)", L):
+                L = "✅ " + L
+        out.append(L)
+    return "\n".join(out).strip()
+
+
+# ---------- 语料 ----------
+FRAGMENTS = [
+    "各位同学：", "大家好，", "**报名时间**：9月1日 14:30", "地点：图书馆三楼会议室", "- 携带学生证",
+    "1. 登录系统", "2、填写申请表", "3) 提交材料", "【注意事项】", "请勿代签", "咨询电话：6278xxxx",
+    "`附件1`", "__务必__按时完成", "\\1. 转义编号", "操作流程如下", "今晚十点前", "宿舍楼下集合",
+    "感谢配合！", "🙂 已加过 emoji 的行", "", "微信群通知", "依次入场", "本通知最终解释权归学院所有",
+]
+
+
+def make_corpus(n: int, seed: int = 7) -> list[str]:
+    rnd = random.Random(seed)
+    out = []
+    for _ in range(n):
+        k = rnd.randint(3, 14)
+        sep = rnd.choice(["\n", "\n\n", "\r\n", " ", "\n\n\n"])
+        out.append(sep.join(rnd.choice(FRAGMENTS) for _ in range(k)))
+    return out
+
+
+def _time(fn, corpus) -> float:
+    t0 = time.perf_counter()
+    for t in corpus:
+        fn(t)
+    return time.perf_counter() - t0
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("-n", type=int, default=2000, help="改写条数")
+    args = ap.parse_args(argv)
+    corpus = make_corpus(args.n)
+
+    for t in corpus:
+        for emoji in (False, True):
+            old = legacy_pretty_notice(t)
+            old = legacy_add_emojis_smart(old) if emoji else old
+            new = textfmt.pretty_notice(t)
+            new = textfmt.add_emojis_smart(new) if emoji else new
+            if old != new:
+                print(f"输出不一致：{t!r}", file=sys.stderr)
+                return 1
+
+    def legacy(t):
+        return legacy_add_emojis_smart(legacy_pretty_notice(t))
+
+    def compiled_cold(t):
+        return textfmt.add_emojis_smart(textfmt.pretty_notice(t))
+
+    t_old = _time(legacy, corpus)
+    t_new = _time(compiled_cold, corpus)
+    textfmt.format_rewrite.cache_clear()
+    textfmt.format_batch(corpus, emoji=True)
+    t0 = time.perf_counter()
+    textfmt.format_batch(corpus, emoji=True)
+    t_hot = time.perf_counter() - t0
+
+    n = len(corpus)
+    print(f"{n} 条改写，输出一致")
+    print(f"旧版          {t_old * 1e6 / n:8.1f} µs/条")
+    print(f"新版（冷）    {t_new * 1e6 / n:8.1f} µs/条   ×{t_old / t_new:.2f}")
+    print(f"新版（记忆化）{t_hot * 1e6 / n:8.1f} µs/条   ×{t_old / t_hot:.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+"""
+基准用语料：高校通知原文 + 模拟的大模型输出（含各种常见的格式问题）
+
+- NOTICES：从一两句的事务型通知，到几十条款的制度类长文（确定性生成，不依赖随机数）
+- MODEL_OUTPUTS：{名称: 模型原始输出}；有合法 JSON，也有 ```json 代码块、前后夹带说明文字、
+  中文引号、截断、空串等
+- fuzz_model_outputs()：在合法输出上随机叠加一到两种常见毛病，带上期望的解析结果（容错解析的模糊测试用）
+"""
+import json
+import random
+import re
+
+SHORT_NOTICES = [
+    "各位同学：明天上午 9:00 在图书馆 302 会议室召开班委会，请准时参加。",
+    "提醒：本周五下午 3 点前提交社会实践报告电子版至班长邮箱，有问题微信联系。",
+    "宿舍楼今晚 22:00-23:00 停水检修，请同学们提前做好准备。",
+    "请大家依次登录教务系统完成选课确认，操作步骤见附件。如有疑问咨询辅导员。",
+    "各位同学好，本学期体测安排在第 8 周，具体时间地点另行通知，请关注群消息。",
+]
+
+MEDIUM_NOTICES = [
+    "关于开展宿舍安全检查的通知\n各位同学：为消除安全隐患，学院将于本周三晚对全部宿舍进行检查。"
+    "检查中如发现违规电器，一律没收并通报批评；情节严重者给予纪律处分，并影响本学年评优评先。"
+    "请同学们务必提前自查，积极配合。",
+    "关于 2025 年国家奖学金评选的通知\n本次评选名额有限，按照综合测评排名择优推荐。"
+    "申请材料须于 10 月 20 日前提交，逾期不予受理。评选结果将在学院官网公示三天，"
+    "对结果有异议的同学可在公示期内向评审小组书面反映。",
+    "关于规范晚归管理的通知\n自下周起，晚归超过 23:30 的同学须在门卫处登记，"
+    "累计三次晚归者取消本学期住宿评优资格，并由辅导员约谈。请同学们相互转告。",
+]
+
+_ARTICLE_TEMPLATES = [
+    "第{n}条 学生应当遵守国家法律法规和学校规章制度，自觉维护正常的教学、生活秩序。",
+    "第{n}条 学生无故旷课累计达到{k}学时的，给予警告处分；累计达到{k2}学时的，给予严重警告处分。",
+    "第{n}条 考试作弊者，该课程成绩记为零分，并视情节给予记过及以上处分，取消当年评优评先及推免资格。",
+    "第{n}条 学生宿舍实行统一管理，严禁使用大功率电器，违者一律没收并通报批评，情节严重的追究责任。",
+    "第{n}条 奖助学金评定坚持公开、公平、公正原则，名额按各专业在校生人数比例分配，评审结果应当公示。",
+    "第{n}条 学生对处分决定有异议的，可以在接到决定书之日起十个工作日内向学生申诉处理委员会提出书面申诉。",
+    "第{n}条 因特殊原因需要请假的，须提前提交书面申请，经辅导员审批后方可离校，逾期未返校按旷课处理。",
+    "第{n}条 本办法所称“情节严重”，包括但不限于多次违纪、造成恶劣影响或拒不改正等情形。",
+]
+
+
+def make_policy_text(n_articles: int) -> str:
+    """制度类长文：第一章/第二章……，每章若干条款"""
+    out = ["XX大学学生管理规定（修订）", "", "第一章 总则"]
+    chapter = 1
+    for n in range(1, n_articles + 1):
+        if n % 12 == 0:
+            chapter += 1
+            out.append(f"\n第{chapter}章 细则（{chapter}）")
+        tpl = _ARTICLE_TEMPLATES[(n * 5 + chapter) % len(_ARTICLE_TEMPLATES)]
+        out.append(tpl.format(n=n, k=10 + n % 20, k2=20 + n % 30))
+    out.append("\n本规定自发布之日起施行，由学生工作部负责解释。")
+    return "\n".join(out)
+
+
+LONG_NOTICES = [make_policy_text(40), make_policy_text(200)]   # 约 2.5KB / 12KB
+
+NOTICES = SHORT_NOTICES + MEDIUM_NOTICES + LONG_NOTICES
+
+
+def sample_result(text: str) -> dict:
+    """一份结构完整的模型输出；evidence 取自原文，和真实输出一样能在原文里找到"""
+    lines = [ln for ln in text.split("\n") if ln.strip()]
+    ev = [ln[4:20] for ln in lines[1:4]] or [text[:12]]
+    return {
+        "risk_score": 62,
+        "risk_level": "MEDIUM",
+        "summary": "后果条款表述较重，且未说明申诉渠道，可能引发部分同学的抵触。",
+        "issues": [
+            {"title": "风险点标题", "evidence": ev[0], "why": "惩戒后果表述绝对化", "fix": "补充例外与申诉渠道"},
+            {"title": "", "evidence": ev[-1], "why": "执行标准不清晰", "fix": "明确认定标准"},
+            {"title": "执行范围不明", "evidence": "", "why": "对象范围模糊", "fix": "写明适用对象"},
+        ],
+        "student_emotions": [
+            {"emotion": "担忧", "ratio": 0.4, "why": "担心影响评优"},
+            {"emotion": "不满", "ratio": 0.3, "why": "觉得一刀切"},
+            {"emotion": "理解", "ratio": 0.3, "why": "认可安全目的"},
+        ],
+        "rewrites": [
+            {"name": "更安抚", "pred_risk_score": 35, "text": "各位同学：为了大家的安全……", "why": "先说明目的"},
+            {"name": "更清晰", "pred_risk_score": 30, "text": "**时间**：周三晚\n- 检查范围：全部宿舍", "why": "信息完整"},
+            {"name": "更可执行", "pred_risk_score": 28, "text": "1. 自查\n2. 登记\n3. 如有疑问联系辅导员", "why": "步骤清单"},
+            {"name": "多余的一版", "pred_risk_score": 50, "text": "……", "why": "……"},
+        ],
+        "risk_gate": {"type": "纪律处分型", "is_substantive": True, "reason": "……"},
+    }
+
+
+def make_model_outputs(text: str) -> dict[str, str]:
+    good = json.dumps(sample_result(text), ensure_ascii=False, indent=2)
+    return {
+        "clean": good,
+        "fenced": f"```json\n{good}\n```",
+        "prose_wrapped": f"好的，以下是分析结果：\n{good}\n希望对你有帮助！",
+        "curly_quotes": "说明：\n" + good.replace('"summary"', "“summary”", 1),
+        "truncated": good[: len(good) * 2 // 3],
+        "no_object": "抱歉，我无法完成这个请求。",
+        "empty": "",
+    }
+
+
+MODEL_OUTPUTS = make_model_outputs(MEDIUM_NOTICES[0])
+
+
+# =========================
+# 模糊测试语料
+# =========================
+def _fuzz_result(text: str, rng: random.Random) -> dict:
+    """在 sample_result 基础上让字符串内容里带中文引号 / 英文引号 / 换行，更接近真实输出"""
+    obj = sample_result(text)
+    obj["summary"] = rng.choice([
+        obj["summary"],
+        "“一刀切”的表述容易引发抵触，建议补充例外情形。",
+        '通知中"一律没收"的说法偏重，可能被截图传播。',
+        "后果条款较重；\n建议补充申诉渠道。",
+        "详见附件路径 材料\\",               # 以反斜杠结尾：配合 bad_escape_close
+    ])
+    obj["issues"][0]["why"] = rng.choice(["惩戒后果表述绝对化", "用了“严肃处理”等措辞，语气偏硬"])
+    return obj
+
+
+def _structural_curly(s: str) -> str:
+    return re.sub(r'"([A-Za-z_]+)":', r"“\1”:", s)
+
+
+def _trailing_commas(s: str, rng: random.Random) -> str:
+    spots = [m.start() for m in re.finditer(r'(?<=["\d\]}el])\s*[}\]]', s)]
+    for pos in sorted(rng.sample(spots, min(len(spots), 3)), reverse=True):
+        s = s[:pos] + "," + s[pos:]
+    return s
+
+
+def _raw_newlines(s: str) -> str:
+    return s.replace("\\n", "\n")     # 字符串里的 \n 转义换成真换行
+
+
+def _missing_comma(s: str, rng: random.Random) -> str:
+    spots = [m.start() for m in re.finditer(r'(?<=["\d\]}]),(?=\s*["{\[])', s)]
+    if not spots:
+        return s
+    pos = rng.choice(spots)
+    return s[:pos] + s[pos + 1:]
+
+
+def _bad_escape_close(s: str) -> str:
+    """以反斜杠结尾的 summary 改成中文引号包裹、反斜杠不转义：“…\”（坏转义紧挨着结尾引号）"""
+    return re.sub(r'"summary": "((?:[^"\\]|\\.)*?)\\\\"', lambda m: f'"summary": “{m.group(1)}\\”', s)
+
+
+def _inner_quotes(s: str) -> str:
+    return re.sub(r'(?<!\\)\\"', '"', s)      # 字符串内容里的英文引号不转义（\\" 是转义的反斜杠 + 结尾引号，不动）
+
+
+FUZZ_MUTATIONS = {
+    "fenced": lambda s, rng: f"```json\n{s}\n```",
+    "prose_wrapped": lambda s, rng: f"好的，以下是分析结果：\n{s}\n如需调整请告诉我。",
+    "curly_keys": lambda s, rng: _structural_curly(s),
+    "trailing_comma": _trailing_commas,
+    "raw_newline": lambda s, rng: _raw_newlines(s),
+    "missing_comma": _missing_comma,
+    "inner_quote": lambda s, rng: _inner_quotes(s),
+    "bad_escape_close": lambda s, rng: _bad_escape_close(s),
+}
+
+
+def fuzz_model_outputs(n: int = 400, seed: int = 0) -> list[tuple[str, str, dict | None]]:
+    """
+    [(类别, 模型输出, 期望结果)]：
+    - 叠加一到两种 FUZZ_MUTATIONS：期望结果就是变形前的对象（修好之后必须完全一致）
+    - truncated：在随机位置截断，期望结果为 None（能解析出非空 dict 即算成功，内容不作要求）
+    固定种子，结果可复现。
+    """
+    rng = random.Random(seed)
+    texts = SHORT_NOTICES + MEDIUM_NOTICES
+    names = list(FUZZ_MUTATIONS)
+    out = []
+    for i in range(n):
+        obj = _fuzz_result(texts[i % len(texts)], rng)
+        s = json.dumps(obj, ensure_ascii=False, indent=rng.choice([None, 2]))
+        if i % 5 == 4:
+            cut = rng.randint(len(s) // 10, len(s) - 2)
+            out.append(("truncated", s[:cut], None))
+            continue
+        picked = rng.sample(names, rng.choice([1, 1, 2]))
+        for name in picked:
+            s = FUZZ_MUTATIONS[name](s, rng)
+        out.append(("+".join(sorted(picked)), s, obj))
+    return out
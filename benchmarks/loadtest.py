@@ -0,0 +1,256 @@
+"""
+端到端压测：N 个并发调用方反复跑 analyze()，后端默认是进程内的模拟服务
+
+    python benchmarks/loadtest.py -c 8 -n 200 --latency lognormal:0.6,0.4 --rate-429 0.05 --malformed-rate 0.1
+    python benchmarks/loadtest.py -c 4 -n 40 --mode decomposed
+    python benchmarks/loadtest.py -c 4 -n 40 --stream                 # 走 analyze_stream
+    python benchmarks/loadtest.py -c 4 --matrix 30 --prefill-per-1k 0.2   # 受众矩阵：同一篇通知 × 30 个画像
+    python benchmarks/loadtest.py -c 2 -n 10 --url http://127.0.0.1:8765/chat/completions   # 用外部服务
+
+结果缓存全程关闭（每次都真的发请求）。报告：
+- 端到端延迟 p50 / p95 / p99 / max，吞吐（次/秒）
+- 兜底率：结果带 fallback=True 的比例（请求失败或解析失败）
+- 解析失败率：safe_extract_json 返回 None 的次数 / 调用次数（decomposed 模式一次分析会解析多次）
+- HTTP 客户端的 requests / retries / failures、模拟服务侧的计数、各阶段平均耗时（metrics.py）
+- token 用量（usage.py）：调用次数、提示 / 生成 token、平均提示长度与前缀缓存命中率
+  （首字延迟见阶段里的 http_first_token；模拟服务加 --prefill-per-1k 才能看出命中对首字延迟的影响）
+- --matrix N：改跑 analyze_matrix（-c 是矩阵并发数，-n 不用），通知取语料里不触发长文模式的最长一篇；
+  另报告总耗时折合几次顺序调用（总耗时 / 单个格子耗时的 p50）
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE.parent))
+sys.path.insert(0, str(HERE))
+os.environ["QXZ_CACHE"] = "0"   # 必须在 import core 之前
+os.environ.setdefault("DEEPSEEK_API_KEY", "mock")
+os.environ.setdefault("QXZ_RATE_LIMIT_RPS", "0")   # 默认不限流，测的是上游本身；要连限流一起测就显式设置
+os.environ.setdefault("QXZ_COALESCE", "0")         # 语料会重复，合并开着就测不到上游了
+os.environ["QXZ_LABEL_LOG"] = ""   # 模拟输出不能当预评分的训练样本
+os.environ["QXZ_PRESCORE"] = "0"
+
+import core  # noqa: E402
+from metrics import REGISTRY  # noqa: E402
+from ratelimit import UpstreamBusyError  # noqa: E402
+from corpus import NOTICES  # noqa: E402
+from mock_deepseek import MockDeepSeekServer, add_behavior_args, behavior_from_args  # noqa: E402
+
+PROFILE = {"grade": "大二/大三", "role": "普通学生", "gender": "不指定", "sensitivity": "中", "custom": ""}
+# 与页面上的选项一致
+MATRIX_PROFILES = core.profile_matrix(
+    ["新生", "大二/大三", "大四/毕业班", "研究生", "混合群体"],
+    ["普通学生", "学生干部", "宿舍长/楼委", "社团成员", "考研/保研群体", "留学生/交流生", "混合"],
+    ["低", "中", "高"],
+)
+
+
+def percentile(sorted_vals: list[float], q: float) -> float:
+    """最近秩法；sorted_vals 已升序"""
+    if not sorted_vals:
+        return 0.0
+    k = max(0, min(len(sorted_vals) - 1, int(round(q / 100 * len(sorted_vals) + 0.5)) - 1))
+    return sorted_vals[k]
+
+
+class ParseCounter:
+    """包一层 core.safe_extract_json，统计调用次数和失败原因"""
+
+    def __init__(self):
+        self.calls = 0
+        self.failures = {}
+        self._lock = threading.Lock()
+        self._orig = core.safe_extract_json
+
+    def __call__(self, text):
+        parsed, err = self._orig(text)
+        with self._lock:
+            self.calls += 1
+            if parsed is None:
+                kind = (err or "unknown").split(":")[0]
+                self.failures[kind] = self.failures.get(kind, 0) + 1
+        return parsed, err
+
+    def install(self):
+        core.safe_extract_json = self
+
+    def uninstall(self):
+        core.safe_extract_json = self._orig
+
+
+def run_load(n: int, concurrency: int, mode: str, stream: bool) -> dict:
+    latencies = []
+    outcomes = {"ok": 0, "fallback": 0, "busy": 0, "error": 0}
+    lock = threading.Lock()
+
+    def one(i: int):
+        text = NOTICES[i % len(NOTICES)]
+        t0 = time.perf_counter()
+        try:
+            if stream:
+                result = None
+                for result, _, _ in core.analyze_stream(text, "其他（通用高校公告）", PROFILE):
+                    pass
+            else:
+                result = core.analyze(text, "其他（通用高校公告）", PROFILE, mode=mode)
+            status = "fallback" if result.get("fallback") else "ok"
+        except UpstreamBusyError:
+            status = "busy"
+        except Exception:
+            status = "error"
+        dt = time.perf_counter() - t0
+        with lock:
+            latencies.append(dt)
+            outcomes[status] += 1
+
+    t_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(n)))
+    wall = time.perf_counter() - t_start
+
+    lat = sorted(latencies)
+    return {
+        "requests": n,
+        "concurrency": concurrency,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(n / wall, 2) if wall > 0 else 0.0,
+        "p50_ms": round(percentile(lat, 50) * 1000, 1),
+        "p95_ms": round(percentile(lat, 95) * 1000, 1),
+        "p99_ms": round(percentile(lat, 99) * 1000, 1),
+        "max_ms": round(lat[-1] * 1000, 1) if lat else 0.0,
+        **outcomes,
+        "fallback_rate": round(outcomes["fallback"] / n, 4) if n else 0.0,
+    }
+
+
+def run_matrix(n_profiles: int, concurrency: int, mode: str) -> dict:
+    """同一篇通知 × 前 n_profiles 个画像走 analyze_matrix；包一层 core.analyze 记每个格子的耗时"""
+    text = max((t for t in NOTICES if not core.LONG_DOC_CHARS or len(t) <= core.LONG_DOC_CHARS), key=len)
+    profiles = (MATRIX_PROFILES * (n_profiles // len(MATRIX_PROFILES) + 1))[:n_profiles]
+    latencies = []
+    outcomes = {"ok": 0, "fallback": 0, "busy": 0, "error": 0}
+    lock = threading.Lock()
+    orig = core.analyze
+
+    def timed(*args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            result = orig(*args, **kwargs)
+        finally:
+            with lock:
+                latencies.append(time.perf_counter() - t0)
+        return result
+
+    core.analyze = timed
+    t_start = time.perf_counter()
+    try:
+        results = core.analyze_matrix(text, "其他（通用高校公告）", profiles, max_workers=concurrency, mode=mode)
+        while True:
+            try:
+                _, _, result = next(results)
+                status = "fallback" if result.get("fallback") else "ok"
+            except StopIteration:
+                break
+            except UpstreamBusyError:
+                status = "busy"
+            except Exception:
+                status = "error"
+            outcomes[status] += 1
+    finally:
+        core.analyze = orig
+    wall = time.perf_counter() - t_start
+
+    lat = sorted(latencies)
+    p50 = percentile(lat, 50)
+    return {
+        "requests": n_profiles,
+        "concurrency": concurrency,
+        "text_chars": len(text),
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(n_profiles / wall, 2) if wall > 0 else 0.0,
+        "p50_ms": round(p50 * 1000, 1),
+        "p95_ms": round(percentile(lat, 95) * 1000, 1),
+        "p99_ms": round(percentile(lat, 99) * 1000, 1),
+        "max_ms": round(lat[-1] * 1000, 1) if lat else 0.0,
+        "sequential_equiv": round(wall / p50, 1) if p50 > 0 else 0.0,
+        **outcomes,
+        "fallback_rate": round(outcomes["fallback"] / n_profiles, 4) if n_profiles else 0.0,
+    }
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("-c", "--concurrency", type=int, default=8, help="并发调用方数量")
+    ap.add_argument("-n", "--requests", type=int, default=100, help="总分析次数")
+    ap.add_argument("--mode", choices=core.ANALYZE_MODES, default="single")
+    ap.add_argument("--stream", action="store_true", help="用 analyze_stream（只支持 single）")
+    ap.add_argument("--matrix", type=int, default=0, metavar="N", help="改跑受众矩阵：同一篇通知 × N 个画像")
+    ap.add_argument("--url", default=None, help="外部服务地址；不给就在进程内起模拟服务")
+    ap.add_argument("--json", action="store_true", help="以 JSON 输出报告")
+    add_behavior_args(ap)
+    args = ap.parse_args(argv)
+
+    server = None
+    if args.url:
+        core.API_URL = args.url
+    else:
+        server = MockDeepSeekServer(behavior_from_args(args)).start()
+        core.API_URL = server.url
+
+    parses = ParseCounter()
+    parses.install()
+    try:
+        if args.matrix:
+            report = run_matrix(args.matrix, max(1, args.concurrency), args.mode)
+        else:
+            report = run_load(args.requests, max(1, args.concurrency), args.mode, args.stream)
+    finally:
+        parses.uninstall()
+        if server is not None:
+            server.stop()
+
+    report["parse_calls"] = parses.calls
+    report["parse_failures"] = dict(parses.failures)
+    n_fail = sum(parses.failures.values())
+    report["parse_failure_rate"] = round(n_fail / parses.calls, 4) if parses.calls else 0.0
+    report["http"] = dict(core.get_http_client().stats)
+    report["usage"] = core.USAGE.snapshot()["global"]
+    report["limiter"] = core.LIMITER.snapshot()
+    report["stages"] = {
+        s["labels"]["stage"]: {"count": s["count"], "avg_ms": round(s["sum"] / s["count"] * 1000, 2)}
+        for s in REGISTRY.snapshot()["histograms"].get("qxz_stage_seconds", [])
+    }
+    if server is not None:
+        report["server"] = dict(server.behavior.stats)
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return 0
+    print(f"目标：{core.API_URL}｜模式：{'stream' if args.stream else args.mode}｜"
+          f"并发 {report['concurrency']}｜共 {report['requests']} 次")
+    print(f"延迟  p50 {report['p50_ms']}ms  p95 {report['p95_ms']}ms  p99 {report['p99_ms']}ms  max {report['max_ms']}ms")
+    print(f"吞吐  {report['throughput_rps']} 次/s（耗时 {report['wall_s']}s）")
+    if args.matrix:
+        print(f"矩阵  通知 {report['text_chars']} 字｜总耗时折合 {report['sequential_equiv']} 次顺序调用（按格子耗时 p50）")
+    print(f"结果  成功 {report['ok']}｜兜底 {report['fallback']}（{report['fallback_rate']:.1%}）｜限流拒绝 {report['busy']}｜异常 {report['error']}")
+    print(f"解析  {report['parse_calls']} 次，失败率 {report['parse_failure_rate']:.1%} {report['parse_failures'] or ''}")
+    print(f"HTTP  {report['http']}")
+    if core.LIMITER.enabled:
+        print(f"限流  {report['limiter']}")
+    u = report["usage"]
+    print(f"用量  {u['calls']} 次调用｜提示 {u['prompt_tokens']}（平均 {u['avg_prompt_tokens']}，"
+          f"前缀缓存命中 {u['cache_hit_tokens']}，{u['cache_hit_rate']:.1%}）｜生成 {u['completion_tokens']} tokens")
+    print("阶段  " + "  ".join(f"{k} {v['avg_ms']}ms×{v['count']}" for k, v in report["stages"].items()))
+    if server is not None:
+        print(f"服务端 {report['server']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,309 @@
+"""
+本地 DeepSeek 兼容模拟服务（压测 / 离线联调用，不消耗额度）
+
+    python benchmarks/mock_deepseek.py --port 8765 --latency lognormal:0.8,0.5 --rate-429 0.05
+    QXZ_API_URL=http://127.0.0.1:8765/chat/completions streamlit run app.py
+
+- 接口：POST .../chat/completions，请求/响应结构与 call_deepseek / call_deepseek_stream 用到的一致；
+  stream=true 时按 SSE 逐块返回 delta，最后 data: [DONE]
+- 延迟：fixed:秒 / uniform:a,b / lognormal:中位数,sigma / normal:均值,标准差（负数按 0）；
+  流式时这是首字延迟，之后每块再等 --chunk-delay
+- 上下文缓存：按 DeepSeek 的口径在 usage 里返回 prompt_cache_hit_tokens / prompt_cache_miss_tokens——
+  和之前见过的请求共享的最长前缀（按 64 字一块对齐）算命中；--prefill-per-1k 给没命中的部分加预填充延迟
+- 故障注入：--rate-429（带 Retry-After）、--error-rate（随机 500/502/503）、
+  --malformed-rate（正文换成 corpus.py 里某种坏掉的输出：截断 / 代码块 / 夹带说明 / 空串……）
+- 正文：默认按 corpus.sample_result 用请求里的【原文】生成（evidence 能在原文里找到）；
+  --canned FILE 原样返回文件内容；--template FILE 用 string.Template 填充
+  $text / $text_head / $risk_score / $model
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import string
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from corpus import make_model_outputs, sample_result  # noqa: E402
+
+
+def parse_latency(spec: str):
+    """'lognormal:0.8,0.5' -> 返回一个无参函数，每次调用采样一个延迟（秒）"""
+    kind, _, args = (spec or "fixed:0").partition(":")
+    vals = [float(x) for x in args.split(",") if x.strip()] or [0.0]
+    if kind == "fixed":
+        return lambda: vals[0]
+    if kind == "uniform":
+        a, b = vals[0], vals[1] if len(vals) > 1 else vals[0]
+        return lambda: random.uniform(a, b)
+    if kind == "lognormal":
+        median, sigma = vals[0], vals[1] if len(vals) > 1 else 0.5
+        mu = math.log(max(median, 1e-6))
+        return lambda: random.lognormvariate(mu, sigma)
+    if kind == "normal":
+        mean, sd = vals[0], vals[1] if len(vals) > 1 else 0.0
+        return lambda: max(0.0, random.gauss(mean, sd))
+    raise ValueError(f"未知的延迟分布：{spec}")
+
+
+def prompt_text(payload: dict) -> str:
+    """从 user 消息里取出【原文】部分；取不到就用整条 user 消息"""
+    user = ""
+    for m in payload.get("messages") or []:
+        if m.get("role") == "user":
+            user = m.get("content") or ""
+    _, sep, tail = user.rpartition("【原文】\n")
+    return tail.split("\n\n【受众画像】", 1)[0] if sep else user
+
+
+def approx_tokens(s: str) -> int:
+    # 粗略：汉字约 1 token/字，其余约 4 字符/token
+    cjk = sum(1 for ch in s if "一" <= ch <= "鿿")
+    return cjk + (len(s) - cjk) // 4 + 1
+
+
+class PrefixCache:
+    """模拟服务方的前缀缓存：记下见过的每个整块前缀的哈希，命中长度 = 最长的已见前缀"""
+
+    BLOCK = 64
+
+    def __init__(self, max_entries: int = 200_000):
+        self.max_entries = max_entries
+        self._seen: set[bytes] = set()
+        self._lock = threading.Lock()
+
+    def hit_chars(self, prompt: str) -> int:
+        h = hashlib.blake2b(digest_size=16)
+        digests = []
+        for i in range(0, len(prompt) - self.BLOCK + 1, self.BLOCK):
+            h.update(prompt[i:i + self.BLOCK].encode("utf-8"))
+            digests.append(h.copy().digest())
+        with self._lock:
+            hit = 0
+            while hit < len(digests) and digests[hit] in self._seen:
+                hit += 1
+            if len(self._seen) + len(digests) > self.max_entries:
+                self._seen.clear()
+            self._seen.update(digests)
+        return hit * self.BLOCK
+
+
+class MockBehavior:
+    def __init__(self, latency: str = "fixed:0", chunk_delay: float = 0.0, chunk_size: int = 8,
+                 rate_429: float = 0.0, retry_after: float = 1.0, error_rate: float = 0.0,
+                 malformed_rate: float = 0.0, canned: str | None = None, template: str | None = None,
+                 seed: int | None = None, prefill_per_1k: float = 0.0):
+        self.sample_latency = parse_latency(latency)
+        self.chunk_delay = chunk_delay
+        self.chunk_size = max(1, chunk_size)
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.canned = canned
+        self.template = string.Template(template) if template is not None else None
+        self.rng = random.Random(seed)
+        self.prefill_per_1k = prefill_per_1k
+        self.prefix_cache = PrefixCache()
+        self.stats = {"requests": 0, "streamed": 0, "429": 0, "errors": 0, "malformed": 0,
+                      "prompt_tokens": 0, "cache_hit_tokens": 0}
+        self._lock = threading.Lock()
+
+    def count(self, key: str, n: int = 1):
+        with self._lock:
+            self.stats[key] += n
+
+    def roll(self, p: float) -> bool:
+        with self._lock:
+            return p > 0 and self.rng.random() < p
+
+    def content_for(self, payload: dict) -> str:
+        text = prompt_text(payload)
+        if self.canned is not None:
+            body = self.canned
+        elif self.template is not None:
+            body = self.template.safe_substitute(
+                text=json.dumps(text, ensure_ascii=False)[1:-1],
+                text_head=json.dumps(text[:16], ensure_ascii=False)[1:-1],
+                risk_score=30 + len(text) % 60,
+                model=payload.get("model", ""),
+            )
+        else:
+            body = json.dumps(sample_result(text), ensure_ascii=False)
+        if self.roll(self.malformed_rate):
+            self.count("malformed")
+            bad = [v for k, v in make_model_outputs(text).items() if k != "clean"]
+            with self._lock:
+                body = self.rng.choice(bad)
+        return body
+
+
+def make_handler(behavior: MockBehavior):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send_json(self, code: int, obj: dict, headers: dict | None = None):
+            body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _chunk(self, data: bytes):
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+
+        def do_POST(self):
+            raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            behavior.count("requests")
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                return self._send_json(404, {"error": {"message": "not found"}})
+            try:
+                payload = json.loads(raw or b"{}")
+            except ValueError:
+                return self._send_json(400, {"error": {"message": "bad json"}})
+
+            if behavior.roll(behavior.rate_429):
+                behavior.count("429")
+                return self._send_json(429, {"error": {"message": "rate limited"}},
+                                       {"Retry-After": f"{behavior.retry_after:g}"})
+            if behavior.roll(behavior.error_rate):
+                behavior.count("errors")
+                return self._send_json(random.choice([500, 502, 503]), {"error": {"message": "injected"}})
+
+            messages = payload.get("messages") or []
+            prompt_tokens = sum(approx_tokens(m.get("content") or "") for m in messages)
+            prompt = "".join(f"<{m.get('role')}>{m.get('content') or ''}" for m in messages)
+            hit = behavior.prefix_cache.hit_chars(prompt)
+            hit_tokens = min(prompt_tokens, approx_tokens(prompt[:hit])) if hit else 0
+            behavior.count("prompt_tokens", prompt_tokens)
+            behavior.count("cache_hit_tokens", hit_tokens)
+            time.sleep(behavior.sample_latency() + (prompt_tokens - hit_tokens) / 1000 * behavior.prefill_per_1k)
+            content = behavior.content_for(payload)
+            model = payload.get("model", "deepseek-chat")
+            usage = {
+                "prompt_tokens": prompt_tokens,
+                "prompt_cache_hit_tokens": hit_tokens,
+                "prompt_cache_miss_tokens": prompt_tokens - hit_tokens,
+                "completion_tokens": approx_tokens(content),
+                "total_tokens": prompt_tokens + approx_tokens(content),
+            }
+
+            if not payload.get("stream"):
+                return self._send_json(200, {
+                    "id": "mock", "object": "chat.completion", "model": model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                                 "finish_reason": "stop"}],
+                    "usage": usage,
+                })
+
+            behavior.count("streamed")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            n = behavior.chunk_size
+            for i in range(0, len(content), n):
+                event = {"id": "mock", "object": "chat.completion.chunk", "model": model,
+                         "choices": [{"index": 0, "delta": {"content": content[i:i + n]}, "finish_reason": None}]}
+                self._chunk(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+                if behavior.chunk_delay:
+                    time.sleep(behavior.chunk_delay)
+            last = {"id": "mock", "object": "chat.completion.chunk", "model": model,
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage}
+            self._chunk(f"data: {json.dumps(last, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self._chunk(b"data: [DONE]\n\n")
+            self._chunk(b"")
+
+    return Handler
+
+
+class MockDeepSeekServer:
+    """进程内启动：with MockDeepSeekServer(MockBehavior(...)) as srv: core.API_URL = srv.url"""
+
+    def __init__(self, behavior: MockBehavior | None = None, host: str = "127.0.0.1", port: int = 0):
+        self.behavior = behavior or MockBehavior()
+        self.httpd = ThreadingHTTPServer((host, port), make_handler(self.behavior))
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/chat/completions"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def add_behavior_args(ap: argparse.ArgumentParser):
+    ap.add_argument("--latency", default="fixed:0.05", help="延迟分布，如 fixed:0.5 / uniform:0.2,1 / lognormal:0.8,0.5")
+    ap.add_argument("--chunk-delay", type=float, default=0.0, help="流式每块之间的间隔（秒）")
+    ap.add_argument("--chunk-size", type=int, default=8, help="流式每块的字符数")
+    ap.add_argument("--rate-429", type=float, default=0.0, help="返回 429 的概率")
+    ap.add_argument("--retry-after", type=float, default=1.0, help="429 时 Retry-After 的秒数")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="返回 5xx 的概率")
+    ap.add_argument("--malformed-rate", type=float, default=0.0, help="正文换成坏 JSON 的概率")
+    ap.add_argument("--canned", type=Path, default=None, help="固定返回该文件内容作为正文")
+    ap.add_argument("--template", type=Path, default=None, help="string.Template 模板文件")
+    ap.add_argument("--seed", type=int, default=None, help="故障注入的随机种子")
+    ap.add_argument("--prefill-per-1k", type=float, default=0.0,
+                    help="没命中上下文缓存的提示每 1k token 额外的首字延迟（秒）")
+
+
+def behavior_from_args(args) -> MockBehavior:
+    return MockBehavior(
+        latency=args.latency, chunk_delay=args.chunk_delay, chunk_size=args.chunk_size,
+        rate_429=args.rate_429, retry_after=args.retry_after, error_rate=args.error_rate,
+        malformed_rate=args.malformed_rate, prefill_per_1k=args.prefill_per_1k,
+        canned=args.canned.read_text(encoding="utf-8") if args.canned else None,
+        template=args.template.read_text(encoding="utf-8") if args.template else None,
+        seed=args.seed,
+    )
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    add_behavior_args(ap)
+    args = ap.parse_args(argv)
+
+    srv = MockDeepSeekServer(behavior_from_args(args), args.host, args.port)
+    print(f"模拟服务已启动：{srv.url}（Ctrl+C 退出）", file=sys.stderr)
+    try:
+        srv.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.httpd.server_close()
+        print(f"统计：{srv.behavior.stats}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
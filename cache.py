@@ -0,0 +1,110 @@
+"""
+分析结果的本地持久化缓存（SQLite）
+
+key = 归一化原文 + 场景 + 受众画像 + 模型名 + prompt 模板版本 的内容哈希；
+同样的组合再点一次“预测”直接返回，服务重启后依然有效。
+- TTL：超过 ttl 秒的条目视为过期（读到时删除）
+- 容量：超过 max_entries 时按最近访问时间淘汰（LRU）
+- 统计：hits / misses / expired / evictions / writes（进程内计数）
+"""
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+
+def normalize_text(text: str) -> str:
+    """换行统一、去掉行尾空白和首尾空行；不改动正文内容"""
+    s = (text or "").replace("\r\n", "\n").replace("\r", "\n")
+    s = re.sub(r"[ \t　]+\n", "\n", s)
+    return s.strip()
+
+
+def make_key(text: str, scenario: str, profile: dict, model: str, prompt_version: str) -> str:
+    blob = json.dumps(
+        {
+            "text": normalize_text(text),
+            "scenario": (scenario or "").strip(),
+            "profile": {k: ("" if v is None else str(v)) for k, v in (profile or {}).items()},
+            "model": model,
+            "prompt_version": prompt_version,
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class AnalysisCache:
+    def __init__(self, path, ttl: float = 7 * 24 * 3600, max_entries: int = 5000):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "writes": 0}
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS analysis_cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_accessed ON analysis_cache(accessed_at)")
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created_at FROM analysis_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            value, created_at = row
+            if self.ttl and now - created_at > self.ttl:
+                self._conn.execute("DELETE FROM analysis_cache WHERE key = ?", (key,))
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+            self._conn.execute("UPDATE analysis_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self.stats["hits"] += 1
+        return json.loads(value)
+
+    def put(self, key: str, value: dict):
+        now = time.time()
+        blob = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO analysis_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, blob, now, now),
+            )
+            self.stats["writes"] += 1
+            n = self._conn.execute("SELECT COUNT(*) FROM analysis_cache").fetchone()[0]
+            over = n - self.max_entries
+            if over > 0:
+                self._conn.execute(
+                    "DELETE FROM analysis_cache WHERE key IN "
+                    "(SELECT key FROM analysis_cache ORDER BY accessed_at ASC LIMIT ?)",
+                    (over,),
+                )
+                self.stats["evictions"] += over
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM analysis_cache")
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM analysis_cache").fetchone()[0]
+
+    def snapshot(self) -> dict:
+        """计数 + 当前条目数 + 命中率"""
+        s = dict(self.stats)
+        s["entries"] = len(self)
+        lookups = s["hits"] + s["misses"]
+        s["hit_rate"] = round(s["hits"] / lookups, 4) if lookups else 0.0
+        return s
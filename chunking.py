@@ -0,0 +1,114 @@
+"""
+长文按结构切块（长文模式 / map-reduce 用）
+
+管理办法、实施细则这类长文按结构边界切开：章 > 条 / 【】小标题 / 编号条目 > 句子。
+- 每块不超过 max_chars 字（单个条款本身超长时才按句号 / 分号硬切）
+- 块的 start / end 是在原文里的字符偏移，块内找到的证据加上 start 就是全文偏移
+- 块数超过 max_chunks 时把 max_chars 放大，块数和并发轮数都有上限
+- 每块带上所在章的标题，模型看到的上下文不至于断档
+
+    for c in split_chunks(text, max_chars=3000):
+        c.start, c.end, c.heading, c.text
+"""
+import math
+import re
+from typing import NamedTuple
+
+_NUM = "一二三四五六七八九十百零〇两0-9０-９"
+CHAPTER_RE = re.compile(rf"^\s*第[{_NUM}]+[章编篇]")
+SECTION_RE = re.compile(
+    rf"^\s*(第[{_NUM}]+[节条款]|【[^】\n]{{1,30}}】|[{_NUM}]+[、.．]|[（(][{_NUM}]+[）)])"
+)
+SENTENCE_END_RE = re.compile(r"[。；;！!？?]")
+
+
+class Chunk(NamedTuple):
+    start: int      # 在原文里的起点（含）
+    end: int        # 终点（不含），text == 原文[start:end]
+    heading: str    # 所在章的标题（没有章就是块的第一行）
+    text: str
+
+
+def _lines(text: str) -> list[tuple[int, str]]:
+    out, pos = [], 0
+    for ln in text.splitlines(keepends=True):
+        out.append((pos, ln))
+        pos += len(ln)
+    return out
+
+
+def _sections(text: str) -> list[tuple[int, int, bool, str]]:
+    """按章/条边界切成小节：[(start, end, 是否章开头, 所在章标题)]"""
+    out = []
+    chapter = ""
+    cur_start, cur_is_chapter = 0, False
+    for pos, ln in _lines(text):
+        is_chapter = bool(CHAPTER_RE.match(ln))
+        if pos > cur_start and (is_chapter or SECTION_RE.match(ln)):
+            out.append((cur_start, pos, cur_is_chapter, chapter))
+            cur_start, cur_is_chapter = pos, is_chapter
+        if is_chapter:
+            chapter = ln.strip()[:40]
+    if cur_start < len(text):
+        out.append((cur_start, len(text), cur_is_chapter, chapter))
+    return out
+
+
+def _hard_split(text: str, start: int, end: int, max_chars: int) -> list[tuple[int, int]]:
+    """超长小节按句末标点切，实在找不到标点才按字数切"""
+    out = []
+    while end - start > max_chars:
+        cut = start + max_chars
+        window = text[start + max_chars // 2:cut]
+        ends = [m.end() for m in SENTENCE_END_RE.finditer(window)]
+        if ends:
+            cut = start + max_chars // 2 + ends[-1]
+        out.append((start, cut))
+        start = cut
+    out.append((start, end))
+    return out
+
+
+def split_chunks(text: str, max_chars: int = 3000, max_chunks: int = 24) -> list[Chunk]:
+    text = text or ""
+    if not text.strip():
+        return []
+    max_chars = max(max_chars, math.ceil(len(text) / max(1, max_chunks)))
+    sections = _sections(text)
+    while True:
+        chunks = _pack(text, sections, max_chars)
+        if len(chunks) <= max_chunks:
+            return chunks
+        max_chars = int(max_chars * 1.5)   # 按章切留下的半空块太多，放大块重装
+
+
+def _pack(text: str, sections: list, max_chars: int) -> list[Chunk]:
+    pieces = []   # (start, end, 是否章开头, 章标题)
+    for s, e, is_chapter, chapter in sections:
+        if e - s <= max_chars:
+            pieces.append((s, e, is_chapter, chapter))
+        else:
+            for i, (a, b) in enumerate(_hard_split(text, s, e, max_chars)):
+                pieces.append((a, b, is_chapter and i == 0, chapter))
+
+    # 贪心装箱：装得下就并进当前块；新的一章开头且当前块已过半时另起一块，尽量按章切
+    spans, cur = [], None
+    for s, e, is_chapter, chapter in pieces:
+        if cur is not None:
+            size = cur[1] - cur[0]
+            if size + (e - s) <= max_chars and not (is_chapter and size >= max_chars // 2):
+                cur[1] = e
+                continue
+            spans.append(cur)
+        cur = [s, e, chapter]
+    if cur is not None:
+        spans.append(cur)
+
+    out = []
+    for s, e, chapter in spans:
+        body = text[s:e]
+        if not body.strip():
+            continue
+        first = body.strip().split("\n", 1)[0][:40]
+        out.append(Chunk(s, e, chapter or first, body))
+    return out
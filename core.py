@@ -0,0 +1,1506 @@
+"""
+清小知 —— 分析引擎
+
+风险门槛、模型调用、JSON 解析与结果修复都在这里，不依赖 Streamlit：
+app.py（页面）、batch.py（命令行批量）都从这里导入。
+import 时只加载标准库：requests / 连接池在第一次真正调用模型时才创建，
+页面相关的东西（样式、卡片、复制按钮）在 ui.py。
+"""
+import os
+import copy
+import functools
+import itertools
+import json
+import html
+import threading
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from cache import AnalysisCache, make_key
+from chunking import Chunk, split_chunks
+from incremental import IncrementalPlan, plan_incremental
+from jsonrepair import JSONRepairParser, parse_json
+from kwmatch import Hit, KeywordAutomaton
+from metrics import REGISTRY, record, span
+from prescore import PreScorer
+from ratelimit import RateLimiter, UpstreamBusyError
+from schema import VALIDATORS, provider_schema
+from singleflight import FlightAbandoned, SingleFlight
+from usage import UsageLedger, cache_hit_tokens, current_labels, usage_labels
+from textfmt import add_emojis_smart, format_batch, format_rewrite, pretty_notice  # noqa: F401  对外接口
+
+# =========================
+# DeepSeek config
+# =========================
+DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# 压测 / 离线联调时指向本地模拟服务：QXZ_API_URL=http://127.0.0.1:8765/chat/completions
+API_URL = os.getenv("QXZ_API_URL", "https://api.deepseek.com/chat/completions")
+# API_URL = "https://api.openai.com/v1/responses"
+MODEL = "deepseek-chat"
+# 改了 analyze() 里的 prompt 或后处理就把版本号往上加，旧缓存自然失效
+PROMPT_VERSION = "v4"
+# single：一次请求生成全部字段；decomposed：评分/情绪/三种改写拆成并发的小请求；
+# lite：只发评分+风险点那一个小请求（不生成情绪和改写），预算超出时自动降级到这里
+# long：长文按章/条切块并发分析再归并（见 chunking.py），超过 LONG_DOC_CHARS 字的文本自动走这里
+ANALYZE_MODES = ("single", "decomposed", "lite", "long")
+ANALYZE_MODE = os.getenv("QXZ_ANALYZE_MODE", "single")
+LONG_DOC_CHARS = int(os.getenv("QXZ_LONG_DOC_CHARS", 6000))        # 0 表示不自动切换
+LONG_CHUNK_CHARS = int(os.getenv("QXZ_LONG_CHUNK_CHARS", 3000))
+LONG_MAX_CHUNKS = int(os.getenv("QXZ_LONG_MAX_CHUNKS", 24))
+LONG_MAX_WORKERS = int(os.getenv("QXZ_LONG_MAX_WORKERS", 4))
+
+# =========================
+# token 预算（见 usage.py）；0 表示不限。窗口内超出后降级到 lite，超过 1.25 倍直接本地兜底
+# =========================
+BUDGET_WINDOW = float(os.getenv("QXZ_BUDGET_WINDOW", 24 * 3600))
+BUDGET_SESSION_TOKENS = int(os.getenv("QXZ_BUDGET_SESSION_TOKENS", 0))
+BUDGET_SCENARIO_TOKENS = int(os.getenv("QXZ_BUDGET_SCENARIO_TOKENS", 0))
+BUDGET_GLOBAL_TOKENS = int(os.getenv("QXZ_BUDGET_GLOBAL_TOKENS", 0))
+BUDGET_DEGRADE = os.getenv("QXZ_BUDGET_DEGRADE", "lite")  # lite / fallback
+
+USAGE = UsageLedger(
+    window=BUDGET_WINDOW,
+    session_budget=BUDGET_SESSION_TOKENS,
+    scenario_budget=BUDGET_SCENARIO_TOKENS,
+    global_budget=BUDGET_GLOBAL_TOKENS,
+    degrade=BUDGET_DEGRADE,
+)
+
+# =========================
+# 上游限流（见 ratelimit.py）：所有会话共用；QXZ_RATE_LIMIT_RPS=0 关闭
+# =========================
+RATE_LIMIT_RPS = float(os.getenv("QXZ_RATE_LIMIT_RPS", 5))
+RATE_LIMIT_BURST = int(os.getenv("QXZ_RATE_LIMIT_BURST", 10))
+RATE_LIMIT_MAX_QUEUE = int(os.getenv("QXZ_RATE_LIMIT_MAX_QUEUE", 50))
+RATE_LIMIT_MAX_WAIT = float(os.getenv("QXZ_RATE_LIMIT_MAX_WAIT", 45))
+
+LIMITER = RateLimiter(
+    rate=RATE_LIMIT_RPS,
+    burst=RATE_LIMIT_BURST,
+    max_queue=RATE_LIMIT_MAX_QUEUE,
+    max_wait=RATE_LIMIT_MAX_WAIT,
+)
+
+# =========================
+# 结构化输出（见 schema.py）：请求带 response_format，解析后按同一份 schema 校验修复
+# off：不带；json_object：只要求输出 JSON（DeepSeek 支持的形式）；json_schema：带完整 schema（strict）
+# =========================
+STRUCTURED_OUTPUT = os.getenv("QXZ_STRUCTURED_OUTPUT", "json_object")
+
+# =========================
+# 请求合并（见 singleflight.py）：相同的分析正在进行时，后来的调用方等同一份结果；QXZ_COALESCE=0 关闭
+# =========================
+COALESCE_ENABLED = os.getenv("QXZ_COALESCE", "1") != "0"
+FLIGHTS = SingleFlight()
+
+# =========================
+# 段落级增量分析（见 incremental.py）：改动超过这个比例（按字数）就整篇重新分析
+# =========================
+INCREMENTAL_MAX_RATIO = float(os.getenv("QXZ_INCREMENTAL_MAX_RATIO", 0.5))
+INCREMENTAL_MAX_WORKERS = int(os.getenv("QXZ_INCREMENTAL_MAX_WORKERS", 4))
+
+# =========================
+# 本地预评分（见 prescore.py）：门槛判为非实质风险、且本地模型有把握是 LOW 时不调上游；QXZ_PRESCORE=0 关闭
+# 模型文件不存在时不生效（先用 python prescore.py train 训练）；分析结果作为标注追加到 LABEL_LOG_PATH（置空不记）
+# =========================
+PRESCORE_ENABLED = os.getenv("QXZ_PRESCORE", "1") != "0"
+PRESCORE_MODEL_PATH = os.getenv("QXZ_PRESCORE_MODEL", str(Path(__file__).parent / ".cache" / "prescore.json"))
+PRESCORE_THRESHOLD = float(os.getenv("QXZ_PRESCORE_THRESHOLD", 0.9))
+LABEL_LOG_PATH = os.getenv("QXZ_LABEL_LOG", str(Path(__file__).parent / ".cache" / "labels.jsonl"))
+
+# =========================
+# 结果缓存（见 cache.py）
+# =========================
+CACHE_ENABLED = os.getenv("QXZ_CACHE", "1") != "0"
+CACHE_PATH = os.getenv("QXZ_CACHE_PATH", str(Path(__file__).parent / ".cache" / "analysis.sqlite3"))
+CACHE_TTL = float(os.getenv("QXZ_CACHE_TTL", 7 * 24 * 3600))
+CACHE_MAX_ENTRIES = int(os.getenv("QXZ_CACHE_MAX_ENTRIES", 5000))
+
+# =========================
+# HTTP 连接池（见 http_client.py）
+# =========================
+HTTP_POOL_SIZE = int(os.getenv("QXZ_HTTP_POOL_SIZE", 10))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("QXZ_HTTP_CONNECT_TIMEOUT", 5))
+HTTP_READ_TIMEOUT = float(os.getenv("QXZ_HTTP_READ_TIMEOUT", 90))
+HTTP_MAX_RETRIES = int(os.getenv("QXZ_HTTP_MAX_RETRIES", 2))
+HTTP_BACKOFF = float(os.getenv("QXZ_HTTP_BACKOFF", 0.5))
+
+_cache = None
+_cache_lock = threading.Lock()
+_http_client = None
+_http_lock = threading.Lock()
+
+def get_http_client():
+    """所有模型调用共用的连接池客户端；第一次用到时才 import requests"""
+    global _http_client
+    if _http_client is None:
+        with _http_lock:
+            if _http_client is None:
+                from http_client import PooledHTTPClient
+
+                _http_client = PooledHTTPClient(
+                    pool_size=HTTP_POOL_SIZE,
+                    connect_timeout=HTTP_CONNECT_TIMEOUT,
+                    read_timeout=HTTP_READ_TIMEOUT,
+                    max_retries=HTTP_MAX_RETRIES,
+                    backoff=HTTP_BACKOFF,
+                )
+    return _http_client
+
+_prescorer = None
+_prescorer_lock = threading.Lock()
+_label_lock = threading.Lock()
+
+def get_prescorer() -> PreScorer | None:
+    """进程内单例；模型文件不存在 / 读不了时返回 None（只试一次，重新训练后重启生效）"""
+    global _prescorer
+    if not PRESCORE_ENABLED:
+        return None
+    if _prescorer is None:
+        with _prescorer_lock:
+            if _prescorer is None:
+                try:
+                    _prescorer = PreScorer.load(PRESCORE_MODEL_PATH)
+                except (OSError, ValueError, KeyError):
+                    _prescorer = False
+    return _prescorer or None
+
+def get_cache():
+    """进程内单例；第一次用到时才打开 SQLite，关闭缓存时返回 None"""
+    global _cache
+    if not CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = AnalysisCache(CACHE_PATH, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES)
+    return _cache
+
+# --- 风险门槛：硬规则关键词（你之后可继续扩充） ---
+NEGATIVE_CONSEQ_WORDS = [
+    "处分", "通报", "追责", "严肃处理", "从严", "清退", "取消资格", "影响评优", "记入", "扣分", "处罚",
+    "必须", "一律", "不得", "严禁", "否则", "后果自负", "责任自负", "视为放弃", "将被", "逾期不再",
+]
+FAIRNESS_RESOURCE_WORDS = [
+    "名额", "优先", "排序", "资格", "评选", "评优", "奖学金", "助学金", "资助", "补贴", "分配", "指标", "录取",
+]
+DISCIPLINE_WORDS = [
+    "违纪", "违规", "纪律", "处分", "通报", "处理决定", "处理通告", "问责", "调查", "举报",
+]
+POLICY_WORDS = [
+    "制度", "规定", "办法", "细则", "政策", "条例", "实施", "执行标准", "解释权", "最终解释权",
+]
+# 事务型：出现 >=2 基本就不该被当舆情风险
+TRANSACTIONAL_HINTS = [
+    "领取", "发放", "领取地点", "配送", "领取时间", "办公室", "带好", "携带", "请前往", "请到", "数量", "一套", "人手",
+    "领取方式", "现场", "登记", "材料", "附件", "表格", "提交", "截止", "时间", "地点", "联系人", "咨询",
+]
+
+def safe_extract_json(text):
+    """
+    返回 (parsed, err)；容错解析见 jsonrepair.py（截断、尾逗号、裸换行、结构位置的中文引号等都能修）。
+    text 也可以是流式时已经逐段 feed 过的 JSONRepairParser，这里只做收尾，不再从头扫描。
+    按结果计数：qxz_json_extract_total{result=ok / repaired / 失败类别}，修过的再按修复项计数。
+    """
+    with span("json_extract"):
+        if isinstance(text, JSONRepairParser):
+            parsed, err = text.finish()
+            repairs = text.repairs
+        else:
+            parsed, err, repairs = parse_json(text)
+    if err is not None:
+        REGISTRY.inc("qxz_json_extract_total", result=err.split(":")[0])
+    elif repairs:
+        REGISTRY.inc("qxz_json_extract_total", result="repaired")
+        for r in repairs:
+            REGISTRY.inc("qxz_json_repair_total", repair=r)
+    else:
+        REGISTRY.inc("qxz_json_extract_total", result="ok")
+    return parsed, err
+
+def acquire_upstream(labels: dict | None = None):
+    """
+    发请求前排队拿许可；队列满 / 等太久抛 UpstreamBusyError（调用方不要把它当普通失败去兜底）。
+    一次 HTTP 请求一个许可：HTTP 客户端内部的重试也要拿（post_json 的 before_retry）。
+    """
+    labels = current_labels() if labels is None else labels
+    try:
+        with span("queue_wait"):
+            LIMITER.acquire(session=labels.get("session"))
+    except UpstreamBusyError as e:
+        REGISTRY.inc("qxz_upstream_busy_total", kind=type(e).__name__)
+        raise
+
+def response_format(schema: str | None) -> dict | None:
+    """schema：schema.SCHEMAS 里的名字；None 或 STRUCTURED_OUTPUT=off 时不带 response_format"""
+    if schema is None or STRUCTURED_OUTPUT == "off":
+        return None
+    if STRUCTURED_OUTPUT == "json_schema":
+        return {"type": "json_schema", "json_schema": {"name": schema, "strict": True, "schema": provider_schema(schema)}}
+    return {"type": "json_object"}
+
+def parse_structured(content, schema: str) -> dict | None:
+    """
+    safe_extract_json + 按 schema 校验修复（类型、范围、枚举、缺字段一遍修完）；解析不出对象返回 None。
+    每个违规按字段计数：qxz_schema_violation_total{schema, field, kind}
+    """
+    parsed, _ = safe_extract_json(content)
+    if not isinstance(parsed, dict):
+        return None
+    with span("validate"):
+        parsed, bad = VALIDATORS[schema](parsed)
+    for field, kind in bad:
+        REGISTRY.inc("qxz_schema_violation_total", schema=schema, field=field, kind=kind)
+    return parsed
+
+def call_deepseek(system_prompt: str, user_prompt: str, model: str = MODEL, schema: str | None = None):
+    headers = {"Authorization": f"Bearer {DEEPSEEK_API_KEY}", "Content-Type": "application/json"}
+    payload = {
+        "model": model,
+        "messages": [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
+        "temperature": 0.3,
+    }
+    fmt = response_format(schema)
+    if fmt is not None:
+        payload["response_format"] = fmt
+    labels = current_labels()
+    acquire_upstream(labels)
+    t0 = time.perf_counter()
+    with span("http"):
+        r = get_http_client().post_json(API_URL, payload, headers=headers,
+                                        before_retry=lambda: acquire_upstream(labels))
+        data = r.json()
+    record_usage(data.get("usage"), time.perf_counter() - t0, labels)
+    return data["choices"][0]["message"]["content"]
+
+def record_usage(usage: dict | None, latency: float, labels: dict | None = None):
+    """一次模型调用的用量：记进 USAGE（按会话/场景/模式标签，缺省取当前上下文）和指标计数"""
+    labels = current_labels() if labels is None else labels
+    USAGE.record(usage, latency, labels)
+    mode = labels.get("mode", "")
+    for kind in ("prompt_tokens", "completion_tokens"):
+        n = int((usage or {}).get(kind) or 0)
+        if n:
+            REGISTRY.inc("qxz_tokens_total", n, kind=kind.split("_")[0], mode=mode)
+    n = cache_hit_tokens(usage or {})
+    if n:
+        REGISTRY.inc("qxz_tokens_total", n, kind="cache_hit", mode=mode)   # prompt 的一部分，不另算
+
+def call_deepseek_stream(system_prompt: str, user_prompt: str, model: str = MODEL, labels: dict | None = None,
+                         schema: str | None = None):
+    """
+    stream=True 版本：按 SSE 逐块产出 content 增量。
+    生成器在调用方的上下文里分段执行，用量标签由调用方显式传入（缺省取第一次迭代时的上下文）。
+    """
+    labels = current_labels() if labels is None else labels
+    headers = {"Authorization": f"Bearer {DEEPSEEK_API_KEY}", "Content-Type": "application/json"}
+    payload = {
+        "model": model,
+        "messages": [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
+        "temperature": 0.3,
+        "stream": True,
+        "stream_options": {"include_usage": True},  # 最后一块带 usage
+    }
+    fmt = response_format(schema)
+    if fmt is not None:
+        payload["response_format"] = fmt
+    acquire_upstream(labels)
+    t_start = time.perf_counter()
+    with span("http"):  # 到响应头为止
+        r = get_http_client().post_json(API_URL, payload, headers=headers, stream=True,
+                                        before_retry=lambda: acquire_upstream(labels))
+    reading = 0.0  # 只算等数据的时间，不含调用方处理每一块的时间
+    first = True
+    usage = None
+    try:
+        # 按行切分后再解码，多字节汉字不会被拆开
+        lines = r.iter_lines()
+        while True:
+            t0 = time.perf_counter()
+            raw = next(lines, None)
+            reading += time.perf_counter() - t0
+            if raw is None:
+                break
+            line = raw.decode("utf-8").strip() if raw else ""
+            if not line.startswith("data:"):
+                continue  # 空行 / keep-alive 注释
+            data = line[5:].strip()
+            if data == "[DONE]":
+                break
+            chunk = json.loads(data)
+            usage = chunk.get("usage") or usage
+            choices = chunk.get("choices") or [{}]
+            piece = (choices[0].get("delta") or {}).get("content")
+            if piece:
+                if first:
+                    first = False
+                    record("http_first_token", time.perf_counter() - t_start, t_start)
+                yield piece
+    finally:
+        record("http_stream", reading)
+        record_usage(usage, time.perf_counter() - t_start, labels)
+        r.close()
+
+def call_gpt(system_prompt: str, user_prompt: str, model: str = "gpt-5"):
+    headers = {
+        "Authorization": f"Bearer {OPENAI_API_KEY}",
+        "Content-Type": "application/json",
+    }
+    payload = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ],
+        "temperature": 0.9,
+    }
+    labels = current_labels()
+    acquire_upstream(labels)   # 和 DeepSeek 共用同一个令牌桶 / 公平队列
+    t0 = time.perf_counter()
+    with span("http"):
+        r = get_http_client().post_json(API_URL, payload, headers=headers,
+                                        before_retry=lambda: acquire_upstream(labels))
+        data = r.json()
+    record_usage(data.get("usage"), time.perf_counter() - t0, labels)
+    return data["choices"][0]["message"]["content"]
+
+def clamp01(x):
+    try:
+        x = float(x)
+    except Exception:
+        return 0.0
+    return max(0.0, min(1.0, x))
+
+
+# =========================
+# 文本格式化（纯函数，页面/导出共用）
+# =========================
+# pretty_notice / add_emojis_smart 的实现在 textfmt.py（规则表编译一次 + 记忆化）
+
+def evidence_spans(raw_text: str, phrases: list[str]) -> list[tuple[int, int]]:
+    """所有短语在原文里的全部出现位置（一遍扫描），已合并"""
+    words = list(dict.fromkeys(p.strip() for p in (phrases or []) if isinstance(p, str) and p.strip()))
+    if not raw_text or not words:
+        return []
+    return KeywordAutomaton({"evidence": words}).spans(raw_text)
+
+def highlight_text_html(raw_text: str, phrases: list[str]) -> str:
+    """
+    原文 + 触发片段高亮：先找全部区间、合并重叠/相邻的，再一次性拼出转义后的 HTML，
+    <mark> 不会嵌套，也不会把已经插入的标签当成原文去匹配。
+    """
+    if not raw_text:
+        return ""
+    out = []
+    pos = 0
+    for s, e in evidence_spans(raw_text, phrases):
+        out.append(html.escape(raw_text[pos:s]))
+        out.append(f"<mark class='hl'>{html.escape(raw_text[s:e])}</mark>")
+        pos = e
+    out.append(html.escape(raw_text[pos:]))
+    body = "".join(out)
+    return f"<div class='card' style='line-height:1.85;font-size:15px;white-space:pre-wrap;'>{body}</div>"
+
+# =========================
+# Risk Gate（门槛判断）
+# =========================
+# risk_gate 里原来内联的两组词
+DISCIPLINE_TYPE_WORDS = ["处分", "违纪", "通报"]
+STRONG_CONSTRAINT_WORDS = ["必须", "不得", "严禁", "一律", "否则", "逾期"]
+
+# 所有门槛词库编译成一个自动机：一遍扫描拿到全部类别的命中
+GATE_LEXICONS = {
+    "negative": NEGATIVE_CONSEQ_WORDS,
+    "fairness": FAIRNESS_RESOURCE_WORDS,
+    "discipline": DISCIPLINE_WORDS,
+    "policy": POLICY_WORDS,
+    "transactional": TRANSACTIONAL_HINTS,
+    "discipline_type": DISCIPLINE_TYPE_WORDS,
+    "strong_constraint": STRONG_CONSTRAINT_WORDS,
+}
+GATE_AUTOMATON = KeywordAutomaton(GATE_LEXICONS)
+
+# 门槛结论的三种说明（gatebatch.py 的向量化版本共用）
+GATE_REASON_TRANSACTIONAL = "该文本更像事务型通知，未出现惩戒后果/权益分配/纪律处分等实质舆情触发因素。"
+GATE_REASON_CLEAR = "未检测到明确的惩戒后果、不公平分配、纪律处分或强约束条款；若有问题多为表达/信息完整度。"
+GATE_REASON_SUBSTANTIVE = "检测到可能引发争议的触发因素（如后果条款/权益分配/纪律处分/强约束政策），建议进入舆情风险分析。"
+
+def gate_hits(text: str) -> list[Hit]:
+    """门槛词的全部命中（含类别与字符偏移），用于调试/高亮"""
+    return GATE_AUTOMATON.find_all(text or "")
+
+def risk_gate(text: str) -> dict:
+    """
+    输出：
+      - is_substantive: 是否存在“实质舆情风险触发因素”
+      - reason: 门槛解释
+      - type: 事务型/政策型/纪律处分型/资源分配型/其他
+      - transactional: 是否明显事务型
+    整列 / 整个归档批量判断用 gatebatch.gate_frame（向量化，结论逐行相同）。
+    """
+    return gate_from_hits(GATE_AUTOMATON.scan(text or ""))
+
+@functools.lru_cache(maxsize=4096)
+def _paragraph_gate_hits(paragraph: str) -> dict[str, frozenset]:
+    return {c: frozenset(ws) for c, ws in GATE_AUTOMATON.scan(paragraph).items()}
+
+def risk_gate_paragraphs(paragraphs: list[str]) -> dict:
+    """逐段扫描（按段缓存）再合并；门槛词不跨行，结果与整篇 risk_gate 一致"""
+    hits = {c: set() for c in GATE_AUTOMATON.categories}
+    for p in paragraphs:
+        for c, ws in _paragraph_gate_hits(p).items():
+            hits[c] |= ws
+    return gate_from_hits(hits)
+
+def gate_from_hits(hits: dict[str, set]) -> dict:
+    has_negative = bool(hits["negative"])
+    has_fairness = bool(hits["fairness"])
+    has_discipline = bool(hits["discipline"])
+    has_policy = bool(hits["policy"])
+
+    transactional_hits = len(hits["transactional"])
+    transactional = transactional_hits >= 2 and (not has_negative) and (not has_fairness) and (not has_discipline)
+
+    # 类型
+    if has_discipline or hits["discipline_type"]:
+        ntype = "纪律处分型"
+    elif has_fairness:
+        ntype = "资源分配型"
+    elif has_policy:
+        ntype = "政策制度型"
+    elif transactional:
+        ntype = "事务型"
+    else:
+        ntype = "其他"
+
+    # 门槛：只要出现“负面后果/不公平/纪律处分/政策强约束”才算实质风险
+    is_substantive = bool(has_negative or has_fairness or has_discipline or (has_policy and hits["strong_constraint"]))
+
+    if transactional and not is_substantive:
+        return {
+            "is_substantive": False,
+            "reason": GATE_REASON_TRANSACTIONAL,
+            "type": ntype,
+            "transactional": True,
+        }
+
+    if not is_substantive:
+        return {
+            "is_substantive": False,
+            "reason": GATE_REASON_CLEAR,
+            "type": ntype,
+            "transactional": transactional,
+        }
+
+    return {
+        "is_substantive": True,
+        "reason": GATE_REASON_SUBSTANTIVE,
+        "type": ntype,
+        "transactional": transactional,
+    }
+def normalize_issues(issues: list, raw_text: str) -> list:
+    if not issues:
+        return []
+
+    BAD_TITLES = {"风险点标题", "未命名", "(未命名)", "风险点", "标题", "", None}
+
+    fixed = []
+    used = set()
+
+    for i, it in enumerate(issues):
+        it = it or {}
+        title = (it.get("title") or "").strip()
+        evidence = (it.get("evidence") or "").strip()
+
+        # evidence 兜底：没有就从原文截一段
+        if not evidence:
+            t = (raw_text or "").strip().replace("\n", " ")
+            evidence = (t[:12] + "…") if len(t) > 12 else t
+            it["evidence"] = evidence
+
+        # title 修复：如果是占位词/空，改成根据 evidence 的标题
+        if (not title) or (title in BAD_TITLES) or (title.startswith("风险点")):
+            title = f"触发片段：{evidence[:12]}{'…' if len(evidence) > 12 else ''}"
+            it["title"] = title
+
+        # 防止重复：重复就加编号
+        if it["title"] in used:
+            it["title"] = f"{it['title']}（{i+1}）"
+        used.add(it["title"])
+
+        fixed.append(it)
+
+    return fixed
+
+# =========================
+# Model analyze（降低“过敏”）
+# =========================
+def _low_risk_result(gate: dict, score: int = 10, tag: str = "兜底") -> dict:
+    """非实质风险时的本地结果（兜底 / 本地预评分共用）：只给轻量表达优化建议"""
+    return {
+        "risk_score": score,
+        "risk_level": "LOW",
+        "summary": "未检测到实质舆情风险（偏事务型/日常沟通）。如需可做轻量表达优化。",
+        "issues": [],
+        "student_emotions": [],
+        "rewrites": [
+            {"name": "更清晰", "pred_risk_score": score, "text": f"（{tag}）建议补充时间/地点/咨询方式，使信息更清晰。", "why": "事务型通知以信息完整为主。"},
+            {"name": "更安抚", "pred_risk_score": score, "text": f"（{tag}）建议增加一句感谢/理解，语气更柔和。", "why": "降低误读与抵触。"},
+            {"name": "更可执行", "pred_risk_score": score, "text": f"（{tag}）建议用清单列出“时间-地点-操作步骤”。", "why": "可执行性更强。"},
+        ],
+        "risk_gate": gate,
+    }
+
+def local_fallback(text: str, reason: str = "other"):
+    # 兜底：也走 risk_gate，避免兜底时过敏；结果带 fallback=True，方便批量/统计区分
+    REGISTRY.inc("qxz_fallback_total", reason=reason)
+    gate = risk_gate(text)
+    if not gate["is_substantive"]:
+        return {**_low_risk_result(gate), "fallback": True}
+
+    # 如果真有触发因素，再给一个中等强度兜底
+    return {
+        "risk_score": 55,
+        "risk_level": "MEDIUM",
+        "summary": "可能存在规则口径/后果表达引发争议的点，建议明确范围与例外。",
+        "issues": [],
+        "student_emotions": [],
+        "rewrites": [
+            {"name": "更清晰", "pred_risk_score": 45, "text": "（兜底）建议明确范围、时间窗口、执行标准与咨询渠道。", "why": "减少误读。"},
+            {"name": "更安抚", "pred_risk_score": 45, "text": "（兜底）说明目的与支持措施，避免对立语气。", "why": "降低抵触。"},
+            {"name": "更可执行", "pred_risk_score": 40, "text": "（兜底）用步骤清单+截止时间+申诉渠道。", "why": "更可操作。"},
+        ],
+        "risk_gate": gate,
+        "fallback": True,
+    }
+
+def prescore_result(text: str, scenario: str) -> dict | None:
+    """
+    本地预评分：规则门槛判为非实质风险、且本地模型判 LOW 的置信度 >= PRESCORE_THRESHOLD 时，
+    直接返回本地结果（带 prescored={level, score, confidence}，不入缓存、不算标注）；否则返回 None，照常调模型。
+    长文不走这里。
+    """
+    model = get_prescorer()
+    if model is None or is_long_document(text):
+        return None
+    with span("prescore"):
+        gate = risk_gate(text)
+        pred = None if gate["is_substantive"] else model.predict(text, scenario)
+    if pred is None or pred.level != "LOW" or pred.confidence < PRESCORE_THRESHOLD:
+        REGISTRY.inc("qxz_prescore_total", outcome="pass")
+        return None
+    REGISTRY.inc("qxz_prescore_total", outcome="skip")
+    result = _low_risk_result(gate, score=min(pred.score, 25), tag="本地预评分")
+    result["prescored"] = {"level": pred.level, "score": pred.score, "confidence": round(pred.confidence, 3)}
+    return result
+
+def log_label(text: str, scenario: str, mode: str, result: dict):
+    """
+    模型给出的完整结果作为预评分的训练样本追加到 LABEL_LOG_PATH；兜底 / 精简 / 降级的结果不记。
+    risk_level / risk_score 记的是门槛强制降敏之前模型自己的结论（model_verdict），
+    final_level / final_score 是展示给用户的（门槛判为非实质风险时一律 LOW）。
+    """
+    verdict = result.get("model_verdict")
+    if (not LABEL_LOG_PATH or verdict is None or mode == "lite"
+            or result.get("fallback") or result.get("budget_degraded")):
+        return
+    gate = result.get("risk_gate") or {}
+    line = json.dumps({
+        "text": text, "scenario": scenario, "mode": mode,
+        "risk_score": verdict["risk_score"], "risk_level": verdict["risk_level"],
+        "model_substantive": verdict.get("is_substantive"), "gate_substantive": gate.get("is_substantive"),
+        "final_score": result.get("risk_score"), "final_level": result.get("risk_level"),
+        "type": gate.get("type"), "ts": round(time.time(), 3),
+    }, ensure_ascii=False)
+    try:
+        with _label_lock:
+            Path(LABEL_LOG_PATH).parent.mkdir(parents=True, exist_ok=True)
+            with open(LABEL_LOG_PATH, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+    except OSError:
+        pass   # 记不下来不影响分析
+
+def analyze(text: str, scenario: str, profile: dict, bypass_cache: bool = False, mode: str | None = None):
+    """
+    带缓存的分析入口。
+    bypass_cache=True：不读缓存、强制重新调用模型，新结果仍会写回（相当于刷新）。
+    mode：single / decomposed / lite，缺省取 ANALYZE_MODE；各模式的缓存互不混用。
+    命中缓存的结果带 cached=True；兜底结果不入缓存。
+    上游限流排队失败（队列满 / 等待超时）抛 UpstreamBusyError，由调用方提示用户，不做兜底。
+    token 预算超出时降级（结果带 budget_degraded="lite" / "fallback"），缓存命中不受预算限制。
+    同样的分析（原文/场景/画像/模型/模式都相同）正在进行时不再发请求，等那一份的结果（带 coalesced=True）。
+    超过 LONG_DOC_CHARS 字的文本在 single / decomposed 下自动改走 long 模式。
+    本地预评分有把握是低风险时不调模型（结果带 prescored，见 prescore_result）；bypass_cache=True 时不走预评分。
+    """
+    mode = _resolve_mode(text, mode)
+    with span("total"), usage_labels(scenario=scenario, mode=mode):
+        if COALESCE_ENABLED:
+            result, shared = FLIGHTS.do(
+                _flight_key(text, scenario, profile, mode, bypass_cache),
+                lambda: _analyze_cached(text, scenario, profile, bypass_cache, mode),
+            )
+        else:
+            result, shared = _analyze_cached(text, scenario, profile, bypass_cache, mode), False
+    if shared:
+        result["coalesced"] = True
+        REGISTRY.inc("qxz_coalesced_total", mode=mode)
+    outcome = ("cached" if result.get("cached") else "fallback" if result.get("fallback")
+               else "prescored" if result.get("prescored") else "ok")
+    REGISTRY.inc("qxz_analyze_total", mode=mode, outcome=outcome)
+    return result
+
+def _resolve_mode(text: str, mode: str | None) -> str:
+    mode = mode if mode in ANALYZE_MODES else ANALYZE_MODE
+    if mode in ("single", "decomposed") and is_long_document(text):
+        return "long"
+    return mode
+
+def is_long_document(text: str) -> bool:
+    return bool(LONG_DOC_CHARS) and len(text or "") > LONG_DOC_CHARS
+
+def _flight_key(text: str, scenario: str, profile: dict, mode: str, bypass_cache: bool) -> str:
+    # 强制刷新的请求只和强制刷新的合并，免得跟上一个命中缓存的旧结果
+    key = make_key(text, scenario, profile, MODEL, _cache_version(mode))
+    return f"{key}/refresh" if bypass_cache else key
+
+def _cache_lookup(cache, key: str):
+    with span("cache_get"):
+        hit = cache.get(key)
+    if hit is not None:
+        hit["cached"] = True
+    return hit
+
+def _analyze_cached(text: str, scenario: str, profile: dict, bypass_cache: bool, mode: str):
+    cache = get_cache()
+    key = None
+    if cache is not None:
+        key = make_key(text, scenario, profile, MODEL, _cache_version(mode))
+        if not bypass_cache:
+            hit = _cache_lookup(cache, key)
+            if hit is not None:
+                return hit
+    if not bypass_cache:
+        pre = prescore_result(text, scenario)
+        if pre is not None:
+            return pre
+
+    # 真要调模型了，先看预算
+    degrade, which = USAGE.decision()
+    if degrade == "fallback":
+        REGISTRY.inc("qxz_budget_degraded_total", action="fallback", budget=which)
+        result = local_fallback(text, "budget")
+        result["budget_degraded"] = "fallback"
+        return result
+    if degrade == "lite" and mode != "lite":
+        REGISTRY.inc("qxz_budget_degraded_total", action="lite", budget=which)
+        mode = "lite"
+        if cache is not None:
+            key = make_key(text, scenario, profile, MODEL, _cache_version(mode))
+            hit = None if bypass_cache else _cache_lookup(cache, key)
+            if hit is not None:
+                hit["budget_degraded"] = "lite"
+                return hit
+
+    with usage_labels(mode=mode):
+        if mode == "decomposed":
+            result = _analyze_decomposed(text, scenario, profile)
+        elif mode == "lite":
+            result = _analyze_lite(text, scenario, profile)
+        elif mode == "long":
+            result = _analyze_long(text, scenario, profile)
+        else:
+            result = _analyze_uncached(text, scenario, profile)
+    if cache is not None and not result.get("fallback"):
+        with span("cache_put"):
+            cache.put(key, result)
+    if not degrade:
+        log_label(text, scenario, mode, result)
+    if degrade:
+        result["budget_degraded"] = degrade  # 写缓存之后再标，缓存里的结果不带这个标记
+    return result
+
+def _cache_version(mode: str) -> str:
+    return PROMPT_VERSION if mode == "single" else f"{PROMPT_VERSION}/{mode}"
+
+SYSTEM_PROMPT = (
+    "你是高校舆情风险与学生情绪分析专家。"
+    "你必须输出【严格 JSON】且只能输出 JSON，不能有任何解释、前后缀、代码块标记。"
+    "JSON 必须可被 Python json.loads 直接解析。"
+)
+
+GATE_RULES = """【特别强调】
+- “风格不够正式/可能被调侃/可能被截图发群”不属于舆情风险，只能算“表达优化”；
+- 只有出现以下至少一类，才算“实质舆情风险”：
+  1) 明确惩戒/负面后果（处分、通报、追责、取消资格、逾期不受理等）
+  2) 资源/名额/资格分配导致的不公平争议
+  3) 纪律处分/违纪处理
+  4) 强约束政策且口径模糊可能引发权益受损"""
+
+def _context_block(text: str, scenario: str, profile: dict) -> str:
+    # 原文在画像前面：同一篇通知换画像（受众矩阵、反复调画像）时，说明 + 场景 + 原文都是共同前缀
+    return f"""【场景】{scenario}
+
+【原文】
+{text}
+
+{_profile_block(profile)}"""
+
+def _audience_block(scenario: str, profile: dict) -> str:
+    return f"""【场景】{scenario}
+
+{_profile_block(profile)}"""
+
+def _profile_block(profile: dict) -> str:
+    return f"""【受众画像】
+- 年级/阶段：{profile.get("grade")}
+- 身份：{profile.get("role")}
+- 性别：{profile.get("gender")}
+- 情绪敏感度：{profile.get("sensitivity")}
+- 画像补充：{profile.get("custom")}"""
+
+# 提示词布局：每种请求的说明（任务、门槛规则、JSON 结构、强制规则）是模块级常量，放在最前面，
+# 每次调用逐字节相同；场景 / 原文 / 画像这些变化的内容统一接在最后，按变化从少到多排。
+# 服务方的上下文缓存按前缀命中，命中的 token 数见 usage 里的 cache_hit_tokens（usage.py）。
+# 改了任何一段说明都要把 PROMPT_VERSION 往上加
+INPUTS_HEADER = "======== 以下是本次的输入 ========"
+
+def _with_inputs(instructions: str, *blocks: str) -> str:
+    return f"{instructions}\n{INPUTS_HEADER}\n\n" + "\n\n".join(blocks) + "\n"
+
+ANALYSIS_INSTRUCTIONS = f"""
+你要先做【风险门槛判断 Risk Gate】，再决定是否进入“舆情风险分析”。场景、受众画像和原文在最后的输入部分。
+
+{GATE_RULES}
+
+【你必须输出的 JSON 结构】字段名必须一致：
+{{
+  "risk_gate": {{
+    "type": "事务型|政策制度型|纪律处分型|资源分配型|其他",
+    "is_substantive": true/false,
+    "reason": "一句话解释门槛判断"
+  }},
+  "risk_score": 0-100的整数,
+  "risk_level": "LOW"|"MEDIUM"|"HIGH",
+  "summary": "一句话结论（具体、可读）",
+  "issues": [
+    {{
+      "title": "风险点标题（如果只是表达风格，请写：表达优化点）",
+      "evidence": "原文中触发点短语（必须来自原文，尽量 3-12 字）",
+      "why": "原因（高校语境）",
+      "rewrite_tip": "怎么改（具体）"
+    }}
+  ],
+  "student_emotions": [
+    {{
+      "group": "学生群体名称",
+      "sentiment": "主要情绪（焦虑/抵触/困惑/担忧/紧张/轻松/无明显）",
+      "intensity": 0到1的小数,
+      "sample_comment": "一句典型评论（口语化）"
+    }}
+  ],
+  "rewrites": [
+    {{
+      "name": "必须为：更清晰 / 更安抚 / 更可执行",
+      "pred_risk_score": 0-100整数,
+      "text": "改写后的完整文本（含义一致，但表达要明显不同）",
+      "why": "1-2句话说明为何更稳"
+    }}
+  ]
+}}
+
+【强制规则】
+1) 如果 risk_gate.is_substantive=false：
+   - risk_level 必须是 LOW
+   - risk_score 必须 <= 25
+   - issues 最多 1 条，且必须是“表达优化点”，不要写传播链、不要写惩戒、不准渲染舆情
+   - student_emotions 必须为空数组 []
+2) rewrites 必须且只能 3 个，顺序：更清晰、更安抚、更可执行
+3) issues.evidence 必须能在原文中直接找到
+4) intensity 必须在 0~1
+"""
+
+def build_prompts(text: str, scenario: str, profile: dict) -> tuple[str, str]:
+    # 关键：在 prompt 里显式告诉模型“不要把调侃/不正式当舆情风险”（GATE_RULES）
+    return SYSTEM_PROMPT, _with_inputs(ANALYSIS_INSTRUCTIONS, _context_block(text, scenario, profile))
+
+# =========================
+# 拆分并行模式（decomposed）
+# =========================
+REWRITE_STYLES = {
+    "更清晰": "信息结构清楚：时间、地点、对象、步骤一目了然，消除歧义",
+    "更安抚": "先说明目的与支持措施，语气温和、减少对立感，但不改变规则本身",
+    "更可执行": "用清单/步骤写清楚怎么做、截止时间、所需材料、咨询与申诉渠道",
+}
+
+SCORE_INSTRUCTIONS = f"""
+你要先做【风险门槛判断 Risk Gate】，再给出风险评分与风险点。场景、受众画像和原文在最后的输入部分。
+
+{GATE_RULES}
+
+【你必须输出的 JSON 结构】字段名必须一致：
+{{
+  "risk_gate": {{"type": "事务型|政策制度型|纪律处分型|资源分配型|其他", "is_substantive": true/false, "reason": "一句话解释门槛判断"}},
+  "risk_score": 0-100的整数,
+  "risk_level": "LOW"|"MEDIUM"|"HIGH",
+  "summary": "一句话结论（具体、可读）",
+  "issues": [
+    {{"title": "风险点标题（如果只是表达风格，请写：表达优化点）", "evidence": "原文中触发点短语（必须来自原文，尽量 3-12 字）", "why": "原因（高校语境）", "rewrite_tip": "怎么改（具体）"}}
+  ]
+}}
+
+【强制规则】
+1) 如果 risk_gate.is_substantive=false：risk_level 必须是 LOW，risk_score 必须 <= 25，issues 最多 1 条且必须是“表达优化点”
+2) issues.evidence 必须能在原文中直接找到
+"""
+
+EMOTION_INSTRUCTIONS = """
+预测通知发布后，目标受众中不同学生群体的情绪反应。场景、受众画像和原文在最后的输入部分。
+
+【你必须输出的 JSON 结构】字段名必须一致：
+{
+  "student_emotions": [
+    {"group": "学生群体名称", "sentiment": "主要情绪（焦虑/抵触/困惑/担忧/紧张/轻松/无明显）", "intensity": 0到1的小数, "sample_comment": "一句典型评论（口语化）"}
+  ]
+}
+
+【强制规则】
+1) 2-4 个群体，intensity 必须在 0~1
+2) 只写情绪预测，不要改写原文
+"""
+
+REWRITE_INSTRUCTIONS = {
+    name: f"""
+把通知改写成「{name}」版本：{style}。含义必须一致，但表达要明显不同。场景、受众画像和原文在最后的输入部分。
+
+【你必须输出的 JSON 结构】字段名必须一致：
+{{"name": "{name}", "pred_risk_score": 0-100整数, "text": "改写后的完整文本", "why": "1-2句话说明为何更稳"}}
+"""
+    for name, style in REWRITE_STYLES.items()
+}
+
+def build_decomposed_prompts(text: str, scenario: str, profile: dict, with_emotions: bool = True) -> dict[str, str]:
+    """
+    拆成几个小请求的 user prompt：{"score": ..., "emotions": ..., "rewrite:更清晰": ...}
+    每个请求只要求输出自己那一块，生成长度短，彼此可以并发。
+    """
+    ctx = _context_block(text, scenario, profile)
+    prompts = {"score": _with_inputs(SCORE_INSTRUCTIONS, ctx)}
+    if with_emotions:
+        prompts["emotions"] = _with_inputs(EMOTION_INSTRUCTIONS, ctx)
+    for name, instructions in REWRITE_INSTRUCTIONS.items():
+        prompts[f"rewrite:{name}"] = _with_inputs(instructions, ctx)
+    return prompts
+
+def _analyze_lite(text: str, scenario: str, profile: dict):
+    """只发评分+风险点那一个小请求；情绪、改写留空（页面补占位）"""
+    with span("risk_gate"):
+        gate = risk_gate(text)
+    with span("build_prompts"):
+        prompt = build_decomposed_prompts(text, scenario, profile, with_emotions=False)["score"]
+    try:
+        parsed = parse_structured(call_deepseek(SYSTEM_PROMPT, prompt, schema="score"), "score")
+        if parsed is None:
+            return local_fallback(text, "parse_error")
+        parsed["student_emotions"] = []
+        parsed["rewrites"] = []
+        parsed["lite"] = True
+        return postprocess(parsed, text, gate)
+    except UpstreamBusyError:
+        raise
+    except Exception:
+        return local_fallback(text, "exception")
+
+def _analyze_decomposed(text: str, scenario: str, profile: dict):
+    """
+    评分+风险点、情绪、三种改写分别请求并发执行，合并成与 single 模式同样的结构再走 postprocess。
+    门槛未触发时情绪最终会被清空，干脆不发这个请求。
+    评分请求失败 → 整体兜底；情绪/某个改写失败 → 该部分留空（页面会补占位）。
+    评分请求因限流没发出去 → 原样抛出 UpstreamBusyError。
+    """
+    with span("risk_gate"):
+        gate = risk_gate(text)
+    with span("build_prompts"):
+        prompts = build_decomposed_prompts(text, scenario, profile, with_emotions=gate["is_substantive"])
+
+    def run(part: str):
+        schema = part.split(":", 1)[0]   # score / emotions / rewrite
+        return parse_structured(call_deepseek(SYSTEM_PROMPT, prompts[part], schema=schema), schema)
+
+    with ThreadPoolExecutor(max_workers=len(prompts)) as pool:
+        # 各子请求的 span 记进调用方的 trace
+        futs = {part: pool.submit(contextvars.copy_context().run, run, part) for part in prompts}
+    parts = {}
+    for part, fut in futs.items():
+        try:
+            parts[part] = fut.result()
+        except UpstreamBusyError:
+            if part == "score":
+                raise
+            parts[part] = None
+        except Exception:
+            parts[part] = None
+
+    merged = parts.get("score")
+    if merged is None:
+        return local_fallback(text, "score_part_failed")
+    emo = parts.get("emotions") or {}
+    merged["student_emotions"] = emo.get("student_emotions", []) or []
+    rewrites = []
+    for name in REWRITE_STYLES:
+        rw = parts.get(f"rewrite:{name}")
+        if rw is not None:
+            rw["name"] = name
+            rewrites.append(rw)
+    merged["rewrites"] = rewrites
+    try:
+        return postprocess(merged, text, gate)
+    except Exception:
+        return local_fallback(text, "postprocess_error")
+
+def postprocess(parsed: dict, text: str, gate: dict) -> dict:
+    """
+    业务规则修复 + Risk Gate 强制降敏（原地修改并返回 parsed）。
+    字段类型 / 范围 / 枚举已经在 parse_structured 里按 schema 修过，这里只管跨字段的规则。
+    强制降敏之前模型自己的结论另存在 model_verdict={risk_level, risk_score, is_substantive}：
+    门槛判为非实质风险时强制后的等级一律是 LOW，预评分的训练标注要用模型自己的判断（见 log_label）。
+    """
+    with span("fixup"):
+        _fix_rewrites_and_issues(parsed, text)
+    parsed["model_verdict"] = {
+        "risk_level": parsed["risk_level"],
+        "risk_score": int(parsed.get("risk_score") or 0),
+        "is_substantive": (parsed.get("risk_gate") or {}).get("is_substantive"),   # 长文的块不给门槛，是 None
+    }
+    with span("gate_enforce"):
+        _enforce_gate(parsed, gate)
+    return parsed
+
+def level_for_score(score: int) -> str:
+    return "HIGH" if score >= 70 else "MEDIUM" if score >= 40 else "LOW"
+
+def _fix_rewrites_and_issues(parsed: dict, text: str):
+    # ---------- rewrites：按 更清晰 / 更安抚 / 更可执行 排好；名字重复或不认识的按顺序补到空缺上 ----------
+    buckets = dict.fromkeys(REWRITE_STYLES)
+    spare = []
+    for rw in parsed.get("rewrites") or []:
+        n = rw.get("name") or ""
+        if n in buckets and buckets[n] is None:
+            buckets[n] = rw
+        else:
+            spare.append(rw)
+    for n in buckets:
+        if buckets[n] is None and spare:
+            buckets[n] = spare.pop(0)
+            buckets[n]["name"] = n
+    parsed["rewrites"] = [rw for rw in buckets.values() if rw is not None]
+    parsed["issues"] = normalize_issues(parsed.get("issues") or [], text)
+    # 等级不在枚举里（schema 校验时已清空）：按分数补
+    if parsed.get("risk_level") not in LEVEL_RANK:
+        parsed["risk_level"] = level_for_score(int(parsed.get("risk_score") or 0))
+
+def _enforce_gate(parsed: dict, gate: dict):
+    # ---------- 硬规则后处理：Risk Gate 强制降敏 ----------
+    # 以本地 gate 为准（避免模型误判）
+    parsed.setdefault("risk_gate", {})
+    parsed["risk_gate"]["type"] = gate["type"]
+    parsed["risk_gate"]["is_substantive"] = gate["is_substantive"]
+    parsed["risk_gate"]["reason"] = gate["reason"]
+
+    if not gate["is_substantive"]:
+        # 强制 LOW
+        parsed["risk_level"] = "LOW"
+        parsed["risk_score"] = min(int(parsed.get("risk_score", 15) or 15), 25)
+        # 不渲染情绪/传播链
+        parsed["student_emotions"] = []
+        # issues 只保留最多 1 条表达优化
+        issues = parsed.get("issues", []) or []
+        if issues:
+            issues = issues[:1]
+            issues[0]["title"] = "表达优化点"
+        parsed["issues"] = issues
+        # summary 更克制
+        parsed["summary"] = parsed.get("summary") or "未检测到实质舆情风险（偏事务型/日常沟通）。如需可做轻量表达优化。"
+
+def _analyze_uncached(text: str, scenario: str, profile: dict):
+    with span("risk_gate"):
+        gate = risk_gate(text)
+    with span("build_prompts"):
+        system_prompt, user_prompt = build_prompts(text, scenario, profile)
+
+    try:
+        content = call_deepseek(system_prompt, user_prompt, schema="analysis")
+        # content = call_gpt(system_prompt, user_prompt)
+        parsed = parse_structured(content, "analysis")
+        if parsed is None:
+            return local_fallback(text, "parse_error")
+        return postprocess(parsed, text, gate)
+    except UpstreamBusyError:
+        raise
+    except Exception:
+        return local_fallback(text, "exception")
+
+def analyze_stream(text: str, scenario: str, profile: dict, bypass_cache: bool = False):
+    """
+    流式版 analyze()，逐步产出 (view, arrived, done)：
+      - arrived：模型输出里已经完整到达的顶层字段名
+      - view：当前可展示的结果，已按 postprocess 同样的口径修正；
+              还没到达的字段可能是占位值，展示前先看 arrived
+      - done=True：view 就是最终结果，与 analyze() 的返回值一致（同样写缓存 / 兜底）
+    """
+    cache = get_cache()
+    key = None
+    if cache is not None:
+        key = make_key(text, scenario, profile, MODEL, _cache_version("single"))
+        if not bypass_cache:
+            with span("cache_get"):
+                hit = cache.get(key)
+            if hit is not None:
+                hit["cached"] = True
+                REGISTRY.inc("qxz_analyze_total", mode="stream", outcome="cached")
+                yield hit, set(hit.keys()), True
+                return
+    if not bypass_cache:
+        pre = prescore_result(text, scenario)
+        if pre is not None:
+            REGISTRY.inc("qxz_analyze_total", mode="stream", outcome="prescored")
+            yield pre, set(pre.keys()), True
+            return
+
+    if USAGE.decision({**current_labels(), "scenario": scenario})[0] or is_long_document(text):
+        # 预算超出 / 长文：不走流式，交给 analyze() 按同样的规则降级或切块
+        result = analyze(text, scenario, profile, bypass_cache=bypass_cache, mode="single")
+        yield result, set(result.keys()), True
+        return
+
+    flight = fkey = None
+    if COALESCE_ENABLED:
+        fkey = _flight_key(text, scenario, profile, "single", bypass_cache)
+        while True:
+            flight, leader = FLIGHTS.claim(fkey)
+            if leader:
+                break
+            # 同样的分析已经在跑（流式或非流式都算）：不再逐字段展示，等它的最终结果
+            try:
+                result = FLIGHTS.wait(flight)
+            except FlightAbandoned:
+                continue
+            result["coalesced"] = True
+            REGISTRY.inc("qxz_coalesced_total", mode="stream")
+            yield result, set(result.keys()), True
+            return
+
+    try:
+        result = yield from _stream_uncached(text, scenario, profile)
+        if cache is not None and not result.get("fallback"):
+            with span("cache_put"):
+                cache.put(key, result)
+        log_label(text, scenario, "single", result)
+        if flight is not None:
+            FLIGHTS.resolve(fkey, flight, result=copy.deepcopy(result))
+    except UpstreamBusyError as e:
+        if flight is not None:
+            FLIGHTS.resolve(fkey, flight, exc=e)
+        raise
+    finally:
+        if flight is not None and not flight.done():
+            FLIGHTS.abandon(fkey, flight)   # 页面重跑 / 生成器中途被关闭
+    REGISTRY.inc("qxz_analyze_total", mode="stream", outcome="fallback" if result.get("fallback") else "ok")
+    yield result, set(result.keys()), True
+
+def _stream_uncached(text: str, scenario: str, profile: dict):
+    """analyze_stream 真正调模型的部分：产出中间的 (view, arrived, False)，返回最终结果"""
+    labels = {**current_labels(), "scenario": scenario, "mode": "single"}
+    with span("risk_gate"):
+        gate = risk_gate(text)
+    with span("build_prompts"):
+        system_prompt, user_prompt = build_prompts(text, scenario, profile)
+    try:
+        # 容错解析器边收边扫，每段只扫一遍：中间结果和最终结果都从它来
+        repair = JSONRepairParser()
+        for piece in call_deepseek_stream(system_prompt, user_prompt, labels=labels, schema="analysis"):
+            n = repair.progress
+            repair.feed(piece)
+            if repair.progress == n:
+                continue
+            snap, arrived = repair.snapshot()
+            try:
+                # 中间结果也过一遍校验（不计违规：没到的字段本来就缺）
+                view, _ = VALIDATORS["analysis"](snap)
+                view = postprocess(view, text, gate)
+            except Exception:
+                continue  # 半截结果修不动就等下一个字段，最终结果不受影响
+            yield view, arrived, False
+
+        # 最终结果：这里只收尾（截断、尾逗号等照样能修）
+        parsed = parse_structured(repair, "analysis")
+        return local_fallback(text, "parse_error") if parsed is None else postprocess(parsed, text, gate)
+    except UpstreamBusyError:
+        raise
+    except Exception:
+        return local_fallback(text, "exception")
+
+# =========================
+# 长文模式（long）：按章/条切块并发分析（map），再归并成一份结果（reduce）
+# =========================
+CHUNK_INSTRUCTIONS = f"""
+下面给出一篇长文（管理办法/实施细则等）中的一部分，位置、所在章节、场景、受众画像和这一部分的原文在最后的输入部分。
+只分析这一部分的风险点与学生情绪，不要推测其它部分的内容。
+
+{GATE_RULES}
+
+【你必须输出的 JSON 结构】字段名必须一致：
+{{
+  "risk_score": 0-100的整数（只针对这一部分）,
+  "risk_level": "LOW"|"MEDIUM"|"HIGH",
+  "summary": "一句话结论（具体、可读）",
+  "issues": [
+    {{"title": "风险点标题（如果只是表达风格，请写：表达优化点）", "evidence": "原文中触发点短语（必须来自这一部分，尽量 3-12 字）", "why": "原因（高校语境）", "rewrite_tip": "怎么改（具体）"}}
+  ],
+  "student_emotions": [
+    {{"group": "学生群体名称", "sentiment": "主要情绪（焦虑/抵触/困惑/担忧/紧张/轻松/无明显）", "intensity": 0到1的小数, "sample_comment": "一句典型评论（口语化）"}}
+  ]
+}}
+
+【强制规则】
+1) issues.evidence 必须能在这一部分中直接找到
+2) 这一部分没有实质风险时 risk_score <= 25，student_emotions 可以为空数组
+"""
+
+def build_chunk_prompt(chunk: Chunk, index: int, total: int, scenario: str, profile: dict) -> str:
+    return _with_inputs(
+        CHUNK_INSTRUCTIONS,
+        f"【位置】第 {index + 1}/{total} 部分，所在章节：{chunk.heading}",
+        _context_block(chunk.text, scenario, profile),
+    )
+
+LEVEL_RANK = {"LOW": 0, "MEDIUM": 1, "HIGH": 2}
+
+def reduce_chunk_results(text: str, chunks: list[Chunk], parts: list[dict | None]) -> dict:
+    """
+    把各块的结果归并成一份（结构与 single 模式相同，再走 postprocess）。归并规则：
+    - issues：证据在所在块内定位，加上块起点得到全文偏移 offset；按 offset 排序，
+      证据文字相同或区间重叠的只留最先出现的一条。
+      证据在原文里找不到（模型转述了原文）的，offset 记块起点、不参与区间去重，
+      只按证据 / 标题文字去重，排在定位到的之后
+    - risk_score：取各块最高分（一条严重条款就足以引发争议）；另有 k 个块 >= 50 分时加 2*(k-1)，最多 +10，封顶 100
+    - risk_level：各块中最高的等级
+    - student_emotions：按群体名合并，强度取最大（情绪和样例评论跟着强度最大的那条走），按强度取前 4 个
+    - summary：最高分那一块的结论，前面注明所在章节
+    parts 是按 chunk schema 校验过的结果（见 parse_structured），失败的块（None）不参与归并。
+    """
+    located, unlocated, scores, emotions = [], [], [], {}
+    top, level = None, "LOW"
+    for chunk, part in zip(chunks, parts):
+        if part is None:
+            continue
+        # 各块已按 chunk schema 校验过：字段齐全、类型和范围都对
+        score = part["risk_score"]
+        scores.append(score)
+        if top is None or score > top[0]:
+            top = (score, chunk, part)
+        lv = part["risk_level"] or level_for_score(score)
+        if LEVEL_RANK[lv] > LEVEL_RANK[level]:
+            level = lv
+
+        for it in normalize_issues(part["issues"], chunk.text):
+            ev = it["evidence"] = it["evidence"].strip()
+            pos = chunk.text.find(ev.rstrip("…")) if ev else -1
+            it["offset"] = chunk.start + max(pos, 0)
+            (located if pos >= 0 else unlocated).append(it)
+
+        for emo in part["student_emotions"]:
+            group = (emo["group"] or emo["sentiment"]).strip()
+            if not group:
+                continue
+            if group not in emotions or emo["intensity"] > emotions[group]["intensity"]:
+                emotions[group] = emo
+
+    deduped, seen, titles, last_end = [], set(), set(), -1
+    for it in sorted(located, key=lambda it: it["offset"]):
+        ev = it["evidence"]
+        if ev in seen or it["offset"] < last_end:
+            continue
+        seen.add(ev)
+        titles.add(it["title"])
+        last_end = it["offset"] + len(ev)
+        deduped.append(it)
+    # 没定位到的没有可信的区间，按块顺序排在后面，只按文字去重
+    for it in unlocated:
+        if it["evidence"] in seen or it["title"] in titles:
+            continue
+        seen.add(it["evidence"])
+        titles.add(it["title"])
+        deduped.append(it)
+
+    hot = sum(1 for s in scores if s >= 50)
+    score = min(100, max(scores, default=0) + min(10, 2 * max(0, hot - 1)))
+    summary = ""
+    if top is not None:
+        summary = f"（{top[1].heading}）{top[2].get('summary') or ''}".strip()
+    return {
+        "risk_score": score,
+        "risk_level": level,
+        "summary": summary,
+        "issues": deduped,
+        "student_emotions": sorted(emotions.values(), key=lambda e: -e["intensity"])[:4],
+        "rewrites": [],
+        "_top_chunk": top[1] if top is not None else None,
+    }
+
+def _analyze_long(text: str, scenario: str, profile: dict):
+    """
+    map：每块一个请求（并发数 LONG_MAX_WORKERS，块数不超过 LONG_MAX_CHUNKS）；
+    reduce：reduce_chunk_results；改写只针对风险最高的那一块（全文改写对长文既慢又不实用）。
+    超过一半的块失败 → 整体兜底；限流排队失败原样抛出。
+    """
+    with span("risk_gate"):
+        gate = risk_gate(text)
+    with span("chunk"):
+        chunks = split_chunks(text, LONG_CHUNK_CHARS, LONG_MAX_CHUNKS)
+    if len(chunks) <= 1:
+        return _analyze_uncached(text, scenario, profile)
+
+    def run(i: int):
+        prompt = build_chunk_prompt(chunks[i], i, len(chunks), scenario, profile)
+        return parse_structured(call_deepseek(SYSTEM_PROMPT, prompt, schema="chunk"), "chunk")
+
+    with ThreadPoolExecutor(max_workers=max(1, min(len(chunks), LONG_MAX_WORKERS))) as pool:
+        futs = [pool.submit(contextvars.copy_context().run, run, i) for i in range(len(chunks))]
+    parts = []
+    for fut in futs:
+        try:
+            parts.append(fut.result())
+        except UpstreamBusyError:
+            raise
+        except Exception:
+            parts.append(None)
+    failed = sum(1 for p in parts if p is None)
+    if failed * 2 > len(parts):
+        return local_fallback(text, "chunks_failed")
+
+    with span("reduce"):
+        merged = reduce_chunk_results(text, chunks, parts)
+    top = merged.pop("_top_chunk")
+    if top is not None and gate["is_substantive"]:
+        merged["rewrites"] = _rewrite_chunk(top, scenario, profile)
+    scope = top.heading if merged["rewrites"] else ""
+    try:
+        result = postprocess(merged, text, gate)
+    except Exception:
+        return local_fallback(text, "postprocess_error")
+    result["long_doc"] = {"chunks": len(chunks), "failed": failed, "rewrite_scope": scope}
+    return result
+
+def _rewrite_chunk(chunk: Chunk, scenario: str, profile: dict) -> list[dict]:
+    """对一块并发请求三种改写；失败的留空（postprocess / 页面补占位）"""
+    prompts = {
+        k: v for k, v in build_decomposed_prompts(chunk.text, scenario, profile, with_emotions=False).items()
+        if k.startswith("rewrite:")
+    }
+
+    def run(part: str):
+        return parse_structured(call_deepseek(SYSTEM_PROMPT, prompts[part], schema="rewrite"), "rewrite")
+
+    with ThreadPoolExecutor(max_workers=len(prompts)) as pool:
+        futs = {part: pool.submit(contextvars.copy_context().run, run, part) for part in prompts}
+    rewrites = []
+    for part, fut in futs.items():
+        try:
+            rw = fut.result()
+        except Exception:
+            rw = None
+        if rw is not None:
+            rw["name"] = part.split(":", 1)[1]
+            rewrites.append(rw)
+    return rewrites
+
+# =========================
+# 段落级增量分析：改一句只重新分析改动的段落
+# =========================
+PARAGRAPH_INSTRUCTIONS = f"""
+下面给出一篇通知中的【一个段落】（在最后的输入部分）。只找这一段里的风险点，不要评价全文。
+
+{GATE_RULES}
+
+【你必须输出的 JSON 结构】字段名必须一致：
+{{
+  "issues": [
+    {{"title": "风险点标题（如果只是表达风格，请写：表达优化点）", "evidence": "原文中触发点短语（必须来自这一段，尽量 3-12 字）", "why": "原因（高校语境）", "rewrite_tip": "怎么改（具体）"}}
+  ]
+}}
+
+【强制规则】
+1) 这一段没有值得指出的问题就输出 {{"issues": []}}
+2) issues.evidence 必须能在这一段中直接找到
+"""
+
+def build_paragraph_prompt(paragraph: str, scenario: str, profile: dict) -> str:
+    return _with_inputs(PARAGRAPH_INSTRUCTIONS, _context_block(paragraph, scenario, profile))
+
+def _rescore_instructions(with_emotions: bool) -> str:
+    emotions = """,
+  "student_emotions": [
+    {"group": "学生群体名称", "sentiment": "主要情绪（焦虑/抵触/困惑/担忧/紧张/轻松/无明显）", "intensity": 0到1的小数, "sample_comment": "一句典型评论（口语化）"}
+  ]""" if with_emotions else ""
+    return f"""
+一篇通知刚改动了几段，请根据最后输入部分给出的门槛结论、全文风险点和本次改动的段落，重新给出整体风险评分。
+
+{GATE_RULES}
+
+【你必须输出的 JSON 结构】字段名必须一致：
+{{
+  "risk_gate": {{"type": "事务型|政策制度型|纪律处分型|资源分配型|其他", "is_substantive": true/false, "reason": "一句话解释门槛判断"}},
+  "risk_score": 0-100的整数,
+  "risk_level": "LOW"|"MEDIUM"|"HIGH",
+  "summary": "一句话结论（具体、可读）"{emotions}
+}}
+
+【强制规则】
+1) 如果实质风险触发为“否”：risk_level 必须是 LOW，risk_score 必须 <= 25
+2) 评分要与全文风险点的严重程度一致
+"""
+
+RESCORE_INSTRUCTIONS = {w: _rescore_instructions(w) for w in (True, False)}
+
+def build_rescore_prompt(scenario: str, profile: dict, gate: dict, issues: list, changed: list[str],
+                         with_emotions: bool) -> str:
+    """整体重估：不发全文，只给门槛结论、全部风险点和本次改动的段落"""
+    brief = [{k: it.get(k) for k in ("title", "evidence", "why")} for it in issues]
+    changed_block = "\n".join(f"- {p}" for p in changed)
+    return _with_inputs(
+        RESCORE_INSTRUCTIONS[with_emotions],
+        _audience_block(scenario, profile),
+        f"【规则门槛（本地判断）】类型：{gate['type']}；实质风险触发：{'是' if gate['is_substantive'] else '否'}",
+        f"【全文风险点】\n{json.dumps(brief, ensure_ascii=False)}",
+        f"【本次改动的段落】\n{changed_block}",
+    )
+
+def incremental_plan(text: str, scenario: str, profile: dict, previous: dict | None) -> IncrementalPlan | None:
+    """
+    previous：上一次的 {"text", "scenario", "profile", "result"}（页面的 last_inputs + result）。
+    能走增量时返回差分计划，否则返回 None（调用方走 analyze()）：
+    没有上一版、场景/画像变了、上一版是兜底/精简/本地预评分结果、文本没变、改动太多、预算已经在降级。
+    兜底和预评分的改写是固定模板，不能当作模型写的沿用下去，所以这两种上一版都按没有上一版处理。
+    """
+    prev_result = (previous or {}).get("result")
+    if not prev_result or any(prev_result.get(k) for k in ("fallback", "prescored", "lite", "budget_degraded")):
+        return None
+    if previous.get("scenario") != scenario or previous.get("profile") != profile:
+        return None
+    with span("para_diff"):
+        plan = plan_incremental(previous.get("text", ""), prev_result.get("issues") or [], text)
+    if not plan.changed or plan.ratio > INCREMENTAL_MAX_RATIO:
+        return None
+    if USAGE.decision({**current_labels(), "scenario": scenario})[0]:
+        return None
+    return plan
+
+def analyze_incremental(text: str, scenario: str, profile: dict, previous: dict | None, mode: str | None = None,
+                        plan: IncrementalPlan | None = None):
+    """
+    段落级增量版 analyze()：只把改动的段落发给模型找风险点（按段缓存），再用一个小请求重估整体评分。
+    不满足增量条件（见 incremental_plan）或增量过程中出错时，退回 analyze(text, ..., mode=mode)。
+    结果带 incremental={paragraphs, changed, carried_issues, new_issues}；
+    改写沿用上一版（rewrites_stale=True），需要最新改写就整篇重新预测。
+    """
+    plan = plan or incremental_plan(text, scenario, profile, previous)
+    if plan is None:
+        REGISTRY.inc("qxz_incremental_total", path="full")
+        return analyze(text, scenario, profile, mode=mode)
+    with span("total"), usage_labels(scenario=scenario, mode="incremental"):
+        result = _analyze_incremental(text, scenario, profile, previous["result"], plan)
+    if result is None:
+        REGISTRY.inc("qxz_incremental_total", path="error")
+        return analyze(text, scenario, profile, mode=mode)
+    REGISTRY.inc("qxz_incremental_total", path="incremental")
+    REGISTRY.inc("qxz_analyze_total", mode="incremental", outcome="ok")
+    return result
+
+def _paragraph_issues(paragraph: str, scenario: str, profile: dict) -> list[dict]:
+    """一段的风险点；结果缓存按段落文本记，改回原样的段落直接命中"""
+    cache = get_cache()
+    key = make_key(paragraph, scenario, profile, MODEL, f"{PROMPT_VERSION}/para")
+    if cache is not None:
+        hit = _cache_lookup(cache, key)
+        if hit is not None:
+            return hit["issues"]
+    prompt = build_paragraph_prompt(paragraph, scenario, profile)
+    parsed = parse_structured(call_deepseek(SYSTEM_PROMPT, prompt, schema="paragraph"), "paragraph")
+    if parsed is None:
+        raise ValueError("段落结果解析失败")
+    # 证据不在这一段里的丢掉，免得张冠李戴
+    issues = [it for it in parsed["issues"] if it["evidence"].strip() and it["evidence"].strip() in paragraph]
+    if cache is not None:
+        with span("cache_put"):
+            cache.put(key, {"issues": issues})
+    return issues
+
+def _analyze_incremental(text: str, scenario: str, profile: dict, prev_result: dict, plan: IncrementalPlan):
+    """出错返回 None（限流排队失败照常抛出）"""
+    with span("risk_gate"):
+        gate = risk_gate_paragraphs(plan.paragraphs)
+    changed = [p for _, p in plan.changed]
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(len(changed), INCREMENTAL_MAX_WORKERS))) as pool:
+            futs = [pool.submit(contextvars.copy_context().run, _paragraph_issues, p, scenario, profile)
+                    for p in changed]
+        new_issues = [it for fut in futs for it in fut.result()]
+
+        # 风险点按在新文本里出现的位置排序
+        issues = plan.carried + new_issues
+        issues.sort(key=lambda it: (text.find((it.get("evidence") or "").rstrip("…")) % (len(text) + 1)))
+
+        with span("build_prompts"):
+            prompt = build_rescore_prompt(scenario, profile, gate, issues, changed, gate["is_substantive"])
+        parsed = parse_structured(call_deepseek(SYSTEM_PROMPT, prompt, schema="rescore"), "rescore")
+        if parsed is None:
+            return None
+        parsed["issues"] = issues
+        if not parsed.get("student_emotions"):
+            parsed["student_emotions"] = copy.deepcopy(prev_result.get("student_emotions") or [])
+        parsed["rewrites"] = copy.deepcopy(prev_result.get("rewrites") or [])
+        result = postprocess(parsed, text, gate)
+        result.pop("model_verdict", None)   # 重估的提示词里带了本地门槛结论，不是模型独立的判断
+    except UpstreamBusyError:
+        raise
+    except Exception:
+        return None
+    result["rewrites_stale"] = True
+    result["incremental"] = {
+        "paragraphs": len(plan.paragraphs),
+        "changed": len(changed),
+        "carried_issues": len(plan.carried),
+        "new_issues": len(new_issues),
+    }
+    return result
+
+# =========================
+# 受众矩阵：同一篇通知 × 多个受众画像
+# =========================
+def profile_matrix(grades: list, roles: list, sensitivities: list, gender: str = "不指定", custom: str = "") -> list[dict]:
+    """年级 × 身份 × 敏感度 的笛卡尔积，顺序稳定（先年级、再身份、再敏感度）"""
+    return [
+        {"grade": g, "role": r, "gender": gender, "sensitivity": s, "custom": custom}
+        for g, r, s in itertools.product(grades, roles, sensitivities)
+    ]
+
+def analyze_matrix(text: str, scenario: str, profiles: list[dict], max_workers: int = 4, bypass_cache: bool = False,
+                   mode: str | None = None):
+    """
+    对多个画像并发跑 analyze()，按完成顺序产出 (index, profile, result)。
+    并发数有上限，连接池与结果缓存都和单次分析共用：已经分析过的画像直接命中缓存。
+    各格子的提示只有最后的画像不同（见 _context_block），说明 + 场景 + 原文走服务方的前缀缓存；
+    实测见 benchmarks/loadtest.py --matrix。
+    """
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        # copy_context：会话标签（用量记账）和 trace 跟着进线程池
+        futs = {
+            pool.submit(contextvars.copy_context().run, analyze, text, scenario, p, bypass_cache, mode): (i, p)
+            for i, p in enumerate(profiles)
+        }
+        for fut in as_completed(futs):
+            i, p = futs[fut]
+            yield i, p, fut.result()
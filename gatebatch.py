@@ -0,0 +1,224 @@
+"""
+门槛判断（risk_gate）的批量向量化版本：历史通知归档一次过十几万条，不调模型、不逐条循环
+
+    frame = gate_frame(df["text"])       # Series / DataFrame（取 text 列）/ 字符串列表 → DataFrame，索引与输入一致
+    for part in iter_gate_file(Path("archive.jsonl"), chunksize=50_000):   # 分块读盘，内存里只有一块
+        ...
+    python gatebatch.py archive.jsonl -o gates.csv --chunksize 50000
+
+输出列与 risk_gate 同口径：is_substantive / reason / type / transactional，
+另有各类别是否命中（has_negative / has_fairness / …）和事务型命中词数 transactional_hits。
+
+做法：用 C 实现的正则按列扫，代替 KeywordAutomaton 逐字的 Python 循环。
+- 只看有没有命中的类别：每类的词拼一个正则，str.contains 命中即停；先用全部词的并集筛掉一个词都没命中的行
+- 事务型要的是去重命中词数：词按长度从长到短拼一个正则，str.findall 扫一遍。findall 的命中互不重叠，
+  而 risk_gate 是“子串出现就算”，用两张静态表补齐：
+  - 命中词里包含的其它门槛词（“领取地点”里的“领取”“地点”）一并算上
+  - 可能和前一个命中部分重叠而被跳过的词（“携带好”：命中“携带”后“带好”被跳过），
+    只在命中了对应前一个词的行里再用 in 判断一次
+每行的命中词集合因此和 KeywordAutomaton.scan 完全一致，结论逐行相同（benchmarks/bench_gate.py 校验）。
+"""
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import core
+
+FLAG_COLUMNS = [f"has_{c}" for c in core.GATE_LEXICONS]
+COLUMNS = ["is_substantive", "reason", "type", "transactional", "transactional_hits", *FLAG_COLUMNS]
+
+
+class GateLexicon:
+    """
+    门槛词库的批量匹配表（构建一次，反复使用）。
+    只要判断有没有命中的类别各拼一个正则，用 str.contains（命中即停）；
+    counted 里的类别要的是去重命中词数，拼一个正则用 str.findall 扫全文，再按两张静态表补齐。
+    """
+
+    def __init__(self, lexicons: dict[str, list[str]], counted=("transactional",)):
+        self.categories = list(lexicons)
+        cat_words = {c: _clean(ws) for c, ws in lexicons.items()}
+        self.counted = [c for c in self.categories if c in counted]
+        self.patterns = {c: _alternation(ws) for c, ws in cat_words.items() if c not in self.counted}
+        self.any_pattern = _alternation(set().union(*(cat_words[c] for c in self.patterns))) if self.patterns else ""
+
+        words = sorted(set().union(*(cat_words[c] for c in self.counted)), key=lambda w: (-len(w), w))
+        self.words = words
+        self.count_pattern = _alternation(words)
+        self.word_index = {w: i for i, w in enumerate(words)}
+        # 命中词 m 里包含的全部词（含自身）：contains[m, w]
+        self.contains = np.array([[w in m for w in words] for m in words], dtype=np.uint8)
+        # 命中词 → 开头和它结尾重叠、因而可能被跳过的词（只在命中了它的行里补查）
+        self.overlapping = {}
+        for i, m in enumerate(words):
+            ws = [j for j, w in enumerate(words) if w not in m and any(m.endswith(w[:k]) for k in range(1, len(w)))]
+            if ws:
+                self.overlapping[i] = ws
+        self.membership = {c: np.array([w in cat_words[c] for w in words], dtype=np.int64) for c in self.counted}
+
+    def hit_matrix(self, texts: pd.Series) -> np.ndarray:
+        """行 × 词的命中矩阵（counted 类别的词），与 KeywordAutomaton.scan 的“子串出现就算”一致"""
+        n = len(texts)
+        hits = np.zeros((n, len(self.words)), dtype=bool)
+        if not self.words or not n:
+            return hits
+        found = texts.str.findall(self.count_pattern).to_numpy(dtype=object)
+        lens = np.fromiter(map(len, found), dtype=np.int64, count=n)
+        index = self.word_index
+        ids = np.fromiter((index[w] for ws in found for w in ws), dtype=np.int64, count=int(lens.sum()))
+        hits[np.repeat(np.arange(n), lens), ids] = True
+
+        arr = texts.to_numpy(dtype=object)
+        for i, ws in self.overlapping.items():
+            rows = np.flatnonzero(hits[:, i])
+            for j in ws:
+                w = self.words[j]
+                hits[rows, j] |= np.fromiter((w in arr[r] for r in rows), dtype=bool, count=len(rows))
+        return (hits.astype(np.uint8) @ self.contains) > 0
+
+    def counts(self, texts: pd.Series) -> dict[str, np.ndarray]:
+        """{类别: 每行命中的去重词数}；只判断有无的类别给 0 / 1"""
+        out = {}
+        n = len(texts)
+        if self.patterns:
+            # 先用全部词的并集筛一遍，没有任何命中的行不再逐类别扫
+            any_hit = texts.str.contains(self.any_pattern).to_numpy(dtype=bool)
+            sub = texts[any_hit]
+            for c, pat in self.patterns.items():
+                flag = np.zeros(n, dtype=np.int64)
+                if len(sub):
+                    flag[any_hit] = sub.str.contains(pat).to_numpy(dtype=bool)
+                out[c] = flag
+        if self.counted:
+            hits = self.hit_matrix(texts).astype(np.int64)
+            for c in self.counted:
+                out[c] = hits @ self.membership[c]
+        return {c: out[c] for c in self.categories}
+
+
+def _clean(words) -> set[str]:
+    return {w.strip() for w in words if w and w.strip()}
+
+
+def _alternation(words) -> str:
+    """长词在前：同一位置按顺序试，取到的是该位置最长的词；空词库给一个永不命中的正则"""
+    words = sorted(words, key=lambda w: (-len(w), w))
+    return "|".join(map(re.escape, words)) if words else "(?!)"
+
+
+GATE_LEXICON = GateLexicon(core.GATE_LEXICONS)
+
+
+def _as_texts(texts, text_column: str) -> tuple[pd.Series, pd.Index]:
+    """统一成 object 列（Python 正则比 Arrow 字符串来回转换更快）、位置索引；空值当空文本，其它类型转成字符串"""
+    if isinstance(texts, pd.DataFrame):
+        texts = texts[text_column]
+    if not isinstance(texts, pd.Series):
+        texts = pd.Series(list(texts), dtype=object)
+    arr = texts.to_numpy(dtype=object, na_value="")
+    if not all(isinstance(t, str) for t in arr):
+        arr = np.array([t if isinstance(t, str) else str(t) for t in arr], dtype=object)
+    return pd.Series(arr, dtype=object), texts.index
+
+
+def gate_frame(texts, text_column: str = "text", lexicon: GateLexicon = GATE_LEXICON) -> pd.DataFrame:
+    """
+    批量 risk_gate：每行一个结论，列见 COLUMNS，索引与输入一致。
+    空值按空文本处理；非字符串先转成字符串。
+    """
+    series, index = _as_texts(texts, text_column)
+    counts = lexicon.counts(series)
+    has = {c: n > 0 for c, n in counts.items()}
+
+    trans_hits = counts["transactional"]
+    transactional = (trans_hits >= 2) & ~has["negative"] & ~has["fairness"] & ~has["discipline"]
+    ntype = np.select(
+        [has["discipline"] | has["discipline_type"], has["fairness"], has["policy"], transactional],
+        ["纪律处分型", "资源分配型", "政策制度型", "事务型"],
+        default="其他",
+    )
+    is_substantive = has["negative"] | has["fairness"] | has["discipline"] | (has["policy"] & has["strong_constraint"])
+    reason = np.where(
+        is_substantive, core.GATE_REASON_SUBSTANTIVE,
+        np.where(transactional, core.GATE_REASON_TRANSACTIONAL, core.GATE_REASON_CLEAR),
+    )
+
+    out = pd.DataFrame({
+        "is_substantive": is_substantive,
+        "reason": reason,
+        "type": ntype,
+        "transactional": transactional,
+        "transactional_hits": trans_hits,
+        **{f"has_{c}": v for c, v in has.items()},
+    }, index=index)
+    return out[COLUMNS]
+
+
+# =========================
+# 分块读盘
+# =========================
+def read_chunks(path: Path, chunksize: int = 50_000):
+    """按块产出 DataFrame，不把整个文件读进内存；.csv 带表头，其它按 JSONL。索引是数据行号（从 0 起，跨块连续）"""
+    if path.suffix.lower() == ".csv":
+        return pd.read_csv(path, chunksize=chunksize, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+    return pd.read_json(path, lines=True, chunksize=chunksize, dtype=False)
+
+
+def iter_gate_file(path: Path, chunksize: int = 50_000, text_column: str = "text", keep=("id",)):
+    """逐块产出：keep 里输入文件有的列 + gate_frame 的列"""
+    for chunk in read_chunks(path, chunksize):
+        if text_column not in chunk.columns:
+            raise ValueError(f"输入里没有 {text_column} 列")
+        gate = gate_frame(chunk, text_column)
+        kept = [c for c in keep if c in chunk.columns and c != text_column]
+        yield pd.concat([chunk[kept], gate], axis=1).rename_axis("row")
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="批量跑门槛判断（JSONL/CSV → CSV/JSONL），不调模型")
+    ap.add_argument("input", type=Path, help="输入文件（.jsonl / .csv，需要 text 列）")
+    ap.add_argument("-o", "--output", type=Path, required=True, help="结果文件（.csv / .jsonl，覆盖写入）")
+    ap.add_argument("--chunksize", type=int, default=50_000, help="每块行数（默认 50000）")
+    ap.add_argument("--text-column", default="text", help="原文所在的列（默认 text）")
+    ap.add_argument("--keep", nargs="*", default=["id"], help="原样带到结果里的列（默认 id）")
+    args = ap.parse_args(argv)
+
+    if not args.input.exists():
+        print(f"找不到输入文件：{args.input}", file=sys.stderr)
+        return 2
+
+    as_csv = args.output.suffix.lower() == ".csv"
+    rows = substantive = 0
+    types: dict[str, int] = {}
+    t0 = time.perf_counter()
+    try:
+        with args.output.open("w", encoding="utf-8", newline="") as f:
+            for part in iter_gate_file(args.input, max(1, args.chunksize), args.text_column, args.keep):
+                if as_csv:
+                    part.to_csv(f, header=rows == 0)
+                elif len(part):
+                    f.write(part.reset_index().to_json(orient="records", lines=True, force_ascii=False).rstrip("\n") + "\n")
+                rows += len(part)
+                substantive += int(part["is_substantive"].sum())
+                for t, n in part["type"].value_counts().items():
+                    types[t] = types.get(t, 0) + int(n)
+                print(f"已处理 {rows} 行", file=sys.stderr)
+    except ValueError as e:
+        print(f"读取失败：{e}", file=sys.stderr)
+        return 2
+    wall = time.perf_counter() - t0
+    print(
+        f"完成：{rows} 行｜实质风险 {substantive}｜类型 {dict(sorted(types.items(), key=lambda kv: -kv[1]))}｜"
+        f"耗时 {wall:.2f}s｜吞吐 {rows / wall if wall else 0:.0f} 行/s",
+        file=sys.stderr,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
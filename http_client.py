@@ -0,0 +1,108 @@
+"""
+大模型调用共用的 HTTP 客户端
+
+- 一个进程一个 requests.Session，连接池复用 TCP+TLS（keep-alive），线程安全
+- 连接超时 / 读取超时分开配置：连不上很快失败，生成慢的长回答照样等得到
+- 429 / 5xx / 连接失败 按指数退避 + 抖动重试，服务端给了 Retry-After 就听它的；
+  重试也是一次上游请求，调用方通过 before_retry 给每次重试再拿一个限流许可
+- 读超时不重试：请求已经发出去了，重发只会再等一轮、再花一次 token
+"""
+import email.utils
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+def parse_retry_after(value) -> float | None:
+    """Retry-After 可以是秒数，也可以是 HTTP 日期"""
+    if not value:
+        return None
+    value = str(value).strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        dt = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, dt.timestamp() - time.time())
+
+
+class PooledHTTPClient:
+    def __init__(
+        self,
+        pool_size: int = 10,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 90.0,
+        max_retries: int = 2,
+        backoff: float = 0.5,
+        backoff_max: float = 8.0,
+    ):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.stats = {"requests": 0, "retries": 0, "failures": 0}
+        self._stats_lock = threading.Lock()
+
+        self.session = requests.Session()
+        # 重试自己做（要支持抖动和 Retry-After），urllib3 这层不重试
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0, pool_block=False)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _count(self, key: str, n: int = 1):
+        with self._stats_lock:
+            self.stats[key] += n
+
+    def _sleep_for(self, attempt: int, resp=None) -> float:
+        if resp is not None:
+            ra = parse_retry_after(resp.headers.get("Retry-After"))
+            if ra is not None:
+                return min(ra, self.backoff_max * 4)
+        # full jitter：[0, backoff * 2^attempt]
+        return random.uniform(0, min(self.backoff_max, self.backoff * (2 ** attempt)))
+
+    def post_json(self, url: str, payload: dict, headers: dict | None = None,
+                  timeout: tuple | None = None, stream: bool = False, before_retry=None) -> requests.Response:
+        """
+        POST JSON；可重试的错误会自动重试，最终仍失败时抛出 requests 的异常
+        （HTTP 错误码走 raise_for_status）。
+        before_retry：退避之后、重发之前调用（拿限流许可）；它抛出的异常原样向上抛，不再重试。
+        """
+        timeout = timeout or (self.connect_timeout, self.read_timeout)
+        attempt = 0
+        while True:
+            self._count("requests")
+            resp = None
+            try:
+                resp = self.session.post(url, json=payload, headers=headers, timeout=timeout, stream=stream)
+            except requests.ConnectionError:  # 含 ConnectTimeout；ReadTimeout 不在此列，直接抛出
+                if attempt >= self.max_retries:
+                    self._count("failures")
+                    raise
+            else:
+                if resp.status_code not in RETRY_STATUS or attempt >= self.max_retries:
+                    if resp.status_code >= 400:
+                        self._count("failures")
+                    resp.raise_for_status()
+                    return resp
+
+            delay = self._sleep_for(attempt, resp)
+            if resp is not None:
+                resp.close()  # 把连接还回池子
+            self._count("retries")
+            attempt += 1
+            time.sleep(delay)
+            if before_retry is not None:
+                before_retry()
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,60 @@
+"""
+段落级增量分析的差分工具（不依赖模型、不依赖 Streamlit）
+
+常见用法是：分析 → 改一句 → 再分析。按行切成段落，和上一版比对：
+- 没改动的段落：沿用上一版结果里证据落在这些段落上的风险点
+- 改动/新增的段落：只把这几段发给模型找风险点
+- 整体评分：用“门槛 + 全部风险点 + 改动段落”做一次小请求重估
+
+    plan = plan_incremental(prev_text, prev_issues, new_text)
+    plan.changed -> [(段落序号, 段落文本), ...]
+    plan.carried -> 沿用的风险点
+"""
+from collections import Counter
+
+from cache import normalize_text
+
+
+def split_paragraphs(text: str) -> list[str]:
+    """按行切段，去掉空行和首尾空白；门槛关键词都不跨行，逐段扫描的并集等于整篇扫描"""
+    return [p.strip() for p in normalize_text(text).split("\n") if p.strip()]
+
+
+class IncrementalPlan:
+    def __init__(self, paragraphs: list[str]):
+        self.paragraphs = paragraphs
+        self.changed: list[tuple[int, str]] = []   # (新版里的段落序号, 段落文本)
+        self.carried: list[dict] = []              # 沿用的风险点
+
+    @property
+    def ratio(self) -> float:
+        """改动段落占比（按字数算，0~1）"""
+        total = sum(len(p) for p in self.paragraphs)
+        return sum(len(p) for _, p in self.changed) / total if total else 1.0
+
+
+def plan_incremental(prev_text: str, prev_issues: list, text: str) -> IncrementalPlan:
+    old = split_paragraphs(prev_text)
+    new = split_paragraphs(text)
+    plan = IncrementalPlan(paragraphs=new)
+
+    # 按内容比对（不看位置）：段落挪动顺序不算改动；重复段落按次数配对
+    remaining = Counter(old)
+    unchanged = []
+    for i, p in enumerate(new):
+        if remaining[p] > 0:
+            remaining[p] -= 1
+            unchanged.append(p)
+        else:
+            plan.changed.append((i, p))
+
+    # 上一版的风险点：证据还能在没改动的段落里找到才沿用，落在改动段落上的交给重新分析
+    seen = set()
+    for it in prev_issues or []:
+        ev = ((it or {}).get("evidence") or "").strip().rstrip("…")
+        if not ev or (ev, it.get("title")) in seen:
+            continue
+        if any(ev in p for p in unchanged):
+            plan.carried.append(dict(it))
+            seen.add((ev, it.get("title")))
+    return plan
@@ -0,0 +1,470 @@
+"""
+容错 JSON 解析：一遍扫描，把模型输出“修”成合法 JSON 再 json.loads
+
+能修的问题：
+- 代码块标记、JSON 前后夹带的说明文字（从第一个 { 开始，根对象闭合后的内容忽略）
+- 截断：没闭合的字符串 / 数组 / 对象补齐；悬空的键（只有键没有值）和半截字面量丢掉
+- 尾逗号、重复逗号；相邻两个值之间漏掉的逗号
+- 字符串里的裸换行 / 制表符等控制字符（转义）、非法转义（按字面反斜杠处理）
+- 引号：只在结构位置（键、值的开头结尾）把中文引号 / 单引号当作引号，字符串内容里的中文引号原样保留；
+  字符串里没转义的英文双引号（"学校"一刀切"的做法"）按后面跟的字符判断是不是结尾
+- 全角冒号 / 逗号出现在结构位置；没加引号的键和值；Python 风格的 True / False / None
+
+可以增量使用（流式时每到一段就 feed，不用等全部到齐再从头扫）：
+    p = JSONRepairParser()
+    for piece in stream:
+        n = p.progress
+        p.feed(piece)
+        if p.progress != n:     # 有顶层字段（或顶层数组里的元素）完整了
+            view, fields = p.snapshot()
+    parsed, err = p.finish()
+一次性：parse_json(text) -> (parsed, err, repairs)
+"""
+import json
+import re
+from json.decoder import scanstring
+
+_OPEN_QUOTES = {'"': '"', "“": "”", "”": "”", "'": "'", "‘": "’", "’": "’"}
+_STR_RUN = re.compile(r"[^\"\\\x00-\x1f“”‘’']+")
+_WS_RUN = re.compile(r"[ \t\r\n]+")
+_LIT_RUN = re.compile(r"[^\s,:{}\[\]\"“”‘’'，：]+")
+_NUMBER = re.compile(r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?")
+_PY_LITERALS = {"True": "true", "False": "false", "None": "null", "true": "true", "false": "false", "null": "null"}
+_CONTROL_ESC = {"\n": "\\n", "\r": "\\r", "\t": "\\t", "\b": "\\b", "\f": "\\f"}
+
+
+def _reject_constant(name):
+    raise ValueError(name)
+
+
+_DECODER = json.JSONDecoder(parse_constant=_reject_constant)   # NaN / Infinity 不是 JSON，交给慢路径当裸字面量
+
+# 对象内的状态：key（等键）→ colon（等冒号）→ value（等值）→ comma（等逗号或 }）
+# 数组内的状态：value（等值）→ comma（等逗号或 ]）
+
+
+class JSONRepairParser:
+    def __init__(self):
+        self.out: list[str] = []
+        self.repairs: set[str] = set()
+        self.started = False
+        self.done = False
+        self._stack: list[list] = []      # [类型 "{" / "[", 状态, 当前键在 out 里的起点]
+        self._pending_comma = False
+
+        self._in_str = False
+        self._str_close = ""              # 结束这个字符串的引号
+        self._str_is_key = False
+        self._str_mark = 0
+        self._esc = ""                    # 还没凑齐的转义序列
+        self._maybe_close = ""            # 见到 " 之后暂存的空白，等下一个字符决定是结尾还是内容
+
+        self._lit = ""                    # 正在累积的裸字面量
+        self._lit_mark = 0
+
+        self.progress = 0                 # 完整了的顶层字段 + 顶层数组元素个数
+        self._snap_end = 0                # 最近一次完整时 out 的长度
+        self._snap_close = ""             # 这时补上哪些括号就是合法 JSON
+
+    # ---------- 对外 ----------
+    def feed(self, chunk: str):
+        if self.done or not chunk:
+            return
+        i, n = 0, len(chunk)
+        while i < n and not self.done:
+            if not self.started:
+                j = chunk.find("{", i)
+                if j < 0:
+                    if chunk[i:].strip():
+                        self.repairs.add("prose")
+                    return
+                if chunk[i:j].strip():
+                    self.repairs.add("prose")
+                self.started = True
+                self.out.append("{")
+                self._stack.append(["{", "key", 0])
+                i = j + 1
+                continue
+            if self._in_str:
+                i = self._feed_str(chunk, i, n)
+            elif self._lit:
+                m = _LIT_RUN.match(chunk, i)
+                if m:
+                    self._lit += m.group()
+                    i = m.end()
+                if i < n:
+                    self._end_literal()
+            else:
+                m = _WS_RUN.match(chunk, i)
+                if m:
+                    i = m.end()
+                    continue
+                if chunk[i] in '"{[':
+                    j = self._fast_value(chunk, i)
+                    if j:
+                        i = j
+                        continue
+                self._structural(chunk[i])
+                i += 1
+        if self.done and i < n and chunk[i:].strip():
+            self.repairs.add("prose")
+
+    def snapshot(self) -> tuple[dict, set[str]]:
+        """
+        (已完整的顶层字段 + 还在生成中的顶层数组里已完整的元素, 已完整的顶层字段名)。
+        还在生成中的字符串 / 数字不算；不改变状态，可以边 feed 边调用
+        """
+        if not self.progress:
+            return {}, set()
+        try:
+            view = json.loads("".join(self.out[:self._snap_end]) + self._snap_close)
+        except ValueError:
+            return {}, set()
+        fields = set(view)
+        if self._snap_close == "]}":
+            fields.discard(next(reversed(view)))     # 最后一个字段是还没结束的数组
+        return view, fields
+
+    def finish(self) -> tuple[dict | None, str | None]:
+        """(parsed, err)；err 为 None 表示成功（可能修过，见 repairs）"""
+        if not self.started:
+            return None, "no_json_object_found"
+        if not self.done:
+            self.repairs.add("truncated")
+        text = self._completed()
+        try:
+            parsed = json.loads(text)
+        except ValueError as e:
+            return None, f"json_parse_failed: {e}"
+        if not parsed:
+            return None, "json_parse_failed: empty object"
+        return parsed, None
+
+    # ---------- 结构字符 ----------
+    def _value_allowed(self) -> bool:
+        """当前位置能不能开始一个值；漏了逗号时补上"""
+        kind, state, _ = self._stack[-1]
+        if state == "value":
+            return True
+        if state == "comma" and kind == "[":
+            self.repairs.add("missing_comma")
+            self._pending_comma = True
+            self._stack[-1][1] = "value"
+            return True
+        return False
+
+    def _key_allowed(self) -> bool:
+        kind, state, _ = self._stack[-1]
+        if kind != "{":
+            return False
+        if state == "key":
+            return True
+        if state == "comma":
+            self.repairs.add("missing_comma")
+            self._pending_comma = True
+            self._stack[-1][1] = "key"
+            return True
+        return False
+
+    def _emit_comma(self):
+        if self._pending_comma:
+            self.out.append(",")
+            self._pending_comma = False
+
+    def _structural(self, ch: str):
+        frame = self._stack[-1]
+        kind, state, _ = frame
+        if ch in _OPEN_QUOTES:
+            if ch != '"':
+                self.repairs.add("quote")
+            if self._key_allowed():
+                self._start_str(ch, is_key=True)
+            elif self._value_allowed():
+                self._start_str(ch, is_key=False)
+            else:
+                self.repairs.add("dropped")
+        elif ch in ":：":
+            if kind == "{" and state == "colon":
+                if ch != ":":
+                    self.repairs.add("fullwidth")
+                self.out.append(":")
+                frame[1] = "value"
+            else:
+                self.repairs.add("dropped")
+        elif ch in ",，":
+            if state == "comma":
+                if ch != ",":
+                    self.repairs.add("fullwidth")
+                self._pending_comma = True
+                frame[1] = "key" if kind == "{" else "value"
+            else:
+                self.repairs.add("dropped")   # 重复逗号 / 开头的逗号
+        elif ch in "{[":
+            if self._value_allowed():
+                self._emit_comma()
+                self.out.append(ch)
+                frame[1] = "comma"            # 子容器闭合之后等逗号；截断补齐时也不会被当成悬空的键
+                self._stack.append([ch, "key" if ch == "{" else "value", len(self.out)])
+            else:
+                self.repairs.add("dropped")
+        elif ch in "}]":
+            self._close_frame(ch)
+        else:
+            if self._key_allowed() or self._value_allowed():
+                self._lit = ch
+                self._lit_mark = len(self.out)
+            else:
+                self.repairs.add("dropped")
+
+    def _close_frame(self, ch: str):
+        kind, state, key_mark = self._stack[-1]
+        if self._pending_comma:
+            self.repairs.add("trailing_comma")
+            self._pending_comma = False
+        if kind == "{" and state in ("colon", "value"):
+            del self.out[key_mark:]   # 只有键没有值
+            self.repairs.add("dangling_key")
+        closer = "}" if kind == "{" else "]"
+        if ch != closer:
+            self.repairs.add("bracket")
+        self.out.append(closer)
+        self._stack.pop()
+        if self._stack:
+            self._stack[-1][1] = "comma"
+        else:
+            self.done = True
+        self._value_done()
+
+    def _value_done(self):
+        """一个值刚写完：是顶层字段或顶层数组的元素就记下当前位置，供 snapshot 补齐"""
+        depth = len(self._stack)
+        if depth > 2 or (depth == 2 and self._stack[1][0] != "["):
+            return
+        self.progress += 1
+        self._snap_end = len(self.out)
+        self._snap_close = "]}"[2 - depth:]
+
+    # ---------- 字符串 ----------
+    def _start_str(self, quote: str, is_key: bool):
+        frame = self._stack[-1]
+        mark = len(self.out)
+        self._emit_comma()
+        if is_key:
+            frame[2] = mark
+        self._in_str = True
+        self._str_close = _OPEN_QUOTES[quote]
+        self._str_is_key = is_key
+        self._str_mark = mark
+        self.out.append('"')
+
+    def _fast_value(self, s: str, i: int) -> int:
+        """
+        快路径：从 i 开始的合法字符串 / 容器交给 C 实现（scanstring / raw_decode）一次扫完，原样拷进输出；
+        返回值后面的位置，0 表示走慢路径。毛病通常只在局部，没毛病的 issues 条目、字符串整段跳过。
+        只在值后面紧跟（可隔空白）, } ] : 时才采用——和慢路径判断“是结尾”的结果一致；
+        其余情况（控制字符、截断在这一段、NaN、引号后面是别的字符）都回到逐字扫描
+        """
+        try:
+            if s[i] == '"':
+                _, end = scanstring(s, i + 1)
+            else:
+                _, end = _DECODER.raw_decode(s, i)
+        except ValueError:
+            return 0
+        m = _WS_RUN.match(s, end)
+        nxt = m.end() if m else end
+        if nxt >= len(s) or s[nxt] not in ",}]:":
+            return 0
+        is_key = s[i] == '"' and self._key_allowed()
+        if not is_key and not self._value_allowed():
+            return 0
+        frame = self._stack[-1]
+        if is_key:
+            frame[2] = len(self.out)
+        self._emit_comma()
+        self.out.append(s[i:end])
+        frame[1] = "colon" if is_key else "comma"
+        if not is_key:
+            self._value_done()
+        return end
+
+    def _end_str(self):
+        self.out.append('"')
+        self._in_str = False
+        frame = self._stack[-1]
+        frame[1] = "colon" if self._str_is_key else "comma"
+        if not self._str_is_key:
+            self._value_done()
+
+    def _feed_str(self, s: str, i: int, n: int) -> int:
+        out = self.out
+        while i < n:
+            if self._esc:
+                self._esc += s[i]
+                i += 1
+                self._flush_escape()
+                if not self._in_str:
+                    return i    # 坏转义后面紧跟着结尾引号（“后果\”）：字符串已在 _flush_escape 里收尾
+                continue
+            if self._maybe_close:
+                # 上一个 " 是结尾还是内容：看后面第一个非空白字符。
+                # 全角逗号在中文正文里很常见（"一刀切"，……），要再往后看一个字符是不是引号
+                ch = s[i]
+                held = self._maybe_close
+                if ch in " \t\r\n":
+                    self._maybe_close += ch
+                    i += 1
+                    continue
+                if "，" in held:
+                    closes = ch in "\"“'}"
+                elif ch == "，" and not self._str_is_key:
+                    self._maybe_close += ch
+                    i += 1
+                    continue
+                else:
+                    closes = ch in ",}]:\"“‘" or (ch == "：" and self._str_is_key)
+                self._maybe_close = ""
+                if closes:
+                    self._end_str()
+                    if "，" in held:
+                        self._structural("，")
+                    return i
+                self.repairs.add("inner_quote")
+                out.append('\\"' + "".join(_CONTROL_ESC.get(c, c) for c in held[1:]))
+                continue
+            m = _STR_RUN.match(s, i)
+            if m:
+                out.append(m.group())
+                i = m.end()
+                continue
+            ch = s[i]
+            i += 1
+            if ch == "\\":
+                self._esc = "\\"
+            elif ch == self._str_close or (ch == '"' and self._str_close != "'"):
+                if ch == '"' and self._str_close == '"':
+                    self._maybe_close = '"'     # 先不下结论
+                else:
+                    if ch != self._str_close:
+                        self.repairs.add("quote")
+                    self._end_str()
+                    return i
+            elif ch == '"':
+                out.append('\\"')               # 单引号字符串里的双引号
+            elif ch < " ":
+                self.repairs.add("control_char")
+                out.append(_CONTROL_ESC.get(ch) or f"\\u{ord(ch):04x}")
+            else:
+                out.append(ch)                  # 字符串内容里的中文引号 / 单引号原样保留
+        return i
+
+    def _flush_escape(self):
+        esc = self._esc
+        if len(esc) < 2:
+            return
+        c = esc[1]
+        if c == "u":
+            if len(esc) < 6:
+                if all(x in "0123456789abcdefABCDEF" for x in esc[2:]):
+                    return
+            elif all(x in "0123456789abcdefABCDEF" for x in esc[2:6]):
+                self.out.append(esc)
+                self._esc = ""
+                return
+        elif c in '"\\/bfnrt':
+            self.out.append(esc)
+            self._esc = ""
+            return
+        elif c == "'":
+            self.out.append("'")
+            self._esc = ""
+            return
+        self.repairs.add("bad_escape")
+        self.out.append("\\\\")
+        self._esc = ""
+        rest = esc[1:]
+        self._feed_str(rest, 0, len(rest))
+
+    # ---------- 裸字面量 ----------
+    def _end_literal(self):
+        tok, self._lit = self._lit, ""
+        frame = self._stack[-1]
+        if frame[0] == "{" and frame[1] == "key":
+            self.repairs.add("bare_word")
+            frame[2] = len(self.out)
+            self._emit_comma()
+            self.out.append(json.dumps(tok, ensure_ascii=False))
+            frame[1] = "colon"
+            return
+        self._emit_comma()
+        self.out.append(self._literal_json(tok))
+        frame[1] = "comma"
+        self._value_done()
+
+    def _literal_json(self, tok: str) -> str:
+        if _NUMBER.fullmatch(tok):
+            return tok
+        lit = _PY_LITERALS.get(tok)
+        if lit is not None:
+            if lit != tok:
+                self.repairs.add("py_literal")
+            return lit
+        self.repairs.add("bare_word")
+        return json.dumps(tok, ensure_ascii=False)
+
+    # ---------- 补齐 ----------
+    def _completed(self) -> str | None:
+        """把当前输出补成完整 JSON 文本（不修改状态）"""
+        if not self.started:
+            return None
+        if self.done:
+            return "".join(self.out)
+        out = list(self.out)
+        stack = [f[:] for f in self._stack]
+
+        if self._in_str:
+            if self._maybe_close or not self._str_is_key:
+                out.append('"')                  # 值字符串截断：保留已有内容
+                stack[-1][1] = "colon" if self._str_is_key else "comma"
+            else:
+                del out[self._str_mark:]         # 键截断：整个丢掉
+        elif self._lit and stack[-1][1] != "key":
+            tok = self._lit
+            if _NUMBER.fullmatch(tok) or tok in _PY_LITERALS:
+                out.append(("," if self._pending_comma else "") + (_PY_LITERALS.get(tok) or tok))
+                stack[-1][1] = "comma"
+            # 半截字面量（tru / 12.）直接丢掉
+
+        for kind, state, key_mark in reversed(stack):
+            if kind == "{" and state in ("colon", "value"):
+                del out[key_mark:]
+            out.append("}" if kind == "{" else "]")
+        return "".join(out)
+
+
+def parse_json(text: str) -> tuple[dict | None, str | None, set[str]]:
+    """
+    (parsed, err, repairs)。先试两条 C 实现的快路径（整段 / 第一个 { 到最后一个 } 直接 json.loads），
+    都不行再走一遍容错扫描。
+    """
+    if not text or not text.strip():
+        return None, "empty_response", set()
+    s = text.strip()
+    try:
+        parsed = json.loads(s)
+        if isinstance(parsed, dict):
+            return parsed, None, set()
+    except ValueError:
+        pass
+    start, end = s.find("{"), s.rfind("}")
+    if start > 0 and end > start:
+        try:
+            parsed = json.loads(s[start:end + 1])
+            if isinstance(parsed, dict):
+                return parsed, None, {"prose"}
+        except ValueError:
+            pass
+    p = JSONRepairParser()
+    p.feed(s)
+    parsed, err = p.finish()
+    return parsed, err, p.repairs
@@ -0,0 +1,138 @@
+"""
+多模式关键词匹配（Aho-Corasick）
+
+所有词库一次性编译成自动机，一遍线性扫描即可拿到全部命中：
+词、所属类别、字符偏移。risk_gate 等门槛判断都建立在它之上。
+"""
+from collections import deque
+from typing import Iterator, NamedTuple
+
+
+class Hit(NamedTuple):
+    start: int      # 命中起点（含）
+    end: int        # 命中终点（不含），text[start:end] == word
+    word: str
+    category: str
+
+
+class KeywordAutomaton:
+    """
+    lexicons: {类别: [关键词, ...]}
+    - 同一个词可以属于多个类别（例如“处分”既是负面后果也是纪律处分），会各自产出一条 Hit
+    - 构建时直接把失败链接展开成完整转移表（DFA），扫描时每个字符只做一次 dict 查找
+    """
+
+    def __init__(self, lexicons: dict[str, list[str]]):
+        self.categories = list(lexicons.keys())
+
+        word_cats: dict[str, list[str]] = {}
+        for cat, words in lexicons.items():
+            for w in words:
+                w = (w or "").strip()
+                if not w:
+                    continue
+                cats = word_cats.setdefault(w, [])
+                if cat not in cats:
+                    cats.append(cat)
+
+        # --- trie ---
+        goto: list[dict[str, int]] = [{}]
+        out: list[tuple] = [()]
+        for w, cats in word_cats.items():
+            s = 0
+            for ch in w:
+                nxt = goto[s].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[s][ch] = nxt
+                    goto.append({})
+                    out.append(())
+                s = nxt
+            out[s] = ((w, tuple(cats)),)
+
+        # --- 失败链接 + 输出合并（BFS） ---
+        fail = [0] * len(goto)
+        q = deque()
+        for ch, s in goto[0].items():
+            q.append(s)
+        while q:
+            r = q.popleft()
+            for ch, s in goto[r].items():
+                q.append(s)
+                f = fail[r]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fs = goto[f].get(ch, 0)
+                fail[s] = fs if fs != s else 0
+                if out[fail[s]]:
+                    out[s] = out[s] + out[fail[s]]
+
+        # --- 展开为 DFA：delta[s] 包含所有会离开根节点的转移 ---
+        delta: list[dict[str, int]] = [dict(goto[0])]
+        order = []
+        q = deque(goto[0].values())
+        while q:
+            s = q.popleft()
+            order.append(s)
+            q.extend(goto[s].values())
+        delta.extend({} for _ in range(len(goto) - 1))
+        for s in order:
+            d = dict(delta[fail[s]])
+            d.update(goto[s])
+            delta[s] = d
+
+        self._delta = delta
+        self._out = out
+        # 每个状态上最长命中的长度（合并区间只需要它）
+        self._longest = [max((len(w) for w, _ in o), default=0) for o in out]
+        self.word_count = len(word_cats)
+
+    def iter_hits(self, text: str) -> Iterator[Hit]:
+        """按结束位置顺序产出所有命中（包括互相重叠/包含的词）"""
+        delta = self._delta
+        out = self._out
+        s = 0
+        for i, ch in enumerate(text or ""):
+            s = delta[s].get(ch, 0)
+            if out[s]:
+                end = i + 1
+                for w, cats in out[s]:
+                    for c in cats:
+                        yield Hit(end - len(w), end, w, c)
+
+    def spans(self, text: str) -> list[tuple[int, int]]:
+        """
+        所有命中覆盖的字符区间，重叠/相邻的已合并，按起点排序。
+        同一结束位置只取最长的词；新区间能吞掉前面的就出栈合并，整体仍是一遍线性扫描。
+        """
+        delta = self._delta
+        longest = self._longest
+        merged: list[list[int]] = []
+        s = 0
+        for i, ch in enumerate(text or ""):
+            s = delta[s].get(ch, 0)
+            n = longest[s]
+            if n:
+                end = i + 1
+                start = end - n
+                while merged and start <= merged[-1][1]:
+                    start = min(start, merged.pop()[0])
+                merged.append([start, end])
+        return [(a, b) for a, b in merged]
+
+    def find_all(self, text: str) -> list[Hit]:
+        return list(self.iter_hits(text))
+
+    def scan(self, text: str) -> dict[str, set[str]]:
+        """{类别: 命中的去重词集合}；每个类别都有键，没命中就是空集合"""
+        found: dict[str, set[str]] = {c: set() for c in self.categories}
+        delta = self._delta
+        out = self._out
+        s = 0
+        for ch in text or "":
+            s = delta[s].get(ch, 0)
+            if out[s]:
+                for w, cats in out[s]:
+                    for c in cats:
+                        found[c].add(w)
+        return found
@@ -0,0 +1,225 @@
+"""
+进程内指标：分阶段耗时直方图 + 计数器，可导出 Prometheus/OpenMetrics 文本或 JSONL
+
+    with span("http"):               # 记入 qxz_stage_seconds{stage="http"}，
+        ...                          # 如果外层开了 trace()，同时记进这次调用的明细
+    with trace() as tr:              # 收集这一次分析里所有 span（页面调试面板用）
+        analyze(...)
+    tr.spans -> [{"stage", "start_ms", "ms"}, ...]
+
+    REGISTRY.inc("qxz_fallback_total", reason="parse_error")
+    REGISTRY.to_prometheus() / REGISTRY.to_jsonl()
+
+trace 用 contextvars 传递：同一线程里嵌套调用自动带上；线程池里的子任务要用
+contextvars.copy_context().run 提交才会记进同一个 trace。
+"""
+import bisect
+import json
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# 秒；覆盖从毫秒级的本地处理到几十秒的模型生成
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80)
+
+HELP = {
+    "qxz_stage_seconds": "各阶段耗时（秒）",
+    "qxz_fallback_total": "local_fallback 兜底次数，按原因",
+    "qxz_json_extract_total": "safe_extract_json 调用次数，按结果（ok / repaired / 失败类别）",
+    "qxz_json_repair_total": "容错解析修复过的输出，按修复项（truncated / trailing_comma / quote ...）",
+    "qxz_schema_violation_total": "模型输出不符合 schema、已被校验器修复的次数，按请求类型 / 字段 / 类别",
+    "qxz_analyze_total": "analyze() 调用次数，按模式与结果",
+    "qxz_tokens_total": "模型 token 用量，按类型（prompt/completion；cache_hit 是 prompt 中命中服务方前缀缓存的部分）与模式",
+    "qxz_budget_degraded_total": "预算超出导致的降级次数，按动作与预算维度",
+    "qxz_incremental_total": "analyze_incremental() 调用次数，按实际路径（incremental/full/error）",
+    "qxz_prescore_total": "本地预评分的判断次数：skip 直接出本地结果、pass 照常调模型",
+    "qxz_coalesced_total": "与正在进行的相同分析合并、没有单独发请求的次数，按模式",
+}
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)   # 最后一格是 +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, v: float):
+        self.counts[bisect.bisect_left(self.buckets, v)] += 1
+        self.sum += v
+        self.count += 1
+
+    def cumulative(self) -> list[tuple[str, int]]:
+        out, acc = [], 0
+        for le, c in zip([*(f"{b:g}" for b in self.buckets), "+Inf"], self.counts):
+            acc += c
+            out.append((le, acc))
+        return out
+
+    def quantile(self, q: float) -> float:
+        """按桶上界估算分位数（调试面板用，不做插值）"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        acc = 0
+        for i, c in enumerate(self.counts):
+            acc += c
+            if acc >= rank:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return float("inf")
+
+
+def _labels_key(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(key: tuple, extra: tuple = ()) -> str:
+    items = [*key, *extra]
+    if not items:
+        return ""
+    esc = lambda v: v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")  # noqa: E731
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+
+class MetricsRegistry:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._hist: dict[str, dict[tuple, Histogram]] = {}
+        self._counters: dict[str, dict[tuple, float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, value: float, **labels):
+        key = _labels_key(labels)
+        with self._lock:
+            series = self._hist.setdefault(name, {})
+            h = series.get(key)
+            if h is None:
+                h = series[key] = Histogram(self.buckets)
+            h.observe(value)
+
+    def inc(self, name: str, n: float = 1, **labels):
+        key = _labels_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + n
+
+    def reset(self):
+        with self._lock:
+            self._hist.clear()
+            self._counters.clear()
+
+    def snapshot(self) -> dict:
+        """{"histograms": {name: [{labels, count, sum, p50, p95, buckets}]}, "counters": {name: [{labels, value}]}}"""
+        with self._lock:
+            hists = {
+                name: [
+                    {"labels": dict(k), "count": h.count, "sum": round(h.sum, 6),
+                     "p50": h.quantile(0.5), "p95": h.quantile(0.95), "buckets": dict(h.cumulative())}
+                    for k, h in sorted(series.items())
+                ]
+                for name, series in sorted(self._hist.items())
+            }
+            counters = {
+                name: [{"labels": dict(k), "value": v} for k, v in sorted(series.items())]
+                for name, series in sorted(self._counters.items())
+            }
+        return {"histograms": hists, "counters": counters}
+
+    def to_prometheus(self) -> str:
+        """Prometheus / OpenMetrics 文本格式（以 # EOF 结尾）"""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._hist.items()):
+                lines.append(f"# HELP {name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, h in sorted(series.items()):
+                    for le, acc in h.cumulative():
+                        lines.append(f"{name}_bucket{_fmt_labels(key, (('le', le),))} {acc}")
+                    lines.append(f"{name}_sum{_fmt_labels(key)} {h.sum:.6f}")
+                    lines.append(f"{name}_count{_fmt_labels(key)} {h.count}")
+            for name, series in sorted(self._counters.items()):
+                base = name[:-6] if name.endswith("_total") else name
+                lines.append(f"# HELP {base} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {base} counter")
+                for key, v in sorted(series.items()):
+                    lines.append(f"{name}{_fmt_labels(key)} {v:g}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def to_jsonl(self) -> str:
+        """每个序列一行：{"ts", "name", "type", "labels", ...}"""
+        ts = round(time.time(), 3)
+        snap = self.snapshot()
+        rows = []
+        for name, series in snap["histograms"].items():
+            for s in series:
+                rows.append({"ts": ts, "name": name, "type": "histogram", **s})
+        for name, series in snap["counters"].items():
+            for s in series:
+                rows.append({"ts": ts, "name": name, "type": "counter", **s})
+        return "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in rows)
+
+    def write(self, path):
+        """按后缀导出：.jsonl 追加一批快照，其它写 Prometheus 文本（覆盖）"""
+        path = str(path)
+        if path.endswith(".jsonl"):
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(self.to_jsonl())
+        else:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(self.to_prometheus())
+
+
+REGISTRY = MetricsRegistry()
+
+
+# =========================
+# span / trace
+# =========================
+class Trace:
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.spans: list[dict] = []
+
+    def record(self, stage: str, start: float, dt: float):
+        self.spans.append({"stage": stage, "start_ms": round((start - self.t0) * 1000, 2), "ms": round(dt * 1000, 2)})
+
+    def summary(self) -> list[dict]:
+        """同名阶段合并：[{stage, count, ms}]，按首次出现的顺序；并发的子请求各自累加"""
+        out: dict[str, dict] = {}
+        for s in self.spans:
+            row = out.setdefault(s["stage"], {"stage": s["stage"], "count": 0, "ms": 0.0})
+            row["count"] += 1
+            row["ms"] = round(row["ms"] + s["ms"], 2)
+        return list(out.values())
+
+
+_current_trace: ContextVar[Trace | None] = ContextVar("qxz_trace", default=None)
+
+
+@contextmanager
+def trace():
+    tr = Trace()
+    token = _current_trace.set(tr)
+    try:
+        yield tr
+    finally:
+        _current_trace.reset(token)
+
+
+def record(stage: str, dt: float, start: float | None = None):
+    """直接记一段已经量好的耗时（秒）；生成器里分段累计的时间用它"""
+    REGISTRY.observe("qxz_stage_seconds", dt, stage=stage)
+    tr = _current_trace.get()
+    if tr is not None:
+        tr.record(stage, time.perf_counter() - dt if start is None else start, dt)
+
+
+@contextmanager
+def span(stage: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - t0, t0)
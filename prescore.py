@@ -0,0 +1,346 @@
+"""
+本地轻量风险预评分：哈希字符 n-gram + 多分类逻辑回归（纯 Python，不依赖第三方库）
+
+用积累下来的模型分析结果（原文 → risk_level / risk_score）离线训练，线上每次分析前先算一遍（毫秒级）：
+规则门槛判为非实质风险、且模型判 LOW 的置信度不低于阈值时，直接出本地结果、不调上游（见 core.prescore_result）。
+
+- 特征：归一化原文的 1~3 字 n-gram，crc32 哈希到 2^18 个桶，次数取 1+log，整体做 L2 归一；场景单独一个特征
+- 模型：LOW / MEDIUM / HIGH 三分类 softmax，SGD + L2；分数 = 各等级概率 × 该等级训练集平均分
+- 校准：在留出集上拟合一个温度 T（最小化负对数似然），置信度 = 校准后的最大概率
+
+训练数据（JSONL，一行一个样本；core 分析成功后会自动追加到 QXZ_LABEL_LOG）：
+    {"text": ..., "scenario": ..., "risk_score": 62, "risk_level": "MEDIUM", "final_level": "MEDIUM", ...}
+    {"text": ..., "result": {...analyze() 的结果...}}              # 也可以直接带完整结果
+标注用的是门槛强制降敏之前模型自己的结论（结果里的 model_verdict）：强制之后，门槛判为非实质风险的
+文本一律是 LOW，而预评分恰恰只在这些文本上做决定，拿强制后的等级训练只会学到门槛本身。
+
+    python prescore.py train .cache/labels.jsonl -o .cache/prescore.json
+    python prescore.py train --batch notices.jsonl results.jsonl -o .cache/prescore.json   # 用 batch.py 的输入输出
+    python prescore.py eval .cache/labels.jsonl --model .cache/prescore.json --thresholds 0.8,0.9
+
+通知类型（risk_gate.type）不学：线上一律以本地规则门槛的判断为准。
+"""
+import argparse
+import json
+import math
+import random
+import sys
+import zlib
+from pathlib import Path
+from typing import NamedTuple
+
+from cache import normalize_text
+
+LEVELS = ("LOW", "MEDIUM", "HIGH")
+N_BUCKETS = 1 << 18
+NGRAMS = (1, 2, 3)
+MAX_CHARS = 4000          # 只看前这么多字：通知的定性基本在前面，长文本来也不走预评分
+HOLDOUT_EVERY = 5         # 按原文哈希留出 1/5 做校准和评估，同一篇通知不会同时出现在两边
+
+
+def features(text: str, scenario: str = "") -> dict[int, float]:
+    s = normalize_text(text)[:MAX_CHARS]
+    counts: dict[int, int] = {}
+    for n in NGRAMS:
+        for i in range(len(s) - n + 1):
+            h = zlib.crc32(s[i:i + n].encode("utf-8")) & (N_BUCKETS - 1)
+            counts[h] = counts.get(h, 0) + 1
+    if scenario:
+        h = zlib.crc32(f"\x00scenario:{scenario}".encode("utf-8")) & (N_BUCKETS - 1)
+        counts[h] = counts.get(h, 0) + 1
+    feats = {h: 1.0 + math.log(c) for h, c in counts.items()}
+    norm = math.sqrt(sum(v * v for v in feats.values())) or 1.0
+    return {h: v / norm for h, v in feats.items()}
+
+
+def _softmax(logits: list[float]) -> list[float]:
+    m = max(logits)
+    ex = [math.exp(x - m) for x in logits]
+    z = sum(ex)
+    return [e / z for e in ex]
+
+
+class Prediction(NamedTuple):
+    level: str
+    score: int
+    confidence: float          # 校准后的最大概率
+    probs: dict[str, float]
+
+
+class PreScorer:
+    def __init__(self, weights: list[dict[int, float]] | None = None, bias: list[float] | None = None,
+                 temperature: float = 1.0, level_scores: list[float] | None = None, meta: dict | None = None):
+        self.weights = weights or [{} for _ in LEVELS]
+        self.bias = bias or [0.0] * len(LEVELS)
+        self.temperature = temperature
+        self.level_scores = level_scores or [15.0, 55.0, 80.0]
+        self.meta = meta or {}
+
+    def _logits(self, feats: dict[int, float]) -> list[float]:
+        return [b + sum(w.get(h, 0.0) * v for h, v in feats.items()) for w, b in zip(self.weights, self.bias)]
+
+    def predict_features(self, feats: dict[int, float]) -> Prediction:
+        probs = _softmax([x / self.temperature for x in self._logits(feats)])
+        k = max(range(len(LEVELS)), key=probs.__getitem__)
+        score = sum(p * s for p, s in zip(probs, self.level_scores))
+        return Prediction(LEVELS[k], int(round(score)), probs[k], dict(zip(LEVELS, probs)))
+
+    def predict(self, text: str, scenario: str = "") -> Prediction:
+        return self.predict_features(features(text, scenario))
+
+    # ---------- 存取 ----------
+    def to_dict(self) -> dict:
+        return {
+            "levels": list(LEVELS), "buckets": N_BUCKETS, "ngrams": list(NGRAMS),
+            "weights": [{str(h): round(v, 5) for h, v in w.items() if abs(v) >= 1e-5} for w in self.weights],
+            "bias": self.bias, "temperature": self.temperature, "level_scores": self.level_scores, "meta": self.meta,
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "PreScorer":
+        if d.get("buckets") != N_BUCKETS or d.get("ngrams") != list(NGRAMS) or d.get("levels") != list(LEVELS):
+            raise ValueError("模型文件的特征设置和当前代码不一致，需要重新训练")
+        return cls([{int(h): v for h, v in w.items()} for w in d["weights"]], d["bias"], d["temperature"],
+                   d["level_scores"], d.get("meta"))
+
+    def save(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.to_dict(), ensure_ascii=False), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path) -> "PreScorer":
+        return cls.from_dict(json.loads(Path(path).read_text(encoding="utf-8")))
+
+
+# =========================
+# 训练 / 校准 / 评估
+# =========================
+class Example(NamedTuple):
+    text: str
+    scenario: str
+    level: int                 # LEVELS 下标
+    score: int
+
+
+def example_from_record(rec: dict) -> Example | None:
+    """
+    标注日志的一行 / 带完整结果的一行 → Example；兜底、精简、本地预评分、增量的结果不算标注。
+    完整结果取 model_verdict（门槛强制之前模型自己的结论）；没有 model_verdict 的旧结果只有门槛判为
+    实质风险时才能用（这时没被强制改过），否则跳过。标注日志的 risk_level / risk_score 本来就是强制之前的。
+    """
+    full = isinstance(rec.get("result"), dict)
+    res = rec["result"] if full else rec
+    text = (rec.get("text") or "").strip()
+    if not text or any(res.get(k) for k in ("fallback", "lite", "prescored", "incremental")):
+        return None
+    verdict = res.get("model_verdict") if full else res
+    if not isinstance(verdict, dict):
+        if not (res.get("risk_gate") or {}).get("is_substantive"):
+            return None
+        verdict = res
+    level = str(verdict.get("risk_level") or "").upper()
+    if level not in LEVELS:
+        return None
+    try:
+        score = max(0, min(100, int(verdict.get("risk_score") or 0)))
+    except (TypeError, ValueError):
+        return None
+    return Example(text, rec.get("scenario") or "", LEVELS.index(level), score)
+
+
+def load_examples(paths) -> list[Example]:
+    out: dict[tuple, Example] = {}   # 同一篇（原文 + 场景）以最后一次为准
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    ex = example_from_record(json.loads(line))
+                except (json.JSONDecodeError, AttributeError):
+                    continue
+                if ex is None:
+                    continue
+                key = (normalize_text(ex.text), ex.scenario)
+                out.pop(key, None)
+                out[key] = ex
+    return list(out.values())
+
+
+def load_batch_examples(input_path, output_path) -> list[Example]:
+    """batch.py 的输入（原文）和输出（结果）按 id 对上；ok 的行才算"""
+    import batch   # 延迟导入：只有这种用法需要
+
+    texts = {}
+    for _, row in batch._read_rows(Path(input_path)):
+        try:
+            r = batch.normalize_row(row, batch.DEFAULT_SCENARIO)
+        except (ValueError, json.JSONDecodeError):
+            continue
+        texts[r["id"]] = r
+    out = {}
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            row = texts.get(rec.get("id"))
+            if row is None or rec.get("status") != "ok":
+                continue
+            ex = example_from_record({"text": row["text"], "scenario": row["scenario"], "result": rec.get("result")})
+            if ex is not None:
+                out[rec["id"]] = ex
+    return list(out.values())
+
+
+def is_holdout(ex: Example) -> bool:
+    return zlib.crc32(normalize_text(ex.text).encode("utf-8")) % HOLDOUT_EVERY == 0
+
+
+def train(examples: list[Example], epochs: int = 8, lr: float = 0.5, l2: float = 1e-5, seed: int = 0) -> PreScorer:
+    model = PreScorer()
+    for k in range(len(LEVELS)):
+        scores = [e.score for e in examples if e.level == k]
+        if scores:
+            model.level_scores[k] = sum(scores) / len(scores)
+    data = [(features(e.text, e.scenario), e.level) for e in examples]
+    rng = random.Random(seed)
+    step = 0
+    for epoch in range(epochs):
+        rng.shuffle(data)
+        for feats, y in data:
+            step += 1
+            eta = lr / (1 + 0.01 * step) ** 0.5
+            probs = _softmax(model._logits(feats))
+            for k, (w, p) in enumerate(zip(model.weights, probs)):
+                g = p - (1.0 if k == y else 0.0)
+                model.bias[k] -= eta * g
+                for h, v in feats.items():
+                    old = w.get(h, 0.0)
+                    w[h] = old - eta * (g * v + l2 * old)
+    model.meta = {"examples": len(examples), "epochs": epochs,
+                  "class_counts": [sum(1 for e in examples if e.level == k) for k in range(len(LEVELS))]}
+    return model
+
+
+def calibrate(model: PreScorer, examples: list[Example]) -> float:
+    """在留出集上网格搜索温度 T，最小化负对数似然；留出集为空时保持 T=1"""
+    if not examples:
+        return model.temperature
+    logits = [(model._logits(features(e.text, e.scenario)), e.level) for e in examples]
+
+    def nll(t: float) -> float:
+        return -sum(math.log(max(_softmax([x / t for x in lg])[y], 1e-12)) for lg, y in logits) / len(logits)
+
+    grid = [0.25 * i for i in range(1, 41)]   # 0.25 ~ 10
+    model.temperature = min(grid, key=nll)
+    return model.temperature
+
+
+def evaluate(model: PreScorer, examples: list[Example], thresholds=(0.7, 0.8, 0.9, 0.95), gate=None) -> dict:
+    """
+    准确率、分数平均绝对误差、ECE（10 档），以及各阈值下“能省掉多少次调用”：
+    预测 LOW 且置信度 >= 阈值（且 gate 判为非实质风险，传了 gate 时）就算跳过；
+    跳过的样本里模型自己判断不是 LOW 的算误跳（其中 HIGH 单列）。
+    叠加门槛时（与线上一致）跳过不会改变展示的等级（门槛本来就强制 LOW），误跳的代价是：
+    模型看出了门槛漏掉的风险，用户却只拿到模板改写，看不到模型的摘要和表达优化点。
+    """
+    rows = []
+    for e in examples:
+        p = model.predict(e.text, e.scenario)
+        substantive = gate(e.text)["is_substantive"] if gate is not None else False
+        rows.append((p, e, substantive))
+    n = len(rows) or 1
+    correct = sum(1 for p, e, _ in rows if p.level == LEVELS[e.level])
+    mae = sum(abs(p.score - e.score) for p, e, _ in rows) / n
+    bins = [[0, 0.0, 0] for _ in range(10)]      # 样本数, 置信度和, 正确数
+    for p, e, _ in rows:
+        b = bins[min(9, int(p.confidence * 10))]
+        b[0] += 1
+        b[1] += p.confidence
+        b[2] += p.level == LEVELS[e.level]
+    ece = sum(abs(c / k - ok / k) * k for k, c, ok in bins if k) / n
+    savings = []
+    for t in thresholds:
+        skipped = [(p, e) for p, e, sub in rows if p.level == "LOW" and p.confidence >= t and not sub]
+        savings.append({
+            "threshold": t,
+            "skipped": len(skipped),
+            "skip_rate": round(len(skipped) / n, 4),
+            "wrong": sum(1 for _, e in skipped if e.level != 0),
+            "wrong_high": sum(1 for _, e in skipped if e.level == 2),
+        })
+    return {"n": len(rows), "accuracy": round(correct / n, 4), "score_mae": round(mae, 2), "ece": round(ece, 4),
+            "temperature": model.temperature, "gated": gate is not None, "savings": savings}
+
+
+def print_report(title: str, rep: dict):
+    print(f"{title}：{rep['n']} 条｜准确率 {rep['accuracy']:.1%}｜分数 MAE {rep['score_mae']}｜"
+          f"ECE {rep['ece']:.3f}｜温度 {rep['temperature']}")
+    print(f"{'阈值':>6}{'跳过调用':>10}{'占比':>8}{'误跳':>6}{'误跳HIGH':>10}")
+    for s in rep["savings"]:
+        print(f"{s['threshold']:>6}{s['skipped']:>10}{s['skip_rate']:>8.1%}{s['wrong']:>6}{s['wrong_high']:>10}")
+    if rep.get("gated"):
+        print("误跳 = 模型自己判断不是 LOW、但被跳过的样本。叠加门槛时展示的等级不受影响（门槛本来就强制 LOW），"
+              "损失的是模型写的改写 / 摘要 / 表达优化点（换成模板），以及模型对门槛漏判的提示。")
+    else:
+        print("误跳 = 模型自己判断不是 LOW、但被跳过的样本；不叠加门槛时就是风险等级判错。")
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="本地风险预评分：训练 / 评估")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    for name in ("train", "eval"):
+        p = sub.add_parser(name)
+        p.add_argument("data", nargs="*", type=Path, help="标注 JSONL（QXZ_LABEL_LOG 或带 result 的 JSONL）")
+        p.add_argument("--batch", nargs=2, type=Path, metavar=("INPUT", "OUTPUT"), action="append", default=[],
+                       help="batch.py 的输入文件和结果文件，可重复")
+        p.add_argument("--thresholds", default="0.7,0.8,0.9,0.95", help="报告里列出的置信度阈值")
+        p.add_argument("--no-gate", action="store_true", help="统计省掉的调用时不叠加规则门槛（默认叠加，与线上一致）")
+    tr = sub.choices["train"]
+    tr.add_argument("-o", "--output", type=Path, required=True, help="模型文件（JSON）")
+    tr.add_argument("--epochs", type=int, default=8)
+    tr.add_argument("--lr", type=float, default=0.5)
+    tr.add_argument("--l2", type=float, default=1e-5)
+    ev = sub.choices["eval"]
+    ev.add_argument("--model", type=Path, required=True)
+    ev.add_argument("--all", action="store_true", help="在全部样本上评估（默认只用留出集）")
+    args = ap.parse_args(argv)
+
+    examples = load_examples(args.data)
+    for inp, outp in args.batch:
+        examples += load_batch_examples(inp, outp)
+    if not examples:
+        print("没有可用的标注样本", file=sys.stderr)
+        return 2
+    thresholds = [float(x) for x in args.thresholds.split(",") if x.strip()]
+    gate = None
+    if not args.no_gate:
+        from core import risk_gate   # 只用规则门槛，不会调模型
+        gate = risk_gate
+
+    held = [e for e in examples if is_holdout(e)]
+    if args.cmd == "train":
+        train_set = [e for e in examples if not is_holdout(e)] or examples
+        model = train(train_set, epochs=args.epochs, lr=args.lr, l2=args.l2)
+        calibrate(model, held)
+        model.meta["holdout"] = len(held)
+        model.save(args.output)
+        print(f"训练 {len(train_set)} 条｜留出 {len(held)} 条｜各等级 {dict(zip(LEVELS, model.meta['class_counts']))}")
+        print_report("留出集", evaluate(model, held or train_set, thresholds, gate))
+        print(f"模型已写入 {args.output}")
+        return 0
+
+    model = PreScorer.load(args.model)
+    if args.all or not held:
+        print_report("全部样本", evaluate(model, examples, thresholds, gate))
+    else:
+        print_report("留出集", evaluate(model, held, thresholds, gate))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
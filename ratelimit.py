@@ -0,0 +1,190 @@
+"""
+上游模型调用的进程级限流：令牌桶 + 有界公平队列
+
+所有会话共用一个 RateLimiter（core.LIMITER），每次真正发 HTTP 请求前 acquire() 一次：
+- 令牌桶：平均每秒 rate 个请求，允许突发 burst 个
+- 没令牌时排队；队列按会话轮转（round-robin），一个会话连发很多请求（矩阵 / 拆分模式 / 批量）
+  也不会把别人挤到后面
+- 队列满了立刻抛 QueueFullError；排队超过 max_wait 抛 QueueTimeoutError——都不会默默兜底
+- 排队期间每隔一小段时间回调 observer(position, eta_s)，页面据此显示“前面还有几个、预计等多久”；
+  排过队的请求轮到时再回调一次 observer(None, 0.0)
+
+observer 通过 contextvars 传递：
+    with queue_observer(lambda pos, eta: ...):
+        analyze(...)
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+class UpstreamBusyError(RuntimeError):
+    """上游限流导致这次请求没有发出去；message 可以直接展示给用户"""
+
+
+class QueueFullError(UpstreamBusyError):
+    pass
+
+
+class QueueTimeoutError(UpstreamBusyError):
+    pass
+
+
+_observer: ContextVar = ContextVar("qxz_queue_observer", default=None)
+
+
+@contextmanager
+def queue_observer(fn):
+    token = _observer.set(fn)
+    try:
+        yield
+    finally:
+        _observer.reset(token)
+
+
+class _Ticket:
+    __slots__ = ("session", "granted")
+
+    def __init__(self, session):
+        self.session = session
+        self.granted = False
+
+
+class RateLimiter:
+    def __init__(self, rate: float = 5.0, burst: int = 10, max_queue: int = 50, max_wait: float = 45.0,
+                 poll: float = 0.5):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.poll = poll
+        self.stats = {"granted": 0, "queued": 0, "rejected": 0, "timeouts": 0, "wait_s": 0.0}
+
+        self._cond = threading.Condition()
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._queues: "OrderedDict[object, deque[_Ticket]]" = OrderedDict()  # 轮转顺序 = 字典顺序
+        self._waiting = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    # ---------- 内部（持锁调用） ----------
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def _head(self) -> _Ticket | None:
+        for q in self._queues.values():
+            if q:
+                return q[0]
+        return None
+
+    def _grant_head(self):
+        """队首会话出一张票，然后把这个会话挪到轮转末尾"""
+        session, q = next(iter(self._queues.items()))
+        t = q.popleft()
+        self._queues.move_to_end(session)
+        if not q:
+            del self._queues[session]
+        t.granted = True
+        self._tokens -= 1
+        self._waiting -= 1
+
+    def _position(self, ticket: _Ticket) -> int:
+        """按轮转规则，它前面还有几张票（0 = 下一个）"""
+        sessions = list(self._queues.keys())
+        mine = self._queues.get(ticket.session)
+        if mine is None:
+            return 0
+        k = mine.index(ticket)
+        my_idx = sessions.index(ticket.session)
+        ahead = k
+        for i, s in enumerate(sessions):
+            if s == ticket.session:
+                continue
+            ahead += min(len(self._queues[s]), k + 1 if i < my_idx else k)
+        return ahead
+
+    def _eta(self, position: int) -> float:
+        need = position + 1 - self._tokens
+        return max(0.0, need / self.rate)
+
+    # ---------- 对外 ----------
+    def acquire(self, session=None, observer=None) -> float:
+        """拿到一个发请求的许可才返回，返回排队等待的秒数；失败抛 UpstreamBusyError 的子类"""
+        if not self.enabled:
+            return 0.0
+        observer = observer or _observer.get()
+        t0 = time.monotonic()
+        with self._cond:
+            self._refill()
+            if not self._queues and self._tokens >= 1:
+                self._tokens -= 1
+                self.stats["granted"] += 1
+                return 0.0
+            if self._waiting >= self.max_queue:
+                self.stats["rejected"] += 1
+                raise QueueFullError(f"当前排队请求已满（{self.max_queue} 个），请稍后再试。")
+            ticket = _Ticket(session)
+            self._queues.setdefault(session, deque()).append(ticket)
+            self._waiting += 1
+            self.stats["queued"] += 1
+
+        deadline = t0 + self.max_wait if self.max_wait else None
+        while True:
+            with self._cond:
+                self._refill()
+                while self._tokens >= 1 and self._head() is not None:
+                    self._grant_head()
+                    self._cond.notify_all()
+                if ticket.granted:
+                    waited = time.monotonic() - t0
+                    self.stats["granted"] += 1
+                    self.stats["wait_s"] = round(self.stats["wait_s"] + waited, 3)
+                    break
+                now = time.monotonic()
+                if deadline is not None and now >= deadline:
+                    self._queues[session].remove(ticket)
+                    if not self._queues[session]:
+                        del self._queues[session]
+                    self._waiting -= 1
+                    self.stats["timeouts"] += 1
+                    raise QueueTimeoutError(f"排队超过 {self.max_wait:g} 秒仍未轮到，请稍后再试。")
+                position = self._position(ticket)
+                eta = self._eta(position)
+                # 等到下一个令牌生成或被别人叫醒，最多 poll 秒（要定时回调 observer）
+                timeout = min(self.poll, max(0.005, (1 - self._tokens) / self.rate))
+                if deadline is not None:
+                    timeout = min(timeout, max(0.0, deadline - now))
+            if observer is not None:
+                try:
+                    observer(position, eta)
+                except Exception:
+                    pass  # 展示失败不影响排队
+            with self._cond:
+                if not ticket.granted:
+                    self._cond.wait(timeout)
+        if observer is not None:
+            try:
+                observer(None, 0.0)
+            except Exception:
+                pass
+        return waited
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            self._refill()
+            return {
+                **self.stats,
+                "waiting": self._waiting,
+                "sessions_waiting": len(self._queues),
+                "tokens": round(self._tokens, 2),
+                "rate": self.rate,
+                "burst": self.burst,
+                "max_queue": self.max_queue,
+            }
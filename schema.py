@@ -0,0 +1,297 @@
+"""
+模型输出的 JSON Schema + 编译好的校验/修复器（不依赖模型、不依赖 Streamlit）
+
+每种请求（整篇 / 拆分模式的各部分 / 长文块 / 段落 / 重估）一份 schema，和 prompt 里写的结构一致：
+- 发请求时作为 response_format 交给服务方（见 core.response_format）
+- 解析后用同一份 schema 编译出的校验器走一遍：类型转换、范围截断、枚举归一、缺字段补默认值，
+  一遍完成，并记下每个字段的违规（字段路径, 类别），调用方按字段计数
+
+    value, bad = VALIDATORS["analysis"](parsed)
+    bad -> [("student_emotions[].intensity", "type"), ("rewrites[].name", "enum"), ...]
+
+违规类别：missing（缺字段 / null）、type（类型不对，已转换或换成默认值）、range（超出范围，已截断）、
+enum（不在枚举里，大小写 / 空白归一后仍不匹配的换成默认值）、item（数组里类型不对的元素，已丢掉）、
+max_items（元素太多，已截断）。schema 里没列出的字段原样保留，不算违规。
+"""
+import copy
+import functools
+import math
+
+_LEVELS = ["LOW", "MEDIUM", "HIGH"]
+_GATE_TYPES = ["事务型", "政策制度型", "纪律处分型", "资源分配型", "其他"]
+REWRITE_NAMES = ["更清晰", "更安抚", "更可执行"]
+
+
+def _obj(props: dict, required=None) -> dict:
+    return {"type": "object", "properties": props, "required": list(props) if required is None else required}
+
+
+_STR = {"type": "string"}
+_SCORE = {"type": "integer", "minimum": 0, "maximum": 100}
+ISSUE = _obj({"title": _STR, "evidence": _STR, "why": _STR, "rewrite_tip": _STR})
+EMOTION = _obj({
+    "group": _STR,
+    "sentiment": _STR,
+    "intensity": {"type": "number", "minimum": 0, "maximum": 1},
+    "sample_comment": _STR,
+})
+# 改写名不在三种里的清空（default ""），由 core.postprocess 按顺序补到空缺的位置上
+REWRITE = _obj({
+    "name": {"type": "string", "enum": REWRITE_NAMES, "default": ""},
+    "pred_risk_score": _SCORE,
+    "text": _STR,
+    "why": _STR,
+})
+RISK_GATE = _obj({
+    "type": {"type": "string", "enum": _GATE_TYPES, "default": "其他"},
+    "is_substantive": {"type": "boolean"},
+    "reason": _STR,
+})
+# 等级不在枚举里的清空，由 core.postprocess 按分数补
+_LEVEL = {"type": "string", "enum": _LEVELS, "default": ""}
+_ISSUES = {"type": "array", "items": ISSUE, "maxItems": 20}
+_EMOTIONS = {"type": "array", "items": EMOTION, "maxItems": 6}
+
+SCHEMAS = {
+    # 整篇（single / 流式）
+    "analysis": _obj({
+        "risk_gate": RISK_GATE,
+        "risk_score": _SCORE,
+        "risk_level": _LEVEL,
+        "summary": _STR,
+        "issues": _ISSUES,
+        "student_emotions": _EMOTIONS,
+        "rewrites": {"type": "array", "items": REWRITE, "maxItems": 3},
+    }),
+    # 拆分模式 / lite 的评分请求
+    "score": _obj({"risk_gate": RISK_GATE, "risk_score": _SCORE, "risk_level": _LEVEL, "summary": _STR,
+                   "issues": _ISSUES}),
+    "emotions": _obj({"student_emotions": _EMOTIONS}),
+    "rewrite": REWRITE,
+    # 长文的一块
+    "chunk": _obj({"risk_score": _SCORE, "risk_level": _LEVEL, "summary": _STR, "issues": _ISSUES,
+                   "student_emotions": _EMOTIONS}),
+    # 增量：一个段落的风险点 / 整体重估（没要求情绪时可以不给）
+    "paragraph": _obj({"issues": _ISSUES}),
+    "rescore": _obj(
+        {"risk_gate": RISK_GATE, "risk_score": _SCORE, "risk_level": _LEVEL, "summary": _STR,
+         "student_emotions": _EMOTIONS},
+        required=["risk_gate", "risk_score", "risk_level", "summary"],
+    ),
+}
+
+
+# =========================
+# 编译：schema → 闭包树，每个节点的关键字只解释一次
+# =========================
+_TRUE = {"true", "yes", "1", "是", "对"}
+_FALSE = {"false", "no", "0", "否", "不是", ""}
+_EMPTY = {"string": "", "integer": 0, "number": 0.0, "boolean": False}
+
+
+def _default_factory(node: dict):
+    if "default" in node:
+        d = node["default"]
+        return lambda: copy.deepcopy(d)
+    t = node.get("type")
+    if t == "object":
+        fill = _compile(node, "")   # 空对象按子 schema 补齐；不记违规
+        return lambda: fill({}, [])
+    if t == "array":
+        return list
+    d = _EMPTY.get(t)
+    return lambda: d
+
+
+def _to_number(v):
+    """数字 / 数字字符串（允许百分号）转 float；转不了返回 None"""
+    if isinstance(v, bool):
+        return None
+    if isinstance(v, (int, float)):
+        return v
+    if isinstance(v, str):
+        s = v.strip()
+        pct = s.endswith("%")
+        try:
+            x = float(s.rstrip("%").strip())
+        except ValueError:
+            return None
+        return x / 100 if pct else x
+    return None
+
+
+def _compile_number(node: dict, path: str, integer: bool):
+    lo, hi = node.get("minimum"), node.get("maximum")
+    default = _default_factory(node)
+
+    def check(v, bad):
+        if isinstance(v, int if integer else (int, float)) and not isinstance(v, bool):
+            x = v
+        else:
+            x = _to_number(v)
+            bad.append((path, "type"))
+            if x is None:
+                return default()
+        if isinstance(x, float) and not math.isfinite(x):
+            bad.append((path, "range"))   # NaN / ±Infinity（容错解析会放进来）：当作无效值清掉
+            return default()
+        if integer and not isinstance(x, int):
+            x = int(round(x))
+        if lo is not None and x < lo:
+            bad.append((path, "range"))
+            x = lo
+        elif hi is not None and x > hi:
+            bad.append((path, "range"))
+            x = hi
+        return x
+    return check
+
+
+def _compile_string(node: dict, path: str):
+    enum = node.get("enum")
+    folded = {e.strip().casefold(): e for e in enum} if enum else None
+    default = _default_factory(node)
+
+    def check(v, bad):
+        if not isinstance(v, str):
+            bad.append((path, "type"))
+            if isinstance(v, (dict, list)):
+                return default()
+            v = str(v).lower() if isinstance(v, bool) else str(v)
+        if folded is not None and v not in enum:
+            hit = folded.get(v.strip().casefold())
+            bad.append((path, "enum"))
+            return hit if hit is not None else default()
+        return v
+    return check
+
+
+def _compile_boolean(node: dict, path: str):
+    default = _default_factory(node)
+
+    def check(v, bad):
+        if isinstance(v, bool):
+            return v
+        bad.append((path, "type"))
+        if isinstance(v, (int, float)):
+            return bool(v)
+        if isinstance(v, str):
+            s = v.strip().casefold()
+            if s in _TRUE:
+                return True
+            if s in _FALSE:
+                return False
+        return default()
+    return check
+
+
+def _compile_array(node: dict, path: str):
+    item_node = node.get("items") or {}
+    item_path = f"{path}[]"
+    item = _compile(item_node, item_path)
+    want_obj = item_node.get("type") == "object"
+    max_items = node.get("maxItems")
+
+    def check(v, bad):
+        if not isinstance(v, list):
+            bad.append((path, "type"))
+            if want_obj and isinstance(v, dict):
+                v = [v]            # 只有一个元素时模型常常省掉外层数组
+            else:
+                return []
+        out = []
+        for it in v:
+            if want_obj and not isinstance(it, dict):
+                bad.append((item_path, "item"))
+                continue
+            out.append(item(it, bad))
+        if max_items is not None and len(out) > max_items:
+            bad.append((path, "max_items"))
+            del out[max_items:]
+        return out
+    return check
+
+
+def _compile_object(node: dict, path: str):
+    required = set(node.get("required") or ())
+    props = []
+    for k, sub in (node.get("properties") or {}).items():
+        sub_path = f"{path}.{k}" if path else k
+        props.append((k, sub_path, _compile(sub, sub_path), _default_factory(sub), k in required))
+
+    def check(v, bad):
+        if not isinstance(v, dict):
+            bad.append((path or "$", "type"))
+            v = {}
+        for k, sub_path, fn, default, req in props:
+            x = v.get(k)
+            if x is not None:
+                v[k] = fn(x, bad)
+            elif req:
+                bad.append((sub_path, "missing"))
+                v[k] = default()
+            elif k in v:
+                del v[k]    # 可选字段给了 null（strict 模式下只能这样表示“不给”），当作没给
+        return v
+    return check
+
+
+def _compile(node: dict, path: str):
+    t = node.get("type")
+    if t == "object":
+        return _compile_object(node, path)
+    if t == "array":
+        return _compile_array(node, path)
+    if t in ("integer", "number"):
+        return _compile_number(node, path, integer=t == "integer")
+    if t == "string":
+        return _compile_string(node, path)
+    if t == "boolean":
+        return _compile_boolean(node, path)
+    return lambda v, bad: v
+
+
+class Validator:
+    """编译一次，反复调用；原地修改并返回 (value, violations)"""
+
+    def __init__(self, schema: dict):
+        self.schema = schema
+        self._check = _compile(schema, "")
+
+    def __call__(self, value) -> tuple[object, list[tuple[str, str]]]:
+        bad: list[tuple[str, str]] = []
+        return self._check(value, bad), bad
+
+
+VALIDATORS = {name: Validator(s) for name, s in SCHEMAS.items()}
+
+
+# =========================
+# 交给服务方的 schema（strict 模式）
+# =========================
+def _strict(node: dict) -> dict:
+    """
+    strict 模式的要求：对象不允许额外字段、全部字段必填；default 这类注解去掉。
+    原本可选的字段改成可以为 null（模型用 null 表示不给，校验器按没给处理）
+    """
+    out = {k: v for k, v in node.items() if k != "default"}
+    if node.get("type") == "object":
+        required = set(node.get("required") or ())
+        out["properties"] = {
+            k: _strict(v) if k in required else _nullable(_strict(v)) for k, v in node["properties"].items()
+        }
+        out["required"] = list(node["properties"])
+        out["additionalProperties"] = False
+    elif node.get("type") == "array" and "items" in node:
+        out["items"] = _strict(node["items"])
+    return out
+
+
+def _nullable(node: dict) -> dict:
+    t = node.get("type")
+    return {**node, "type": [*(t if isinstance(t, list) else [t]), "null"]}
+
+
+@functools.lru_cache(maxsize=None)
+def provider_schema(name: str) -> dict:
+    return _strict(SCHEMAS[name])
@@ -0,0 +1,87 @@
+"""
+进程内请求合并（single-flight）：同一个 key 同时只跑一份
+
+同一篇通知被转给好几位辅导员，几秒内各自粘贴、各自点“预测”——
+key（归一化原文 + 场景 + 画像 + 模型，见 cache.make_key）相同的分析正在进行时，
+后来的调用方不再发上游请求，而是等同一个 Future，拿到结果的深拷贝。
+
+    result, shared = FLIGHTS.do(key, lambda: _analyze_cached(...))
+
+领头的调用抛异常（比如排队失败 UpstreamBusyError）时，跟随者拿到同一个异常；
+KeyboardInterrupt 这类非 Exception 的中断不外传，按“放弃”处理。
+流式分析这种“边产出边计算”的领头方用 claim() / resolve() / abandon() 手动管理：
+领头方半路被放弃（页面重跑、生成器被关闭）时调 abandon()，跟随者自己重新来一遍，而不是跟着失败。
+"""
+import copy
+import threading
+from concurrent.futures import Future
+
+
+class FlightAbandoned(Exception):
+    """领头方没有产出结果就退出了；跟随者应当自己重试"""
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: dict[str, Future] = {}
+        self.stats = {"leaders": 0, "coalesced": 0, "abandoned": 0}
+
+    def claim(self, key: str) -> tuple[Future, bool]:
+        """(future, is_leader)；is_leader=True 时调用方负责最后 resolve() 或 abandon()"""
+        with self._lock:
+            fut = self._flights.get(key)
+            if fut is not None:
+                self.stats["coalesced"] += 1
+                return fut, False
+            fut = self._flights[key] = Future()
+            self.stats["leaders"] += 1
+            return fut, True
+
+    def _finish(self, key: str, fut: Future):
+        with self._lock:
+            if self._flights.get(key) is fut:
+                del self._flights[key]
+
+    def resolve(self, key: str, fut: Future, result=None, exc: BaseException | None = None):
+        self._finish(key, fut)   # 先摘掉：之后到的调用方重新领头（通常直接命中结果缓存）
+        if exc is not None:
+            fut.set_exception(exc)
+        else:
+            fut.set_result(result)
+
+    def abandon(self, key: str, fut: Future):
+        self._finish(key, fut)
+        if not fut.done():
+            with self._lock:
+                self.stats["abandoned"] += 1
+            fut.set_exception(FlightAbandoned(key))
+
+    @staticmethod
+    def wait(fut: Future):
+        """跟随者等结果；拿到的是深拷贝，调用方随便改不影响别人"""
+        return copy.deepcopy(fut.result())
+
+    def do(self, key: str, fn) -> tuple[object, bool]:
+        """(result, shared)；shared=True 表示结果来自别人正在跑的那一份"""
+        while True:
+            fut, leader = self.claim(key)
+            if not leader:
+                try:
+                    return self.wait(fut), True
+                except FlightAbandoned:
+                    continue
+            try:
+                result = fn()
+            except Exception as e:
+                self.resolve(key, fut, exc=e)
+                raise
+            except BaseException:
+                self.abandon(key, fut)   # 中断 / 脚本被停止：不把这种异常传给别人
+                raise
+            self.resolve(key, fut, result=copy.deepcopy(result))
+            return result, False
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._flights)
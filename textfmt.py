@@ -0,0 +1,93 @@
+"""
+改写文本的格式化引擎（pretty_notice / add_emojis_smart）
+
+规则写成表、import 时编译一次：
+- 清理规则按表顺序作用于全文；每条规则带“触发字符”，文本里没有就整条跳过
+- emoji 规则合成一个总正则，每行先扫一遍；没命中的行（多数）直接跳过，
+  命中了才按表里的优先级逐类确认取第一个
+- format_rewrite(text, emoji) 按 (原文, emoji 开关) 记忆化，rerun / 切 tab 不重复计算
+- format_batch() 批量格式化（导出用）
+"""
+import re
+from functools import lru_cache
+
+# =========================
+# 清理规则：(触发字符, 正则, 替换)；触发字符任一出现才执行，空元组表示总是执行
+# =========================
+PRETTY_RULES = [
+    (("\\",), r"\\(?=\d+[\.\、\)])", ""),          # 去掉 \1. 这种转义
+    (("**",), r"\*\*(.*?)\*\*", r"\1"),              # **加粗**
+    (("__",), r"__(.*?)__", r"\1"),                  # __加粗__
+    (("`",), r"`([^`]+)`", r"\1"),                   # `代码`
+    (("-",), r"(?m)^\s*-\s+", "· "),                 # - 列表 → ·
+    ((".", "、", ")"), r"(?m)^(?=\d+[\.\、\)])", "\n"),  # 编号条目前空一行
+    (("【",), r"\n?【", "\n\n【"),                    # 【小标题】前空一行
+    (("\n\n\n",), r"\n{3,}", "\n\n"),                # 最多保留一个空行
+]
+_PRETTY_COMPILED = [(guard, re.compile(pat), repl) for guard, pat, repl in PRETTY_RULES]
+
+# =========================
+# emoji 规则：(类别, 前缀, 关键词)；顺序即优先级，每行最多加一个（问候另算）
+# =========================
+GREETING_RULE = ("greet", "👋 ", r"同学|大家|各位")   # 只看前两行
+EMOJI_RULES = [
+    ("time", "⏰ ", r"时间|今晚|明天|上午|下午|晚上|\d{1,2}[:：]\d{2}"),
+    ("place", "📍 ", r"地点|位置|教室|楼|宿舍|会议室|办公室"),
+    ("contact", "☎️ ", r"咨询|联系|沟通|电话|微信|邮箱"),
+    ("warn", "⚠️ ", r"注意|提醒|请勿|禁止|务必|重要"),
+    ("material", "📄 ", r"材料|附件|表格|申请|提交"),
+    ("step", "✅ ", r"步骤|流程|操作|请按|依次"),
+]
+_EMOJI_PREFIX = re.compile(r"^[\u2600-\u27BF\U0001F300-\U0001FAFF]")
+_LINE_SCANNER = re.compile("|".join(pat for _, _, pat in [GREETING_RULE, *EMOJI_RULES]))
+_EMOJI_COMPILED = [(prefix, re.compile(pat)) for _, prefix, pat in EMOJI_RULES]
+_GREETING_COMPILED = re.compile(GREETING_RULE[2])
+
+
+def pretty_notice(raw: str) -> str:
+    """清理 markdown/转义，让通知更像群消息"""
+    if not raw:
+        return ""
+    s = raw.replace("\r\n", "\n").replace("\r", "\n").strip()
+    for guard, rx, repl in _PRETTY_COMPILED:
+        if guard and not any(g in s for g in guard):
+            continue
+        s = rx.sub(repl, s)
+    return s.strip()
+
+
+def add_emojis_smart(text: str) -> str:
+    """克制地加 emoji（不刷屏）"""
+    if not text:
+        return ""
+    out = []
+    for i, line in enumerate(text.split("\n")):
+        L = line.strip()
+        if not L:
+            out.append("")
+            continue
+        # 总正则没命中 → 这一行什么都不加；命中了再按优先级确认是哪一类
+        # （关键词之间有重叠，比如“各位置”，所以不能只看总正则命中的是哪个词）
+        if not _EMOJI_PREFIX.match(L) and _LINE_SCANNER.search(L):
+            prefix = ""
+            for p, rx in _EMOJI_COMPILED:
+                if rx.search(L):
+                    prefix = p
+                    break
+            if i <= 1 and _GREETING_COMPILED.search(L):
+                prefix += GREETING_RULE[1]
+            L = prefix + L
+        out.append(L)
+    return "\n".join(out).strip()
+
+
+@lru_cache(maxsize=2048)
+def format_rewrite(text: str, emoji: bool = False) -> str:
+    """页面上改写卡片的最终文本：清理 + 可选 emoji；同样的输入只算一次"""
+    cleaned = pretty_notice(text or "")
+    return add_emojis_smart(cleaned) if emoji else cleaned
+
+
+def format_batch(texts, emoji: bool = False) -> list[str]:
+    """批量格式化（导出改写结果用）；重复文本直接复用记忆化结果"""
+    return [format_rewrite(t or "", emoji) for t in texts]
@@ -0,0 +1,663 @@
+"""
+清小知 —— 页面组件
+
+样式、页头、概览卡片、复制按钮等依赖 Streamlit 的部分都在这里；
+分析引擎在 core.py，不会因为 import 它而加载 Streamlit。
+"""
+import base64
+import html
+import json
+import time
+from pathlib import Path
+
+import streamlit as st
+import streamlit.components.v1 as components
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from core import FLIGHTS, LIMITER, USAGE, clamp01, format_rewrite
+from metrics import REGISTRY, record
+
+# =========================
+# Styles (cool + premium)
+# =========================
+PAGE_CSS = """
+    <style>
+      /* Background must apply in Streamlit */
+      [data-testid="stAppViewContainer"]{
+        background:
+          radial-gradient(1200px 700px at 20% 0%, rgba(59,130,246,.16), transparent 60%),
+          radial-gradient(900px 520px at 85% 10%, rgba(37,99,235,.12), transparent 55%),
+          linear-gradient(180deg, rgba(239,246,255,1) 0%, rgba(248,250,252,1) 55%, rgba(255,255,255,1) 100%);
+      }
+      [data-testid="stHeader"]{ background: transparent; }
+      .block-container {padding-top: 1.1rem; padding-bottom: 2.0rem; max-width: 1120px;}
+
+      #MainMenu {visibility: hidden;}
+      footer {visibility: hidden;}
+      header {visibility: hidden;}
+
+      /* Header */
+      .hero { text-align:center; padding: 10px 0 6px 0; position: relative; }
+      .hero-title{
+        font-size: 46px;
+        font-weight: 950;
+        letter-spacing: -0.04em;
+        margin: 0;
+        background: linear-gradient(90deg, rgba(37,99,235,1), rgba(59,130,246,1), rgba(56,189,248,1));
+        -webkit-background-clip: text;
+        background-clip: text;
+        color: transparent;
+        text-shadow: 0 18px 50px rgba(37,99,235,.18);
+        animation: floatIn .7s ease-out both;
+        display: inline-block;
+        transition: transform .18s ease, filter .25s ease;
+        cursor: default;
+      }
+      .hero-title:hover{
+        transform: translateY(-2px) scale(1.01);
+        filter: drop-shadow(0 16px 24px rgba(37,99,235,.20));
+      }
+
+      .hero-sub{
+        margin-top: 8px;
+        display:flex;
+        justify-content:center;
+      }
+      .hero-pill{
+        display:inline-flex; align-items:center; gap:10px;
+        padding: 10px 16px; border-radius: 999px;
+        border: 1px solid rgba(2,6,23,.06);
+        background: rgba(255,255,255,.78);
+        box-shadow: 0 10px 30px rgba(2,6,23,.06);
+        color: rgba(51,65,85,.90); font-size: 14px;
+        animation: glow 3.2s ease-in-out infinite;
+        transform: translateX(24px);  /* 往右挪：12/24/36 自己调 */
+      }
+      .hero-dot{
+        width:10px; height:10px; border-radius:999px;
+        background: rgba(37,99,235,.85);
+        box-shadow: 0 0 0 6px rgba(37,99,235,.12);
+      }
+      @keyframes floatIn{ from{ transform: translateY(8px); opacity: 0; } to{ transform: translateY(0); opacity: 1; } }
+      @keyframes glow{ 0%,100% { box-shadow: 0 10px 30px rgba(2,6,23,.06); } 50% { box-shadow: 0 18px 40px rgba(37,99,235,.12); } }
+
+      /* Section title */
+      .section-h{
+        font-size: 19px; font-weight: 900;
+        margin: 0.35rem 0 1.0rem 0;
+        border-left: 4px solid rgba(37,99,235,.55);
+        padding-left: 12px;
+        color: rgba(15,23,42,.92);
+      }
+
+      /* Card */
+      .card {
+        background: rgba(255,255,255,.88);
+        border-radius: 18px;
+        padding: 16px 18px;
+        box-shadow: 0 12px 34px rgba(2,6,23,.07);
+        border: 1px solid rgba(2,6,23,.05);
+      }
+      .muted {color: rgba(51,65,85,.70);}
+
+      /* KPI */
+      .kpi-label {color: rgba(51,65,85,.60); font-size: 12px; letter-spacing: .06em;}
+      .kpi-value {font-size: 34px; font-weight: 900; margin-top: 6px; color: rgba(15,23,42,.92);}
+      .kpi-value2 {font-size: 22px; font-weight: 900; margin-top: 10px; color: rgba(15,23,42,.92);}
+      .bar {height: 10px; border-radius: 999px; background: rgba(15,23,42,.08); overflow: hidden; margin-top: 10px;}
+      .bar > div {height: 100%; border-radius: 999px;}
+
+      /* Highlight */
+      mark.hl { background: rgba(59, 130, 246, 0.22); color: inherit; padding: 0 .18em; border-radius: .35em; }
+
+      /* Tips */
+      .tip{
+        margin-top: 10px; padding: 12px 14px;
+        border-radius: 16px;
+        background: rgba(37,99,235,0.055);
+        border: 1px solid rgba(2,6,23,.05);
+        box-shadow: 0 10px 26px rgba(2,6,23,.04);
+      }
+      .tip-title{ font-weight: 900; color: rgba(15,23,42,.90); margin-bottom: 6px; font-size: 13px; }
+      .tip-text{ color: rgba(51,65,85,.76); line-height: 1.65; white-space: pre-line; font-size: 12.5px; }
+
+      /* Blue tags */
+      .blue-tag{
+        display:inline-block;
+        padding:4px 10px;
+        border-radius:999px;
+        background:rgba(37,99,235,.12);
+        color:rgba(37,99,235,1);
+        font-size:12px;
+        margin-right:8px;
+        margin-bottom:6px;
+        border: 1px solid rgba(37,99,235,.18);
+        font-weight: 700;
+      }
+
+      /* Chat bubble */
+      .bubble{
+        margin-top:10px;
+        background: rgba(255,255,255,.94);
+        border: 1px solid rgba(2,6,23,.07);
+        border-radius: 18px;
+        padding: 12px 14px;
+        font-size: 14px;
+        line-height: 1.75;
+        color: rgba(15,23,42,.92);
+        box-shadow: 0 12px 28px rgba(2,6,23,.06);
+        position: relative;
+      }
+      .bubble:before{
+        content:"";
+        position:absolute;
+        left:18px;
+        top:-8px;
+        width:14px;
+        height:14px;
+        background: rgba(255,255,255,.94);
+        border-left: 1px solid rgba(2,6,23,.07);
+        border-top: 1px solid rgba(2,6,23,.07);
+        transform: rotate(45deg);
+      }
+
+      /* Risk item */
+      .rp-item{
+        padding: 12px 12px;
+        border-radius: 14px;
+        border: 1px solid rgba(2,6,23,.06);
+        background: rgba(255,255,255,.74);
+        margin-bottom: 10px;
+      }
+
+      /* Tabs */
+      .stTabs [data-baseweb="tab-list"]{ justify-content: space-around; padding: 0 28px; }
+      .stTabs [data-baseweb="tab"]{ font-size: 15px; font-weight: 900; padding-left: 0 !important; padding-right: 0 !important; }
+
+      /* Primary button */
+      div.stButton > button[kind="primary"]{
+        width: 100%;
+        border: 0 !important;
+        border-radius: 16px !important;
+        padding: 14px 16px !important;
+        font-weight: 900 !important;
+        background: linear-gradient(90deg, rgba(37,99,235,.96), rgba(59,130,246,.92)) !important;
+        box-shadow: 0 18px 44px rgba(37,99,235,.22) !important;
+        transition: transform .15s ease, box-shadow .2s ease, filter .2s ease;
+      }
+      div.stButton > button[kind="primary"]:hover{
+        transform: translateY(-1px);
+        filter: brightness(1.02);
+        box-shadow: 0 22px 60px rgba(37,99,235,.28) !important;
+      }
+      div.stButton > button[kind="primary"]:active{ transform: translateY(0px) scale(.99); }
+
+      /* Loading */
+      .loading{
+        display:flex;
+        align-items:center;
+        justify-content:center;
+        gap:10px;
+        padding: 14px 16px;
+        border-radius: 16px;
+        background: linear-gradient(90deg, rgba(37,99,235,.96), rgba(59,130,246,.92));
+        color: white;
+        font-weight: 900;
+        box-shadow: 0 18px 44px rgba(37,99,235,.22);
+        user-select:none;
+      }
+      .dots span{
+        display:inline-block;
+        width:6px; height:6px;
+        border-radius:999px;
+        background:white;
+        margin-left:5px;
+        opacity:.25;
+        animation: blink 1.1s infinite;
+      }
+      .dots span:nth-child(2){ animation-delay: .15s; }
+      .dots span:nth-child(3){ animation-delay: .3s; }
+      @keyframes blink{
+        0%,100%{ opacity:.25; transform: translateY(0); }
+        50%{ opacity:1; transform: translateY(-2px); }
+      }
+
+      /* Secondary button for actions */
+      div.stButton > button[kind="secondary"]{
+        width: 100% !important;
+        border-radius: 18px !important;
+        padding: 16px 14px !important;
+        font-weight: 900 !important;
+        font-size: 20px !important;
+        border: 2px solid rgba(37,99,235,.28) !important;
+        background: rgba(37,99,235,.06) !important;
+        color: rgba(37,99,235,1) !important;
+        box-shadow: 0 12px 28px rgba(2,6,23,.06) !important;
+        transition: transform .15s ease, filter .2s ease;
+      }
+      div.stButton > button[kind="secondary"]:hover{
+        transform: translateY(-1px);
+        filter: brightness(1.02);
+      }
+
+      /* Footnote */
+      .footnote {
+        color: rgba(51,65,85,.55);
+        font-size: 12px;
+        margin-top: 18px;
+        text-align:center;
+      }
+      
+      /* ===== Header layout override ===== */
+      .qxz-header-wrap{
+        width: 880px;               /* ✅ 控制整体居中区域宽度：想更窄就 760，想更宽就 980 */
+        margin: 0 auto;             /* ✅ 居中 */
+        padding: 10px 0 6px 0;
+        text-align: center;
+      }
+
+      .qxz-header-top{
+        display:flex;
+        align-items:center;
+        justify-content:center;     /* ✅ logo+标题作为整体居中 */
+        gap: 8px;                  /* ✅ logo 与标题间距：想更近就 8-10 */
+      }
+
+      .qxz-logo{
+        width: 190px;               /* ✅ logo 变大：你要再大三倍就 220/260 */
+        height: auto;
+        filter: drop-shadow(0 14px 22px rgba(37,99,235,.18));
+      }
+
+      .qxz-title{
+        margin: 0;
+        line-height: 1;
+        transform: translateX(-60px);  /* 👈 往左移动，数值越大越靠左 */
+      }
+
+      .qxz-title-shift{
+        transform: translateX(-60px);  /* 👈 往左挪，-30 / -60 / -90 自己调 */
+      }
+
+      .qxz-header-sub{
+        justify-content:center !important;
+        margin-top: -12px;
+      }
+      </style>
+    """
+
+def inject_styles():
+    st.markdown(PAGE_CSS, unsafe_allow_html=True)
+
+def img_to_data_uri(rel_path: str) -> str:
+    p = Path(__file__).parent / rel_path
+    if not p.exists():
+        return ""
+    mime = {".webp": "image/webp", ".jpg": "image/jpeg", ".jpeg": "image/jpeg"}.get(p.suffix.lower(), "image/png")
+    b64 = base64.b64encode(p.read_bytes()).decode("utf-8")
+    return f"data:{mime};base64,{b64}"
+
+# =========================
+# Logo 资源：原图 2 MB，页头只显示 190px 宽
+# =========================
+LOGO_SOURCE = "logo.png"          # logo.png 放在 app.py 同目录
+LOGO_DISPLAY_WIDTH = 190          # 与 .qxz-logo 的 width 保持一致
+STATIC_DIR = Path(__file__).parent / "static"  # Streamlit 静态文件目录，对外路径是 app/static/
+
+def build_logo_variant(width: int = LOGO_DISPLAY_WIDTH * 2) -> Path | None:
+    """
+    把原图缩到显示宽度的 2 倍（高分屏也清晰）存成 WebP；
+    源文件没改过就直接复用已有产物。生成失败返回 None。
+    """
+    src = Path(__file__).parent / LOGO_SOURCE
+    dst = STATIC_DIR / f"logo-{width}.webp"
+    if not src.exists():
+        return None
+    if dst.exists() and dst.stat().st_mtime >= src.stat().st_mtime:
+        return dst
+    try:
+        from PIL import Image  # Streamlit 自带 Pillow
+
+        with Image.open(src) as im:
+            h = round(im.height * width / im.width)
+            small = im.convert("RGBA").resize((width, h), Image.LANCZOS)
+        STATIC_DIR.mkdir(exist_ok=True)
+        tmp = dst.with_suffix(".tmp")
+        small.save(tmp, format="WEBP", quality=85, method=6)
+        tmp.replace(dst)  # 原子替换，多个进程同时启动也不会读到半个文件
+        return dst
+    except Exception:
+        return None
+
+@st.cache_resource(show_spinner=False)
+def logo_src() -> str:
+    """
+    页头 <img> 的 src，整个进程只算一次（跨 rerun、跨会话）：
+    开了静态文件服务就给 URL（每次 rerun 只多几十字节），否则内联缩小后的 WebP，实在不行才用原图。
+    """
+    variant = build_logo_variant()
+    if variant is None:
+        return img_to_data_uri(LOGO_SOURCE)
+    if st.get_option("server.enableStaticServing"):
+        return f"app/static/{variant.name}"
+    return img_to_data_uri(str(variant.relative_to(Path(__file__).parent)))
+
+# =========================
+# Header (strict centered: logo + title in one centered row)
+# =========================
+def render_header():
+    logo_uri = logo_src()
+
+    st.markdown(
+        f"""
+        <div class="qxz-header-wrap">
+          <div class="qxz-header-top">
+            <img class="qxz-logo" src="{logo_uri}" alt="logo" />
+            <div class="qxz-title-shift">
+              <div class="hero-title">清小知</div>
+            </div>
+          </div>
+
+          <div class="qxz-header-sub hero-sub">
+            <div class="hero-pill">
+              <span class="hero-dot"></span>
+              <span>高校通知小助手｜让通知更容易被理解</span>
+            </div>
+          </div>
+        </div>
+        """,
+        unsafe_allow_html=True,
+    )
+
+EMOJI_MAP = {
+    "焦虑": "😰",
+    "紧张": "😟",
+    "抵触": "😤",
+    "困惑": "😕",
+    "不安": "😣",
+    "担忧": "😧",
+    "生气": "😡",
+    "配合": "🙂",
+    "反感": "🙃",
+}
+
+
+def risk_bar_color(level: str) -> str:
+    if level == "LOW":
+        return "linear-gradient(90deg, rgba(34,197,94,.92), rgba(16,185,129,.78))"
+    if level == "MEDIUM":
+        return "linear-gradient(90deg, rgba(234,179,8,.92), rgba(251,191,36,.78))"
+    return "linear-gradient(90deg, rgba(239,68,68,.92), rgba(244,63,94,.78))"
+
+def render_overview(risk_score: int, risk_level: str, summary: str):
+    pct = max(0, min(100, int(risk_score)))
+    k1, k2, k3 = st.columns([1, 1, 2], gap="medium")
+    bar_bg = risk_bar_color(risk_level)
+
+    with k1:
+        st.markdown(
+            f"""
+            <div class="card">
+              <div class="kpi-label">风险分数</div>
+              <div class="kpi-value">{pct}</div>
+              <div class="bar"><div style="width:{pct}%; background:{bar_bg};"></div></div>
+            </div>
+            """,
+            unsafe_allow_html=True,
+        )
+    with k2:
+        label = ("低" if risk_level == "LOW" else ("中" if risk_level == "MEDIUM" else "高"))
+        st.markdown(
+            f"""
+            <div class="card">
+              <div class="kpi-label">风险等级</div>
+              <div class="kpi-value2">{risk_level}</div>
+              <div class="muted" style="margin-top:8px;">{label}风险</div>
+            </div>
+            """,
+            unsafe_allow_html=True,
+        )
+    with k3:
+        st.markdown(
+            f"""
+            <div class="card">
+              <div class="kpi-label">结论</div>
+              <div style="font-size:16px;font-weight:900;margin-top:10px;line-height:1.55;color:rgba(15,23,42,.92);">
+                {html.escape(summary)}
+              </div>
+            </div>
+            """,
+            unsafe_allow_html=True,
+        )
+
+def queue_status_writer(placeholder):
+    """
+    给 ratelimit.queue_observer 用的回调：排队时在 placeholder 里显示位置和预计等待。
+    拆分模式 / 矩阵的子请求在线程池里排队，那些线程没有页面上下文，直接跳过。
+    """
+    def show(position: int | None, eta: float):
+        if get_script_run_ctx() is None:
+            return
+        status = "预测中…" if position is None else f"排队中：前面还有 {position} 个请求，预计等待约 {max(1, round(eta))} 秒…"
+        placeholder.markdown(
+            f"<div class='loading'>{status} <span class='dots'><span></span><span></span><span></span></span></div>",
+            unsafe_allow_html=True,
+        )
+    return show
+
+def render_stream_preview(view: dict, arrived: set):
+    """流式生成中的预览：字段到一个画一个；生成结束后页面会整体重绘成正式结果"""
+    if {"risk_score", "risk_level", "summary"} <= arrived:
+        try:
+            score = int(view.get("risk_score", 0) or 0)
+        except (TypeError, ValueError):
+            score = 0
+        render_overview(score, view.get("risk_level", "LOW"), str(view.get("summary", "")))
+    else:
+        st.markdown("<div class='card muted'>正在生成风险结论…</div>", unsafe_allow_html=True)
+
+    issues = view.get("issues") or []
+    if issues:
+        st.markdown("**风险点**")
+        for it in issues:
+            st.markdown(
+                f"""
+                <div class='rp-item'>
+                  <div style="font-weight:900; color:rgba(37,99,235,1);">{html.escape(str(it.get('title','')))}</div>
+                  <div style="margin-top:6px; color:rgba(15,23,42,.88); line-height:1.75;">{html.escape(str(it.get('why','')))}</div>
+                </div>
+                """,
+                unsafe_allow_html=True,
+            )
+
+    emos = view.get("student_emotions") or []
+    if "student_emotions" in arrived and emos:
+        st.markdown("**学生情绪**")
+        tags = "".join(
+            f"<span class='blue-tag'>{html.escape(str(e.get('group','群体')))}："
+            f"{html.escape(str(e.get('sentiment','')))} {EMOJI_MAP.get((e.get('sentiment') or '').strip(), '💭')}"
+            f" {clamp01(e.get('intensity', 0)):.2f}</span> "
+            for e in emos
+        )
+        st.markdown(f"<div style='margin-bottom:12px;'>{tags}</div>", unsafe_allow_html=True)
+
+    for rw in view.get("rewrites") or []:
+        body = html.escape(format_rewrite(str(rw.get("text", "") or ""))).replace("\n", "<br>")
+        st.markdown(
+            f"""
+            <div class="card" style="margin-top:12px; font-size:15px; line-height:1.85;">
+              <div style="font-weight:900; font-size:16px; margin-bottom:8px;">{html.escape(str(rw.get('name','')))}</div>
+              {body}
+            </div>
+            """,
+            unsafe_allow_html=True,
+        )
+
+def matrix_cell(result: dict) -> dict:
+    """矩阵里一格要展示的东西：分数、等级、最强情绪"""
+    emos = [e for e in (result.get("student_emotions") or []) if isinstance(e, dict)]
+    top = max(emos, key=lambda e: clamp01(e.get("intensity", 0)), default=None)
+    try:
+        score = max(0, min(100, int(result.get("risk_score", 0) or 0)))
+    except (TypeError, ValueError):
+        score = 0
+    return {
+        "score": score,
+        "level": result.get("risk_level", "LOW"),
+        "emotion": (top.get("sentiment") or "").strip() if top else "",
+        "intensity": clamp01(top.get("intensity", 0)) if top else 0.0,
+        "fallback": bool(result.get("fallback")),
+    }
+
+def matrix_heatmap_html(rows: list[str], cols: list[str], cells: dict) -> str:
+    """
+    rows: 行标签（年级｜身份），cols: 列标签（敏感度），cells: {(row, col): matrix_cell(...)}
+    颜色按风险分数从绿到红；还没出结果的格子显示“…”
+    """
+    head = "".join(f"<th style='padding:6px 10px;font-size:12px;'>敏感度·{html.escape(c)}</th>" for c in cols)
+    body = []
+    for r in rows:
+        tds = []
+        for c in cols:
+            cell = cells.get((r, c))
+            if cell is None:
+                tds.append("<td style='padding:8px;text-align:center;color:rgba(51,65,85,.5);'>…</td>")
+                continue
+            hue = int(120 - 1.2 * cell["score"])
+            emo = cell["emotion"]
+            emo_txt = f"{EMOJI_MAP.get(emo, '💭')} {html.escape(emo)} {cell['intensity']:.1f}" if emo else "—"
+            mark = "（兜底）" if cell["fallback"] else ""
+            tds.append(
+                f"<td style='padding:8px;text-align:center;background:hsl({hue},75%,86%);border-radius:8px;'>"
+                f"<div style='font-weight:900;font-size:16px;'>{cell['score']}</div>"
+                f"<div style='font-size:11px;color:rgba(15,23,42,.7);'>{html.escape(str(cell['level']))}{mark}｜{emo_txt}</div>"
+                f"</td>"
+            )
+        body.append(f"<tr><th style='text-align:left;padding:6px 10px;font-size:12px;'>{html.escape(r)}</th>{''.join(tds)}</tr>")
+    return (
+        "<div class='card' style='overflow-x:auto;'>"
+        "<table style='border-collapse:separate;border-spacing:4px;width:100%;'>"
+        f"<tr><th></th>{head}</tr>{''.join(body)}</table></div>"
+    )
+
+# =========================
+# 渲染计数 / 分段耗时（?debug=1 时在页尾查看）
+# =========================
+def count_render(name: str):
+    """记录某个区域（整页 / 各个 fragment）在本会话里被执行的次数"""
+    counts = st.session_state.setdefault("render_counts", {})
+    counts[name] = counts.get(name, 0) + 1
+
+class RenderLaps:
+    """
+    整页脚本里顺序打点：laps.mark("overview") 记下从上一个打点到现在的耗时，
+    写进本会话的 render_timings（毫秒）和全局直方图 qxz_stage_seconds{stage="render:overview"}。
+    """
+
+    def __init__(self):
+        self.t = time.perf_counter()
+        self.laps = st.session_state["render_timings"] = {}
+
+    def mark(self, name: str):
+        now = time.perf_counter()
+        dt = now - self.t
+        self.t = now
+        record(f"render:{name}", dt)
+        self.laps[name] = round(dt * 1000, 2)
+
+def _stage_rows(snapshot: dict) -> list[dict]:
+    rows = []
+    for s in snapshot["histograms"].get("qxz_stage_seconds", []):
+        rows.append({
+            "阶段": s["labels"].get("stage", ""),
+            "次数": s["count"],
+            "平均 ms": round(s["sum"] / s["count"] * 1000, 2) if s["count"] else 0.0,
+            "p50 ≤ ms": s["p50"] * 1000,
+            "p95 ≤ ms": s["p95"] * 1000,
+        })
+    return rows
+
+def render_debug_panel():
+    """地址栏带 ?debug=1 时在页尾显示；片段局部重跑不会刷新这里，整页重跑后可见最新数字"""
+    if st.query_params.get("debug") != "1":
+        return
+    with st.expander("调试：耗时与渲染", expanded=False):
+        st.markdown("**最近一次分析的各阶段（同名合计，毫秒）**")
+        spans = st.session_state.get("last_trace") or []
+        if spans:
+            st.dataframe(spans, use_container_width=True, hide_index=True)
+        else:
+            st.caption("本会话还没有分析记录。")
+        st.markdown("**本次渲染各区块（毫秒）**")
+        st.json(st.session_state.get("render_timings", {}))
+        st.markdown("**渲染次数**")
+        st.json(st.session_state.get("render_counts", {}))
+
+        st.markdown("**token 用量**")
+        sid = st.session_state.get("session_id")
+        st.json({
+            "最近一次分析": st.session_state.get("last_usage", {}),
+            "本会话累计": USAGE.session_totals(sid) if sid else {},
+        })
+
+        snap = REGISTRY.snapshot()
+        st.markdown("**进程累计（所有会话）**")
+        st.dataframe(_stage_rows(snap), use_container_width=True, hide_index=True)
+        st.json(snap["counters"])
+        st.markdown("**上游限流 / 请求合并**")
+        st.json(LIMITER.snapshot(), expanded=False)
+        st.json({**FLIGHTS.stats, "in_flight": FLIGHTS.in_flight()}, expanded=False)
+        usage = USAGE.snapshot()
+        st.json({k: usage[k] for k in ("global", "by_scenario", "by_mode", "window")}, expanded=False)
+        d1, d2 = st.columns(2)
+        with d1:
+            st.download_button("导出 Prometheus 文本", REGISTRY.to_prometheus(), file_name="qxz_metrics.prom",
+                               mime="text/plain", use_container_width=True)
+        with d2:
+            st.download_button("导出 JSONL", REGISTRY.to_jsonl(), file_name="qxz_metrics.jsonl",
+                               mime="application/x-ndjson", use_container_width=True)
+
+def tip_block():
+    st.markdown(
+        """
+        <div class="tip">
+          <div class="tip-title">通知小贴士</div>
+          <div class="tip-text">撰写通知时应尽量涵盖时间窗口 / 执行范围 / 可替代方案 / 咨询渠道。<br>信息越完整，越不容易被误读噢💙</div>
+        </div>
+        """,
+        unsafe_allow_html=True,
+    )
+
+# ============== 关键：复制按钮需要全局注入一次 ==============
+def clipboard_copy_injector():
+    components.html(
+        """
+        <script>
+        if (!window.__QXZ_CLIPBOARD_INSTALLED__) {
+          window.__QXZ_CLIPBOARD_INSTALLED__ = true;
+          window.__QXZ_DO_COPY__ = async function(payload) {
+            try {
+              await navigator.clipboard.writeText(payload || "");
+              window.__QXZ_COPY_OK__ = true;
+            } catch(e) {
+              window.__QXZ_COPY_OK__ = false;
+            }
+          };
+        }
+        </script>
+        """,
+        height=0,
+    )
+
+def clipboard_copy_fire(text: str):
+    safe = json.dumps(text, ensure_ascii=False)
+    components.html(
+        f"""
+        <script>
+          if (window.__QXZ_DO_COPY__) {{
+            window.__QXZ_DO_COPY__({safe});
+          }}
+        </script>
+        """,
+        height=0,
+    )
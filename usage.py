@@ -0,0 +1,150 @@
+"""
+模型调用的 token 用量记账 + 预算
+
+每次调用模型（call_deepseek / call_deepseek_stream）后把响应里的 usage 记一笔：
+提示 / 生成 token、提示里命中服务方前缀缓存的 token、耗时、所属会话 / 场景 / 模式，汇总成
+全局、按会话、按场景、按模式四个维度（累计值 + 当前预算窗口内的值）。
+
+会话 / 场景 / 模式通过 contextvars 传递，不用改函数签名：
+    with usage_labels(session="abc"):            # 页面：整个会话
+        with usage_labels(scenario=..., mode=...):   # analyze() 内部
+            call_deepseek(...)                   # 记到 session=abc / scenario / mode 下
+线程池里的子任务要用 contextvars.copy_context().run 提交才能带上标签。
+
+预算按窗口计（默认一天），超出后由 analyze() 降级：先切到 lite 模式，超过 1.25 倍直接本地兜底。
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+HARD_FACTOR = 1.25   # 超过预算这么多倍时不再降级到 lite，直接兜底
+
+_labels: ContextVar[dict] = ContextVar("qxz_usage_labels", default={})
+
+
+@contextmanager
+def usage_labels(**labels):
+    token = _labels.set({**_labels.get(), **{k: v for k, v in labels.items() if v is not None}})
+    try:
+        yield
+    finally:
+        _labels.reset(token)
+
+
+def current_labels() -> dict:
+    return _labels.get()
+
+
+def cache_hit_tokens(usage: dict) -> int:
+    """提示里命中服务方上下文缓存的 token 数：DeepSeek 是 prompt_cache_hit_tokens，OpenAI 在 prompt_tokens_details 里"""
+    n = usage.get("prompt_cache_hit_tokens")
+    if n is None:
+        n = (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+    return int(n or 0)
+
+
+def _empty() -> dict:
+    return {"calls": 0, "prompt_tokens": 0, "cache_hit_tokens": 0, "completion_tokens": 0, "total_tokens": 0,
+            "latency_s": 0.0}
+
+
+def _add(acc: dict, prompt: int, cached: int, completion: int, latency: float):
+    acc["calls"] += 1
+    acc["prompt_tokens"] += prompt
+    acc["cache_hit_tokens"] += cached
+    acc["completion_tokens"] += completion
+    acc["total_tokens"] += prompt + completion
+    acc["latency_s"] = round(acc["latency_s"] + latency, 3)
+
+
+class UsageLedger:
+    DIMENSIONS = ("session", "scenario", "mode")
+
+    def __init__(self, window: float = 24 * 3600, session_budget: int = 0, scenario_budget: int = 0,
+                 global_budget: int = 0, degrade: str = "lite"):
+        self.window = window
+        self.budgets = {"session": session_budget, "scenario": scenario_budget, "global": global_budget}
+        self.degrade = degrade if degrade in ("lite", "fallback") else "lite"
+        self._lock = threading.Lock()
+        self.totals = _empty()                                   # 累计
+        self.by = {d: {} for d in self.DIMENSIONS}                # 累计，按维度
+        self._window_start = time.time()
+        self._window = {"global": 0, "session": {}, "scenario": {}}  # 当前窗口内的 token 数
+
+    def _roll_window(self, now: float):
+        if self.window and now - self._window_start >= self.window:
+            self._window_start = now
+            self._window = {"global": 0, "session": {}, "scenario": {}}
+
+    def record(self, usage: dict | None, latency: float = 0.0, labels: dict | None = None):
+        """usage 是接口返回的 usage 块；缺失时只记调用次数和耗时"""
+        usage = usage or {}
+        prompt = int(usage.get("prompt_tokens") or 0)
+        completion = int(usage.get("completion_tokens") or 0)
+        cached = cache_hit_tokens(usage)
+        labels = current_labels() if labels is None else labels
+        now = time.time()
+        with self._lock:
+            self._roll_window(now)
+            _add(self.totals, prompt, cached, completion, latency)
+            for d in self.DIMENSIONS:
+                key = labels.get(d)
+                if key is not None:
+                    _add(self.by[d].setdefault(str(key), _empty()), prompt, cached, completion, latency)
+            spent = prompt + completion
+            self._window["global"] += spent
+            for d in ("session", "scenario"):
+                key = labels.get(d)
+                if key is not None:
+                    self._window[d][str(key)] = self._window[d].get(str(key), 0) + spent
+
+    def decision(self, labels: dict | None = None) -> tuple[str | None, str | None]:
+        """
+        调模型之前问一次：(None, None) 正常；("lite" / "fallback", 触发的预算维度) 需要降级。
+        多个预算同时超出时取最严重的处理。
+        """
+        labels = current_labels() if labels is None else labels
+        worst, which = None, None
+        with self._lock:
+            self._roll_window(time.time())
+            for d in ("session", "scenario", "global"):
+                budget = self.budgets[d]
+                if not budget:
+                    continue
+                if d == "global":
+                    spent = self._window["global"]
+                else:
+                    key = labels.get(d)
+                    if key is None:
+                        continue
+                    spent = self._window[d].get(str(key), 0)
+                if spent < budget:
+                    continue
+                action = "fallback" if (self.degrade == "fallback" or spent >= budget * HARD_FACTOR) else "lite"
+                if worst != "fallback":
+                    worst, which = action, d
+        return worst, which
+
+    def session_totals(self, session) -> dict:
+        with self._lock:
+            return dict(self.by["session"].get(str(session), _empty()))
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            def with_avg(acc: dict) -> dict:
+                out = dict(acc)
+                out["avg_prompt_tokens"] = round(acc["prompt_tokens"] / acc["calls"], 1) if acc["calls"] else 0.0
+                out["cache_hit_rate"] = round(acc["cache_hit_tokens"] / acc["prompt_tokens"], 3) if acc["prompt_tokens"] else 0.0
+                return out
+
+            return {
+                "global": with_avg(self.totals),
+                **{f"by_{d}": {k: with_avg(v) for k, v in sorted(self.by[d].items())} for d in self.DIMENSIONS},
+                "window": {
+                    "seconds": self.window,
+                    "started_at": round(self._window_start, 3),
+                    "global_tokens": self._window["global"],
+                    "budgets": dict(self.budgets),
+                },
+            }